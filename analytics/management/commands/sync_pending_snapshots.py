@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.models import PendingSnapshotSync
+from analytics.sync import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the analytics snapshots marked dirty while ANALYTICS_SYNC_MODE is "deferred"'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Marks handled per pass (default: 100)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling for new marks'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep when there is nothing to do (with --loop, default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(f'{PendingSnapshotSync.objects.count()} snapshots pending')
+
+        total = 0
+        while True:
+            handled = process_pending(batch_size)
+            total += handled
+            if handled:
+                self.stdout.write(f'  ...{total} snapshots rebuilt')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done. Rebuilt {total} snapshots.'))
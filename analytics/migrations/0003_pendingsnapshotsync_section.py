@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_pendingsnapshotsync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='pendingsnapshotsync',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='pendingsnapshotsync',
+            name='section',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pendingsnapshotsync',
+            unique_together={('user', 'data_type', 'section')},
+        ),
+    ]
@@ -20,3 +20,23 @@ class UserDataSnapshot(models.Model):
     
     def __str__(self):
         return f"{self.user.email} - {self.data_type} @ {self.created_at}"
+
+
+class PendingSnapshotSync(models.Model):
+    """
+    A user's snapshot that needs rebuilding (ANALYTICS_SYNC_MODE='deferred')
+    One row per user, data_type and section, however many writes marked it
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    data_type = models.CharField(max_length=50)
+    section = models.CharField(max_length=50, blank=True, default='')  # '' = the whole document
+    marked_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'data_type', 'section']
+        indexes = [
+            models.Index(fields=['marked_at'])
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.data_type} {self.section or '*'} marked @ {self.marked_at}"
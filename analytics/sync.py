@@ -0,0 +1,197 @@
+import json
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PendingSnapshotSync, UserDataSnapshot
+
+logger = logging.getLogger(__name__)
+
+HEALTH_SUMMARY = 'health_summary'
+DIET_SUMMARY = 'diet_summary'
+SECTION_STAMPS = '_sections'
+
+# Marks made in this thread since the last flush:
+#   {(user_id, data_type): {section: item ids, or None for the whole section}}
+# where section None stands for the whole document.
+_local = threading.local()
+
+
+def _merge_mark(marks, user_id, data_type, section, item_ids):
+    sections = marks.setdefault((user_id, data_type), {})
+    if section in sections and sections[section] is None:
+        return
+    if item_ids is None:
+        sections[section] = None
+    else:
+        sections.setdefault(section, set()).update(item_ids)
+
+
+def mark_dirty(user_id: int, data_type: str, sections: Optional[Iterable[str]] = None,
+               item_ids: Optional[Iterable[int]] = None):
+    """
+    Note that part of a user's snapshot is out of date.
+    sections names the diet sections a write affected (default: the whole document);
+    item_ids narrows the sections that support it ('saved_meals') to the rows written;
+    the other sections named are rebuilt whole.
+    Nothing is rebuilt here: in 'commit' mode every mark made inside a transaction
+    is coalesced into one rebuild per (user, data_type) when it commits (straight
+    away in autocommit); in 'deferred' mode the mark is stored for the worker and
+    rolls back with the transaction that made it.
+    """
+    sections = list(sections) if sections is not None else [None]
+    if getattr(settings, 'ANALYTICS_SYNC_MODE', 'commit') == 'deferred':
+        now = timezone.now()
+        for section in sections:
+            PendingSnapshotSync.objects.update_or_create(
+                user_id=user_id, data_type=data_type, section=section or '', defaults={'marked_at': now}
+            )
+        return
+    marks = getattr(_local, 'marks', None)
+    if marks is None:
+        marks = _local.marks = {}
+    item_ids = set(item_ids) if item_ids is not None else None
+    for section in sections:
+        _merge_mark(marks, user_id, data_type, section, item_ids)
+    # One callback per mark; the first to run flushes them all and the rest find nothing.
+    # Registering each time keeps marks from a rolled-back block from getting stuck.
+    transaction.on_commit(flush)
+
+
+def flush():
+    """Rebuild everything marked in this thread"""
+    marks = getattr(_local, 'marks', None)
+    if not marks:
+        return
+    _local.marks = {}
+    rebuild_snapshots(marks)
+
+
+def _normalized(value):
+    """value as it reads back from the JSON column, for change detection"""
+    return json.loads(json.dumps(value))
+
+
+def _full_document(data_type, user):
+    """(document, {section: {path: value}} or None) built from scratch"""
+    from .views import DIET_SNAPSHOT_SECTIONS, build_diet_sections, get_health_snapshot, set_snapshot_path
+    if data_type != DIET_SUMMARY:
+        return _normalized(get_health_snapshot(user)), None
+    try:
+        sections = _normalized(build_diet_sections(user, DIET_SNAPSHOT_SECTIONS))
+    except Exception as e:
+        return {'error': f'Diet data collection failed: {str(e)}'}, None
+    document = {}
+    for values in sections.values():
+        for path, value in values.items():
+            set_snapshot_path(document, path, value)
+    return document, sections
+
+
+def _updated_sections(user, document, dirty: Dict[str, Optional[Set[int]]]):
+    """{section: {path: value}} for the dirty diet sections, reusing the stored document where possible"""
+    from .views import DIET_SNAPSHOT_ITEM_SECTIONS, build_diet_sections, get_snapshot_path
+    whole = [
+        section for section, item_ids in dirty.items()
+        if item_ids is None or section not in DIET_SNAPSHOT_ITEM_SECTIONS
+    ]
+    sections = build_diet_sections(user, whole)
+    for section, item_ids in dirty.items():
+        if section not in sections:
+            path, refresh = DIET_SNAPSHOT_ITEM_SECTIONS[section]
+            sections[section] = {path: refresh(user, get_snapshot_path(document, path), item_ids)}
+    return _normalized(sections)
+
+
+def _restamp(previous, sections, stamps, stamped_at) -> bool:
+    """Bump the stamp of every section whose values differ from the previous document; True if any did"""
+    from .views import get_snapshot_path
+    changed = False
+    for section, values in sections.items():
+        if section in stamps and all(get_snapshot_path(previous, path) == value for path, value in values.items()):
+            continue
+        stamps[section] = {'version': stamps.get(section, {}).get('version', 0) + 1, 'updated_at': stamped_at}
+        changed = True
+    return changed
+
+
+def _rebuild(user, data_type, dirty, snapshot) -> bool:
+    """Bring one snapshot up to date; returns whether the stored row was written"""
+    from .views import set_snapshot_path
+    stamped_at = timezone.now().isoformat()
+    previous = snapshot.data_json if snapshot is not None and isinstance(snapshot.data_json, dict) else {}
+    stamps = dict(previous.get(SECTION_STAMPS, {}))
+    partial = data_type == DIET_SUMMARY and None not in dirty and SECTION_STAMPS in previous
+    if partial:
+        try:
+            sections = _updated_sections(user, previous, dirty)
+        except Exception:
+            logger.info("Falling back to a full %s rebuild for user %s", data_type, user.pk, exc_info=True)
+            partial = False
+
+    if partial:
+        if not _restamp(previous, sections, stamps, stamped_at):
+            return False
+        document = dict(previous, **{SECTION_STAMPS: stamps})
+        for values in sections.values():
+            for path, value in values.items():
+                set_snapshot_path(document, path, value)
+    else:
+        document, sections = _full_document(data_type, user)
+        if sections is not None:
+            stamps = {section: stamp for section, stamp in stamps.items() if section in sections}
+            _restamp(previous, sections, stamps, stamped_at)
+            document[SECTION_STAMPS] = stamps
+        if snapshot is not None and document == previous:
+            return False
+
+    if snapshot is None:
+        UserDataSnapshot.objects.create(user=user, data_type=data_type, data_json=document)
+    else:
+        UserDataSnapshot.objects.filter(pk=snapshot.pk).update(data_json=document, created_at=timezone.now())
+    return True
+
+
+def rebuild_snapshots(marks: Dict[Tuple[int, str], Dict[Optional[str], Optional[Set[int]]]]) -> int:
+    """
+    Bring each marked snapshot up to date, rebuilding only its dirty sections;
+    users deleted since they were marked are skipped. Returns rows written.
+    """
+    user_ids = {user_id for user_id, _ in marks}
+    users = get_user_model().objects.in_bulk(list(user_ids))
+    snapshots = {}
+    for snapshot in UserDataSnapshot.objects.filter(
+        user_id__in=user_ids, data_type__in={data_type for _, data_type in marks}
+    ).order_by('-created_at', '-id'):
+        snapshots.setdefault((snapshot.user_id, snapshot.data_type), snapshot)
+
+    written = 0
+    for (user_id, data_type), dirty in marks.items():
+        user = users.get(user_id)
+        if user is None:
+            continue
+        try:
+            written += _rebuild(user, data_type, dirty, snapshots.get((user_id, data_type)))
+        except Exception:
+            logger.exception("Error syncing %s for user %s", data_type, user_id)
+    return written
+
+
+def process_pending(limit: int = 100) -> int:
+    """Rebuild up to limit stored marks (deferred mode), oldest first; returns how many were handled"""
+    pending = list(PendingSnapshotSync.objects.order_by('marked_at')[:limit])
+    if not pending:
+        return 0
+    marks = {}
+    for mark in pending:
+        _merge_mark(marks, mark.user_id, mark.data_type, mark.section or None, None)
+    rebuild_snapshots(marks)
+    for mark in pending:
+        # A write that re-marked the row while we were rebuilding keeps it for the next pass
+        PendingSnapshotSync.objects.filter(pk=mark.pk, marked_at=mark.marked_at).delete()
+    return len(pending)
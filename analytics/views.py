@@ -194,234 +194,253 @@ def get_key_user_metrics(user):
     return metrics
 
 
+def _diet_sources(user, sources, key):
+    """Rows several diet sections need, fetched at most once per build"""
+    if key not in sources:
+        from diet.models import UserDietaryPreferences
+        from diet.weekly_plan import load_weekly_plan
+        if key == 'prefs':
+            sources[key] = UserDietaryPreferences.objects.get(user=user)
+        elif key == 'plan':
+            sources[key] = load_weekly_plan(user)
+    return sources[key]
+
+
+def _diet_preferences_section(user, sources):
+    prefs = _diet_sources(user, sources, 'prefs')
+    return {
+        'preferences': {
+            'dietary_tags': prefs.dietary_tags,
+            'allergies': prefs.allergies,
+            'dislikes': prefs.dislikes,
+            'preferred_cuisines': prefs.preferred_cuisines,
+            'meals_per_day': prefs.meals_per_day,
+            'preferred_meal_times': prefs.preferred_meal_times,
+        },
+        'targets': {
+            'calories': prefs.calorie_target,
+            'protein': prefs.protein_target,
+            'carbs': prefs.carb_target,
+            'fat': prefs.fat_target,
+        },
+        'meal_analysis': prefs.meal_planning_analysis,
+        'meal_baseline': prefs.meal_baseline,
+        'key_metrics': get_key_user_metrics(user),
+    }
+
+
+def _diet_plan_section(user, sources):
+    from diet.models import NutritionAdherenceSnapshot
+    from diet.weekly_plan import MEAL_SLOTS
+    
+    prefs = _diet_sources(user, sources, 'prefs')
+    meal_analysis = prefs.meal_planning_analysis or {}
+    # --- Planned meals for the rolling 7-day window (two queries) ---
+    plan = _diet_sources(user, sources, 'plan')
+    planned_meals = plan.planned_meals()
+    daily_totals = plan.daily_totals()
+    meal_slots = MEAL_SLOTS
+    # --- Now calculate summary ---
+    daily_calorie_target = prefs.calorie_target or meal_analysis.get('daily_calories') or 2000
+    weekly_calorie_target = daily_calorie_target * 7
+    current_week_total_calories = sum(day['calories'] for day in daily_totals.values())
+    weekly_calorie_difference = weekly_calorie_target - current_week_total_calories
+    summary = {
+        'daily_calorie_target': daily_calorie_target,
+        'weekly_calorie_target': weekly_calorie_target,
+        'current_week_total_calories': current_week_total_calories,
+        'weekly_calorie_difference': weekly_calorie_difference
+    }
+    
+    # Get nutrition adherence and wellness score adjustments
+    try:
+        adherence = NutritionAdherenceSnapshot.objects.get(user=user)
+        adherence_ratio = adherence.adherence_ratio
+    except NutritionAdherenceSnapshot.DoesNotExist:
+        adherence_ratio = 1.0
+    
+    # Calculate wellness score adjustments
+    base_score = None
+    adjusted_score = None
+    try:
+        from health.models import HealthProfile
+        hp = HealthProfile.objects.get(user=user)
+        base_score = hp.wellness_score()
+        adjusted_score = int(round(base_score * adherence_ratio))
+    except Exception:
+        pass
+    
+    # Calculate nutrition adherence metrics
+    # Use defaults if any target is None to avoid NoneType * int errors
+    daily_target_calories = prefs.calorie_target if prefs and prefs.calorie_target is not None else 2000
+    weekly_target_calories = daily_target_calories * 7
+    daily_target_protein = prefs.protein_target if prefs and prefs.protein_target is not None else 50
+    daily_target_carbs = prefs.carb_target if prefs and prefs.carb_target is not None else 250
+    daily_target_fat = prefs.fat_target if prefs and prefs.fat_target is not None else 70
+    nutrition_adherence = {
+        'ratio': adherence_ratio,
+        'base_wellness_score': base_score,
+        'adjusted_wellness_score': adjusted_score,
+        'daily_target_calories': daily_target_calories,
+        'weekly_target_calories': weekly_target_calories,
+        'current_week_calories': sum(day['calories'] for day in daily_totals.values()),
+        'days_with_meals': len([day for day in daily_totals.values() if day['calories'] > 0]),
+        'days_without_meals': 7 - len([day for day in daily_totals.values() if day['calories'] > 0]),
+        'daily_target_protein': daily_target_protein,
+        'daily_target_carbs': daily_target_carbs,
+        'daily_target_fat': daily_target_fat,
+    }
+    
+    return {
+        'current_plan': {
+            'planned_meals': planned_meals,
+            'daily_totals': daily_totals,
+            'meal_slots': meal_slots,
+            'week_dates': [day.date.isoformat() for day in plan.days],
+            'planned_meals_count': plan.slot_count,
+        },
+        'nutrition_adherence': nutrition_adherence,
+        'summary': summary,
+    }
+
+
+def saved_meal_snapshot_entry(meal):
+    """One saved meal as listed in the diet snapshot"""
+    return {
+        'id': meal.id,
+        'meal_name': meal.meal_name,
+        'category': meal.category,
+        'area': meal.area,
+        'source': meal.source,
+        'meal_thumb': meal.meal_thumb,
+        'saved_at': meal.saved_at.isoformat(),
+        'macros': meal.macros_json,
+        'recommended_servings': meal.recommended_servings,
+        'prep_time_min': meal.prep_time_min,
+        'ingredients': meal.get_ingredients_list(),
+        'instructions': meal.instructions,
+        'youtube_link': meal.youtube_link,
+        'source_link': meal.source_link
+    }
+
+
+def _diet_saved_meals_section(user, sources):
+    from diet.models import UserSavedMeal
+    
+    # Get saved meals with detailed info
+    saved_meals_data = [
+        saved_meal_snapshot_entry(meal)
+        for meal in UserSavedMeal.objects.filter(user=user).order_by('-saved_at')
+    ]
+    return {
+        'saved_meals': {
+            'count': len(saved_meals_data),
+            'meals': saved_meals_data
+        }
+    }
+
+
+def _refresh_saved_meal_entries(user, current, meal_ids):
+    """The stored saved_meals value with only the given meals re-read (or dropped if deleted)"""
+    from diet.models import UserSavedMeal
+    
+    meals = [meal for meal in (current or {}).get('meals', []) if meal['id'] not in meal_ids]
+    meals.extend(
+        saved_meal_snapshot_entry(meal)
+        for meal in UserSavedMeal.objects.filter(user=user, id__in=meal_ids)
+    )
+    meals.sort(key=lambda meal: meal['saved_at'], reverse=True)
+    return {'count': len(meals), 'meals': meals}
+
+
+def _diet_meal_plan_versions_section(user, sources):
+    from diet.models import MealPlanVersion
+    
+    # Get meal plan versions (historical data)
+    meal_plan_versions = MealPlanVersion.objects.filter(
+        user=user
+    ).order_by('-created_at')[:10]  # Last 10 versions
+    
+    version_history = []
+    for version in meal_plan_versions:
+        version_history.append({
+            'id': version.id,
+            'name': version.version_name,
+            'created_at': version.created_at.isoformat(),
+            'meal_plan_snapshot': version.meal_plan_snapshot,
+            'daily_totals_snapshot': version.daily_totals_snapshot,
+            'notes': version.notes
+        })
+    return {'history.meal_plan_versions': version_history}
+
+
+def _diet_shopping_list_versions_section(user, sources):
+    from diet.models import ShoppingListVersion
+    
+    # Get shopping list versions
+    shopping_versions = ShoppingListVersion.objects.filter(
+        user=user
+    ).order_by('-created_at')[:5]  # Last 5 versions
+    
+    shopping_history = []
+    for version in shopping_versions:
+        shopping_history.append({
+            'id': version.id,
+            'name': version.name,
+            'created_at': version.created_at.isoformat(),
+            'shopping_data': version.items_json if hasattr(version, 'items_json') else None,
+            'notes': version.notes
+        })
+    return {'history.shopping_list_versions': shopping_history}
+
+
+# Diet snapshot sections: name -> builder returning {document path: value}.
+# A path is a top-level key, or 'history.<key>' inside the shared history dict.
+# analytics.sync rebuilds only the sections a write affected.
+DIET_SNAPSHOT_SECTIONS = {
+    'preferences': _diet_preferences_section,
+    'plan': _diet_plan_section,
+    'saved_meals': _diet_saved_meals_section,
+    'meal_plan_versions': _diet_meal_plan_versions_section,
+    'shopping_list_versions': _diet_shopping_list_versions_section,
+}
+
+
+# Sections that can also be patched per row: name -> (path, refresh(user, stored value, ids))
+DIET_SNAPSHOT_ITEM_SECTIONS = {
+    'saved_meals': ('saved_meals', _refresh_saved_meal_entries),
+}
+
+
+def get_snapshot_path(document, path):
+    """Value at a section path of a snapshot document (None if absent)"""
+    parent, _, key = path.rpartition('.')
+    if parent:
+        document = document.get(parent) or {}
+    return document.get(key)
+
+
+def set_snapshot_path(document, path, value):
+    """Store value at a section path ('key' or 'parent.key') of a snapshot document"""
+    parent, _, key = path.rpartition('.')
+    if parent:
+        document = document.setdefault(parent, {})
+    document[key] = value
+
+
+def build_diet_sections(user, sections):
+    """{section: {path: value}} for the named sections; raises if a source is missing"""
+    sources = {}
+    return {name: DIET_SNAPSHOT_SECTIONS[name](user, sources) for name in sections}
+
+
 def get_diet_snapshot(user):
     """Collect comprehensive diet data for the user"""
     try:
-        from diet.models import UserDietaryPreferences, PlannedMeal, UserSavedMeal, NutritionAdherenceSnapshot, MealPlanVersion, ShoppingListVersion
-        from datetime import date, timedelta
-        from collections import defaultdict
-        
-        prefs = UserDietaryPreferences.objects.get(user=user)
-        meal_analysis = prefs.meal_planning_analysis or {}
-        # --- Generate next 7 days for meal planning ---
-        today = date.today()
-        week_days = []
-        week_dates = []
-        for i in range(7):
-            day = today + timedelta(days=i+1)
-            week_days.append({
-                'date': day,
-                'formatted_date': day.strftime('%Y-%m-%d')
-            })
-            week_dates.append(day)
-        # --- Fetch planned meals for the rolling window ---
-        planned_meals_qs = PlannedMeal.objects.filter(
-            user=user,
-            planned_date__in=week_dates
-        )
-        planned_meals = {}
-        daily_totals = {}
-        meal_slots = ["breakfast", "lunch", "dinner", "snack"]
-        for pm in planned_meals_qs:
-            date_key = pm.planned_date.strftime('%Y-%m-%d')
-            slot_key = pm.meal_type
-            if date_key not in planned_meals:
-                planned_meals[date_key] = {}
-            if date_key not in daily_totals:
-                daily_totals[date_key] = {
-                    'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0,
-                    'meals': [], 'date': pm.planned_date.isoformat()
-                }
-            meal_data = {
-                'meal_name': None,
-                'meal_thumb': None,
-                'id': pm.id,
-                'macros': None,
-                'recommended_servings': None,
-                'portion_multiplier': 1.0,
-                'adjusted_nutrition': None
-            }
-            # Extract meal info from plan_json if available
-            if pm.plan_json and 'meals' in pm.plan_json and pm.plan_json['meals']:
-                meal = pm.plan_json['meals'][0]
-                meal_data.update({
-                    'meal_name': meal.get('meal_name'),
-                    'meal_thumb': meal.get('meal_thumb'),
-                    'saved_meal_id': meal.get('saved_meal_id'),
-                    'portion_multiplier': meal.get('portion_multiplier', 1.0)
-                })
-                # Get macros and servings from saved meal
-                if 'saved_meal_id' in meal:
-                    try:
-                        saved_meal = UserSavedMeal.objects.get(id=meal['saved_meal_id'])
-                        meal_data['macros'] = saved_meal.macros_json
-                        meal_data['recommended_servings'] = saved_meal.recommended_servings
-                        # Calculate adjusted nutrition
-                        portion_multiplier = float(meal.get('portion_multiplier', 1.0))
-                        if saved_meal.macros_json and saved_meal.recommended_servings:
-                            servings = float(saved_meal.recommended_servings)
-                            if servings > 0:
-                                adjusted_nutrition = {
-                                    'calories': (saved_meal.macros_json.get('calories', 0) / servings) * portion_multiplier,
-                                    'protein': (saved_meal.macros_json.get('protein', 0) / servings) * portion_multiplier,
-                                    'carbs': (saved_meal.macros_json.get('carbs', 0) / servings) * portion_multiplier,
-                                    'fat': (saved_meal.macros_json.get('fat', 0) / servings) * portion_multiplier
-                                }
-                                meal_data['adjusted_nutrition'] = adjusted_nutrition
-                                # Add to daily totals
-                                daily_totals[date_key]['calories'] += adjusted_nutrition['calories']
-                                daily_totals[date_key]['protein'] += adjusted_nutrition['protein']
-                                daily_totals[date_key]['carbs'] += adjusted_nutrition['carbs']
-                                daily_totals[date_key]['fat'] += adjusted_nutrition['fat']
-                    except UserSavedMeal.DoesNotExist:
-                        pass
-            planned_meals[date_key][slot_key] = meal_data
-            daily_totals[date_key]['meals'].append({
-                'meal_type': slot_key,
-                'meal_name': meal_data['meal_name'],
-                'calories': meal_data['adjusted_nutrition']['calories'] if meal_data['adjusted_nutrition'] else 0
-            })
-        # --- Now calculate summary ---
-        daily_calorie_target = prefs.calorie_target or meal_analysis.get('daily_calories') or 2000
-        weekly_calorie_target = daily_calorie_target * 7
-        current_week_total_calories = sum(day['calories'] for day in daily_totals.values())
-        weekly_calorie_difference = weekly_calorie_target - current_week_total_calories
-        summary = {
-            'daily_calorie_target': daily_calorie_target,
-            'weekly_calorie_target': weekly_calorie_target,
-            'current_week_total_calories': current_week_total_calories,
-            'weekly_calorie_difference': weekly_calorie_difference
-        }
-        
-        # Get nutrition adherence and wellness score adjustments
-        try:
-            adherence = NutritionAdherenceSnapshot.objects.get(user=user)
-            adherence_ratio = adherence.adherence_ratio
-        except NutritionAdherenceSnapshot.DoesNotExist:
-            adherence_ratio = 1.0
-        
-        # Calculate wellness score adjustments
-        base_score = None
-        adjusted_score = None
-        try:
-            from health.models import HealthProfile
-            hp = HealthProfile.objects.get(user=user)
-            base_score = hp.wellness_score()
-            adjusted_score = int(round(base_score * adherence_ratio))
-        except Exception:
-            pass
-        
-        # Get meal plan versions (historical data)
-        meal_plan_versions = MealPlanVersion.objects.filter(
-            user=user
-        ).order_by('-created_at')[:10]  # Last 10 versions
-        
-        version_history = []
-        for version in meal_plan_versions:
-            version_history.append({
-                'id': version.id,
-                'name': version.version_name,
-                'created_at': version.created_at.isoformat(),
-                'meal_plan_snapshot': version.meal_plan_snapshot,
-                'daily_totals_snapshot': version.daily_totals_snapshot,
-                'notes': version.notes
-            })
-        
-        # Get shopping list versions
-        shopping_versions = ShoppingListVersion.objects.filter(
-            user=user
-        ).order_by('-created_at')[:5]  # Last 5 versions
-        
-        shopping_history = []
-        for version in shopping_versions:
-            shopping_history.append({
-                'id': version.id,
-                'name': version.name,
-                'created_at': version.created_at.isoformat(),
-                'shopping_data': version.items_json if hasattr(version, 'items_json') else None,
-                'notes': version.notes
-            })
-        
-        # Get saved meals with detailed info
-        saved_meals = UserSavedMeal.objects.filter(user=user).order_by('-saved_at')
-        saved_meals_data = []
-        for meal in saved_meals:
-            meal_data = {
-                'id': meal.id,
-                'meal_name': meal.meal_name,
-                'category': meal.category,
-                'area': meal.area,
-                'source': meal.source,
-                'meal_thumb': meal.meal_thumb,
-                'saved_at': meal.saved_at.isoformat(),
-                'macros': meal.macros_json,
-                'recommended_servings': meal.recommended_servings,
-                'prep_time_min': meal.prep_time_min,
-                'ingredients': meal.get_ingredients_list(),
-                'instructions': meal.instructions,
-                'youtube_link': meal.youtube_link,
-                'source_link': meal.source_link
-            }
-            saved_meals_data.append(meal_data)
-        
-        # Calculate nutrition adherence metrics
-        # Use defaults if any target is None to avoid NoneType * int errors
-        daily_target_calories = prefs.calorie_target if prefs and prefs.calorie_target is not None else 2000
-        weekly_target_calories = daily_target_calories * 7
-        daily_target_protein = prefs.protein_target if prefs and prefs.protein_target is not None else 50
-        daily_target_carbs = prefs.carb_target if prefs and prefs.carb_target is not None else 250
-        daily_target_fat = prefs.fat_target if prefs and prefs.fat_target is not None else 70
-        nutrition_adherence = {
-            'ratio': adherence_ratio,
-            'base_wellness_score': base_score,
-            'adjusted_wellness_score': adjusted_score,
-            'daily_target_calories': daily_target_calories,
-            'weekly_target_calories': weekly_target_calories,
-            'current_week_calories': sum(day['calories'] for day in daily_totals.values()),
-            'days_with_meals': len([day for day in daily_totals.values() if day['calories'] > 0]),
-            'days_without_meals': 7 - len([day for day in daily_totals.values() if day['calories'] > 0]),
-            'daily_target_protein': daily_target_protein,
-            'daily_target_carbs': daily_target_carbs,
-            'daily_target_fat': daily_target_fat,
-        }
-        
-        diet_data = {
-            'preferences': {
-                'dietary_tags': prefs.dietary_tags,
-                'allergies': prefs.allergies,
-                'dislikes': prefs.dislikes,
-                'preferred_cuisines': prefs.preferred_cuisines,
-                'meals_per_day': prefs.meals_per_day,
-                'preferred_meal_times': prefs.preferred_meal_times,
-            },
-            'targets': {
-                'calories': prefs.calorie_target,
-                'protein': prefs.protein_target,
-                'carbs': prefs.carb_target,
-                'fat': prefs.fat_target,
-            },
-            'current_plan': {
-                'planned_meals': planned_meals,
-                'daily_totals': daily_totals,
-                'meal_slots': meal_slots,
-                'week_dates': [d.isoformat() for d in week_dates],
-                'planned_meals_count': planned_meals_qs.count(),
-            },
-            'nutrition_adherence': nutrition_adherence,
-            'saved_meals': {
-                'count': saved_meals.count(),
-                'meals': saved_meals_data
-            },
-            'history': {
-                'meal_plan_versions': version_history,
-                'shopping_list_versions': shopping_history
-            },
-            'meal_analysis': prefs.meal_planning_analysis,
-            'meal_baseline': prefs.meal_baseline,
-            'summary': summary,
-            'key_metrics': get_key_user_metrics(user),
-        }
-        
+        diet_data = {}
+        for values in build_diet_sections(user, DIET_SNAPSHOT_SECTIONS).values():
+            for path, value in values.items():
+                set_snapshot_path(diet_data, path, value)
         return diet_data
         
     except Exception as e:
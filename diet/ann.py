@@ -0,0 +1,153 @@
+import logging
+import os
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# IVF-flat approximate nearest neighbour search over L2-normalized vectors.
+# k-means splits the vectors into n_lists clusters ("inverted lists"); a query
+# scores the centroids, then only the vectors in its nprobe best lists. nprobe
+# trades recall for latency: nprobe == n_lists is an exact (but slower) search.
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    """Index of the most similar centroid for every vector"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, iterations: int = 20, sample_size: int = 100_000,
+                    seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) the vectors; returns (n_lists, dim) unit centroids"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    else:
+        sample = np.asarray(vectors, dtype=np.float32)
+    n_lists = max(1, min(n_lists, len(sample)))
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=n_lists)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random sample vectors
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        moved = sums / norms
+        converged = np.allclose(moved, centroids, atol=1e-5)
+        centroids = moved.astype(np.float32)
+        if converged:
+            break
+    return centroids
+
+
+class IVFIndex:
+    """Inverted lists over row positions of an external, row-aligned vector matrix"""
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)  # list i is rows[offsets[i]:offsets[i + 1]]
+        self.rows = np.asarray(rows, dtype=np.int64)
+
+    @classmethod
+    def from_labels(cls, centroids: np.ndarray, rows: np.ndarray, labels: np.ndarray) -> 'IVFIndex':
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(centroids, offsets, np.asarray(rows)[order])
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int, **kmeans_options) -> 'IVFIndex':
+        centroids = train_centroids(vectors, n_lists, **kmeans_options)
+        labels = nearest_centroids(vectors, centroids)
+        return cls.from_labels(centroids, np.arange(len(vectors)), labels)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows in the nprobe lists whose centroids are closest to the (normalized) query"""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.n_lists)
+        return np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, top_k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the approximate top_k, best first"""
+        rows = self.probe(query, nprobe)
+        if not len(rows) or top_k <= 0:
+            return rows[:0], np.zeros(0, dtype=np.float32)
+        scores = vectors[rows] @ query
+        k = min(top_k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+
+# --- persistence --------------------------------------------------------------
+# Lists are saved as BulkRecipe ids rather than row positions, so a saved index
+# can be attached to any load of the vector matrix (database or snapshot).
+
+class SavedIVF(NamedTuple):
+    centroids: np.ndarray
+    offsets: np.ndarray
+    ids: np.ndarray
+    model: str
+
+
+def save_ivf(path: Path, index: IVFIndex, ids: np.ndarray, model: str):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as fh:
+        np.savez(fh, centroids=index.centroids, offsets=index.offsets,
+                 ids=np.asarray(ids, dtype=np.int64)[index.rows], model=np.array(model))
+    os.replace(tmp, path)
+
+
+def load_ivf(path: Path) -> Optional[SavedIVF]:
+    try:
+        with np.load(path) as archive:
+            return SavedIVF(archive['centroids'], archive['offsets'], archive['ids'], str(archive['model']))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("ANN index %s is unreadable: %s", path, e)
+        return None
+
+
+def attach_ivf(saved: SavedIVF, ids: np.ndarray, vectors: np.ndarray) -> IVFIndex:
+    """Map a saved index onto the current rows; rows it has not seen go to their nearest list"""
+    labels = np.repeat(np.arange(len(saved.centroids), dtype=np.int32), np.diff(saved.offsets))
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    pos = np.clip(np.searchsorted(sorted_ids, saved.ids), 0, max(len(ids) - 1, 0))
+    found = sorted_ids[pos] == saved.ids if len(ids) else np.zeros(len(saved.ids), dtype=bool)
+    rows = order[pos[found]]
+    labels = labels[found]
+
+    covered = np.zeros(len(ids), dtype=bool)
+    covered[rows] = True
+    missing = np.flatnonzero(~covered)
+    if len(missing):
+        rows = np.concatenate([rows, missing])
+        labels = np.concatenate([labels, nearest_centroids(vectors[missing], saved.centroids)])
+    return IVFIndex.from_labels(saved.centroids, rows, labels)
@@ -0,0 +1,67 @@
+import struct
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# Binary layout of BulkRecipe.embedding_vector:
+#   magic (4s) | dtype code (B) | reserved (B) | dimension (I) | model name length (H) | model name (utf-8) | vector
+# All little-endian; the vector is `dimension` float32 or float16 values.
+MAGIC = b'EMB1'
+HEADER = struct.Struct('<4sBBIH')
+
+DTYPE_CODES = {
+    'float32': 1,
+    'float16': 2,
+}
+CODE_DTYPES = {code: np.dtype(name).newbyteorder('<') for name, code in DTYPE_CODES.items()}
+
+
+class EmbeddingHeader(NamedTuple):
+    dtype: np.dtype
+    dim: int
+    model: str
+    offset: int  # where the vector payload starts
+
+
+class DecodedEmbedding(NamedTuple):
+    vector: np.ndarray  # always float32
+    model: str
+
+
+def pack_embedding(vector: Sequence[float], model: str, dtype: str = 'float32') -> bytes:
+    """Encode an embedding as header + raw little-endian floats"""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    arr = np.asarray(vector, dtype=CODE_DTYPES[DTYPE_CODES[dtype]]).ravel()
+    model_bytes = (model or '').encode('utf-8')
+    header = HEADER.pack(MAGIC, DTYPE_CODES[dtype], 0, arr.shape[0], len(model_bytes))
+    return header + model_bytes + arr.tobytes()
+
+
+def read_header(blob: bytes) -> EmbeddingHeader:
+    """Parse the header without touching the vector payload"""
+    if isinstance(blob, memoryview):
+        blob = blob.tobytes()
+    if len(blob) < HEADER.size:
+        raise ValueError("Embedding blob is too short")
+    magic, code, _, dim, model_len = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not an embedding blob")
+    if code not in CODE_DTYPES:
+        raise ValueError(f"Unknown embedding dtype code: {code}")
+    offset = HEADER.size + model_len
+    model = blob[HEADER.size:offset].decode('utf-8')
+    return EmbeddingHeader(CODE_DTYPES[code], dim, model, offset)
+
+
+def unpack_embedding(blob) -> Optional[DecodedEmbedding]:
+    """Decode a blob written by pack_embedding (None for empty input)"""
+    if not blob:
+        return None
+    blob = bytes(blob)  # BinaryField returns memoryview on some backends
+    header = read_header(blob)
+    expected = header.offset + header.dim * header.dtype.itemsize
+    if len(blob) != expected:
+        raise ValueError(f"Embedding blob has {len(blob)} bytes, expected {expected}")
+    vector = np.frombuffer(blob, dtype=header.dtype, count=header.dim, offset=header.offset)
+    return DecodedEmbedding(vector.astype(np.float32), header.model)
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+from django.conf import settings
+
+# Embedding backends for RAG recipe search, selected by RAG_EMBEDDING_PROVIDER:
+#   'openai'  - OpenAI embeddings API, model RAG_EMBEDDING_MODEL
+#   'hashing' - local feature-hashing vectors (RAG_HASHING_DIMENSIONS wide), no network or per-call cost
+# Every stored vector records provider.model_name, so switching providers makes the
+# index ignore old vectors until generate_embeddings has re-embedded the recipes.
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into fixed-width dense vectors"""
+
+    model_name = ''
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts, in input order; raises on failure"""
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Remote embeddings from the OpenAI API"""
+
+    def __init__(self, model: str):
+        self.model_name = model
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            return self._client
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model_name, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=200_000)
+def _hashed_feature(feature: str, dimensions: int):
+    """(bucket, sign) for a feature; blake2b keeps it stable across processes, unlike hash()"""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest % dimensions, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local CPU-only embeddings by feature hashing.
+    Word unigrams and bigrams are hashed into signed buckets with sublinear
+    term-frequency weights and the result is L2-normalized, so cosine
+    similarity behaves like TF weighted term overlap. No corpus statistics
+    are involved, so a text always maps to the same vector.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+        self.model_name = f'feature-hashing-{dimensions}-v1'
+
+    def features(self, text: str) -> Counter:
+        words = _TOKEN.findall((text or '').lower())
+        features = Counter(words)
+        features.update(f'{first} {second}' for first, second in zip(words, words[1:]))
+        return features
+
+    def embed_text(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        features = self.features(text)
+        if features:
+            buckets, signs = zip(*(_hashed_feature(feature, self.dimensions) for feature in features))
+            weights = np.array(signs) * (1.0 + np.log(np.array(list(features.values()), dtype=np.float64)))
+            np.add.at(vector, np.array(buckets), weights.astype(np.float32))
+            norm = float(np.linalg.norm(vector))
+            if norm:
+                vector /= norm
+        return vector.tolist()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_text(text) for text in texts]
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """The configured provider (one instance per configuration, shared by all threads)"""
+    name = name or getattr(settings, 'RAG_EMBEDDING_PROVIDER', 'openai')
+    if name == 'openai':
+        key = (name, settings.RAG_EMBEDDING_MODEL)
+    elif name == 'hashing':
+        key = (name, getattr(settings, 'RAG_HASHING_DIMENSIONS', 512))
+    else:
+        raise ValueError(f"Unknown RAG_EMBEDDING_PROVIDER: {name}")
+
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = OpenAIEmbeddingProvider(key[1]) if name == 'openai' else HashingEmbeddingProvider(key[1])
+            _providers[key] = provider
+        return provider
+
+
+def embedding_model_name() -> str:
+    """Model name stored with (and expected of) recipe and query embeddings"""
+    return get_embedding_provider().model_name
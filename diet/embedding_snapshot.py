@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_providers import embedding_model_name
+
+logger = logging.getLogger(__name__)
+
+# On-disk layout inside RAG_SNAPSHOT_DIR:
+#   CURRENT                  -> {"version": N}, swapped atomically when a new snapshot is published
+#   manifest-<N>.json        -> model, dimension, row count, created_at
+#   vectors-<N>.npy          -> (count, dim) float32, rows already L2-normalized
+#   ids-<N>.npy              -> (count,) int64 BulkRecipe ids, row-aligned with vectors
+#   attrs-<N>.npz            -> row-aligned filter attributes (see recipe_attributes)
+#   STALE                    -> touched whenever an embedding changes after the snapshot was taken
+SNAPSHOT_FORMAT = 2
+CURRENT_FILE = 'CURRENT'
+STALE_FILE = 'STALE'
+
+
+class Snapshot(NamedTuple):
+    ids: np.ndarray
+    vectors: np.ndarray  # read-only numpy.memmap shared through the OS page cache
+    attributes: Dict[str, np.ndarray]
+    manifest: dict
+
+
+def snapshot_dir() -> Optional[Path]:
+    """Configured snapshot directory, or None when snapshots are disabled"""
+    path = getattr(settings, 'RAG_SNAPSHOT_DIR', None)
+    return Path(path) if path else None
+
+
+def _atomic_write(path: Path, write):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as fh:
+        write(fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def mark_stale():
+    """Record that the stored embeddings changed after the current snapshot was written"""
+    directory = snapshot_dir()
+    if directory is None or not (directory / CURRENT_FILE).exists():
+        return
+    try:
+        (directory / STALE_FILE).touch()
+    except OSError as e:
+        logger.warning("Could not mark embedding snapshot stale: %s", e)
+
+
+def current_manifest() -> Optional[dict]:
+    directory = snapshot_dir()
+    if directory is None:
+        return None
+    try:
+        with open(directory / CURRENT_FILE) as fh:
+            version = json.load(fh)['version']
+        with open(directory / f'manifest-{version}.json') as fh:
+            return json.load(fh)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def is_fresh(manifest: Optional[dict]) -> bool:
+    """A snapshot is fresh if it matches the configured model and nothing changed since it was taken"""
+    if not manifest or manifest.get('format') != SNAPSHOT_FORMAT:
+        return False
+    if manifest.get('model') != embedding_model_name():
+        return False
+    try:
+        stale_at = (snapshot_dir() / STALE_FILE).stat().st_mtime
+    except OSError:
+        stale_at = 0.0
+    return manifest['created_at'] >= stale_at
+
+
+def open_snapshot() -> Optional[Snapshot]:
+    """Memory-map the current snapshot if it is present and fresh (never touches the database)"""
+    manifest = current_manifest()
+    if not is_fresh(manifest):
+        return None
+    directory = snapshot_dir()
+    version = manifest['version']
+    try:
+        vectors = np.load(directory / f'vectors-{version}.npy', mmap_mode='r')
+        ids = np.load(directory / f'ids-{version}.npy')
+        with np.load(directory / f'attrs-{version}.npz') as archive:
+            attributes = {name: archive[name] for name in archive.files}
+    except (OSError, ValueError) as e:
+        logger.warning("Embedding snapshot %s is unreadable: %s", version, e)
+        return None
+    if vectors.shape != (manifest['count'], manifest['dim']) or len(ids) != manifest['count']:
+        logger.warning("Embedding snapshot %s does not match its manifest", version)
+        return None
+    return Snapshot(ids, vectors, attributes, manifest)
+
+
+def write_snapshot(ids: np.ndarray, vectors: np.ndarray, attributes: Dict[str, np.ndarray], model: str,
+                   created_at: float, keep: int = 2) -> dict:
+    """
+    Publish a new snapshot version. created_at must be taken *before* the rows were
+    read, so a change that races the export leaves the new snapshot marked stale.
+    """
+    directory = snapshot_dir()
+    if directory is None:
+        raise ValueError("RAG_SNAPSHOT_DIR is not configured")
+    directory.mkdir(parents=True, exist_ok=True)
+
+    previous = current_manifest()
+    version = (previous['version'] + 1) if previous else 1
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'model': model,
+        'dim': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        'count': int(len(ids)),
+        'created_at': created_at,
+    }
+
+    _atomic_write(directory / f'vectors-{version}.npy', lambda fh: np.save(fh, vectors))
+    _atomic_write(directory / f'ids-{version}.npy', lambda fh: np.save(fh, ids))
+    _atomic_write(directory / f'attrs-{version}.npz', lambda fh: np.savez(fh, **attributes))
+    _atomic_write(directory / f'manifest-{version}.json', lambda fh: fh.write(json.dumps(manifest).encode()))
+    _atomic_write(directory / CURRENT_FILE, lambda fh: fh.write(json.dumps({'version': version}).encode()))
+
+    # Older versions may still be mapped by running workers; on POSIX unlinking is
+    # safe for them, but keep the previous one around for workers that are mid-reload.
+    for old in range(version - keep, 0, -1):
+        removed = False
+        for name in (f'vectors-{old}.npy', f'ids-{old}.npy', f'attrs-{old}.npz', f'manifest-{old}.json'):
+            try:
+                (directory / name).unlink()
+                removed = True
+            except FileNotFoundError:
+                pass
+        if not removed:
+            break
+    return manifest
+
@@ -0,0 +1,183 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Shared keep-alive HTTP clients for the external APIs (USDA FoodData Central, TheMealDB).
+# Each upstream gets one requests.Session per process with its own connection pool,
+# connect/read timeouts and retries (exponential backoff with jitter, honouring
+# Retry-After), so calls reuse TCP+TLS connections instead of handshaking every time
+# and a stalled upstream can no longer pin a worker. Every call is timed into a
+# per-endpoint latency histogram.
+
+CLIENT_DEFAULTS = {
+    'pool_maxsize': 10,        # connections kept open to the host
+    'connect_timeout': 3.05,
+    'read_timeout': 10.0,
+    'retries': 3,
+    'backoff_factor': 0.5,     # 0.5s, 1s, 2s... before each retry
+    'backoff_jitter': 0.5,     # plus up to this many random seconds
+}
+
+UPSTREAMS = {
+    'usda': 'https://api.nal.usda.gov/fdc/v1',
+    'mealdb': 'https://www.themealdb.com/api/json/v1/1',
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LatencyHistogram:
+    """Call latencies in fixed millisecond buckets, plus count, errors, mean and max"""
+
+    BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # last bucket is everything slower
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float, ok: bool = True):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+            self.count += 1
+            self.errors += 0 if ok else 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound (ms) of the bucket holding the given fraction of calls"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f'<={bound}ms' for bound in self.BUCKETS_MS] + [f'>{self.BUCKETS_MS[-1]}ms']
+            return {
+                'count': self.count,
+                'errors': self.errors,
+                'mean_ms': round(self.total_ms / self.count, 1) if self.count else None,
+                'max_ms': round(self.max_ms, 1),
+                'p50_ms': self.percentile(0.5),
+                'p95_ms': self.percentile(0.95),
+                'p99_ms': self.percentile(0.99),
+                'buckets': dict(zip(labels, self.counts)),
+            }
+
+
+class PooledClient:
+    """A keep-alive session for one upstream host with timeouts, retries and latency histograms"""
+
+    def __init__(self, name: str, base_url: str, **options):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.options = {**CLIENT_DEFAULTS, **options}
+        self.timeout = (self.options['connect_timeout'], self.options['read_timeout'])
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=self.options['retries'],
+            backoff_factor=self.options['backoff_factor'],
+            backoff_jitter=self.options['backoff_jitter'],
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # hand the last response back so callers' raise_for_status still applies
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.options['pool_maxsize'], max_retries=retry, pool_block=False
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def histogram(self, endpoint: str) -> LatencyHistogram:
+        with self._lock:
+            return self.histograms.setdefault(endpoint, LatencyHistogram())
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None, endpoint: Optional[str] = None) -> requests.Response:
+        """GET base_url/path; `endpoint` labels the histogram (defaults to the path)"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.get(f'{self.base_url}/{path.lstrip("/")}', params=params, timeout=self.timeout)
+            ok = response.ok
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            self.histogram(endpoint or path).observe(elapsed, ok)
+            logger.debug("%s %s took %.0fms", self.name, endpoint or path, elapsed * 1000)
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None, endpoint: Optional[str] = None) -> Any:
+        response = self.get(path, params=params, endpoint=endpoint)
+        response.raise_for_status()
+        return response.json()
+
+    def latency_report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {endpoint: histogram.snapshot() for endpoint, histogram in sorted(histograms.items())}
+
+
+_clients: Dict[str, PooledClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> PooledClient:
+    """The process-wide client for an upstream, configured from EXTERNAL_HTTP_CLIENTS[name]"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                options = getattr(settings, 'EXTERNAL_HTTP_CLIENTS', {}).get(name, {})
+                client = _clients[name] = PooledClient(name, UPSTREAMS[name], **options)
+    return client
+
+
+def latency_report() -> Dict[str, Dict[str, Any]]:
+    """Latency histograms of every client used in this process, by upstream and endpoint"""
+    return {name: client.latency_report() for name, client in sorted(_clients.items())}
+
+
+class MealDBClient:
+    """TheMealDB endpoints used by the diet app, over the shared 'mealdb' pool"""
+
+    def __init__(self):
+        self.http = get_client('mealdb')
+
+    def search(self, query: str) -> Dict[str, Any]:
+        return self.http.get_json('search.php', {'s': query}, endpoint='search')
+
+    def search_by_letter(self, letter: str) -> Dict[str, Any]:
+        return self.http.get_json('search.php', {'f': letter}, endpoint='search_by_letter')
+
+    def lookup(self, meal_id) -> Dict[str, Any]:
+        return self.http.get_json('lookup.php', {'i': meal_id}, endpoint='lookup')
+
+    def categories(self) -> Dict[str, Any]:
+        return self.http.get_json('categories.php', endpoint='categories')
+
+    def filter_by_category(self, category: str) -> Dict[str, Any]:
+        """Meals in a category (id, name and thumbnail only - use lookup() for the full record)"""
+        return self.http.get_json('filter.php', {'c': category}, endpoint='filter_by_category')
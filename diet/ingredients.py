@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional
+
+from django.db import transaction
+
+from . import measures
+from .utils import normalize_ingredient
+
+# Ingredients parsed once, when a UserSavedMeal or BulkRecipe is saved, instead of
+# walking strIngredient1..20 / strMeasure1..20 in raw_mealdb_data on every access.
+# Each row keeps the result in parsed_ingredients together with the parser version
+# that produced it; rows from an older version are re-parsed on read, and stored again
+# when read in bulk, until manage.py rebuild_parsed_ingredients brings them all up to date.
+
+# Bump whenever the parsed shape or diet.measures/normalize_ingredient change
+PARSER_VERSION = 4
+MAX_INGREDIENTS = 20  # MealDB records carry strIngredient1..20
+
+
+def raw_ingredients(data: Optional[dict]) -> List[Dict[str, str]]:
+    """[{'ingredient', 'measure'}] from a MealDB record, skipping empty slots"""
+    ingredients = []
+    if not data:
+        return ingredients
+    for i in range(1, MAX_INGREDIENTS + 1):
+        # the API sends None, '' or 'null' for unused slots
+        ingredient = (data.get(f'strIngredient{i}') or '').strip()
+        measure = (data.get(f'strMeasure{i}') or '').strip()
+        if ingredient and ingredient.lower() != 'null':
+            ingredients.append({'ingredient': ingredient, 'measure': measure})
+    return ingredients
+
+
+def parse_ingredients(data: Optional[dict]) -> List[dict]:
+    """
+    Structured ingredients of a MealDB record: the original ingredient and measure, the
+    parsed amount and unit, the canonical ingredient key, and the quantity converted to
+    its dimension's base unit (see diet.measures) for the shopping list.
+    """
+    return [parse_ingredient(ing['ingredient'], ing['measure']) for ing in raw_ingredients(data)]
+
+
+def parse_ingredient(ingredient: str, measure: str) -> dict:
+    parsed = measures.parse(measure)
+    return {
+        'ingredient': ingredient,
+        'measure': measure,
+        'amount': parsed.amount,
+        'unit': parsed.unit,
+        'key': normalize_ingredient(ingredient),
+        'dimension': parsed.dimension,
+        'quantity': parsed.quantity,
+        'base_unit': parsed.base_unit,
+    }
+
+
+def as_ingredients_list(parsed: List[dict]) -> List[Dict[str, str]]:
+    """The {'ingredient', 'measure'} shape get_ingredients_list() has always returned"""
+    return [{'ingredient': ing['ingredient'], 'measure': ing['measure']} for ing in parsed]
+
+
+def parsed_ingredients_for(queryset) -> Dict[int, List[dict]]:
+    """
+    {pk: parsed ingredients} for every row of a UserSavedMeal/BulkRecipe queryset in one
+    query, without loading raw_mealdb_data. Rows parsed by an older version cost one more
+    query and are stored re-parsed, so they cost it only once.
+    """
+    parsed, stale = {}, []
+    for pk, items, version in queryset.values_list('pk', 'parsed_ingredients', 'parsed_ingredients_version'):
+        if version == PARSER_VERSION:
+            parsed[pk] = items
+        else:
+            stale.append(pk)
+    if stale:
+        model = queryset.model
+        updated = []
+        for pk, data in model.objects.filter(pk__in=stale).values_list('pk', 'raw_mealdb_data'):
+            parsed[pk] = parse_ingredients(data)
+            updated.append(model(pk=pk, parsed_ingredients=parsed[pk], parsed_ingredients_version=PARSER_VERSION))
+        model.objects.bulk_update(updated, ['parsed_ingredients', 'parsed_ingredients_version'])
+    return parsed
+
+
+def rebuild_parsed_ingredients(model, batch_size: int = 500, force: bool = False) -> int:
+    """
+    Re-parse the rows of model stored by an older parser version (every row with force),
+    one transaction per batch; returns the number of rows written.
+    """
+    rows = model.objects.order_by('pk')
+    if not force:
+        rows = rows.exclude(parsed_ingredients_version=PARSER_VERSION)
+    written = 0
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk).only('pk', 'raw_mealdb_data')[:batch_size])
+        if not batch:
+            return written
+        last_pk = batch[-1].pk
+        for row in batch:
+            row.parsed_ingredients = parse_ingredients(row.raw_mealdb_data)
+            row.parsed_ingredients_version = PARSER_VERSION
+        with transaction.atomic():
+            model.objects.bulk_update(batch, ['parsed_ingredients', 'parsed_ingredients_version'])
+        written += len(batch)
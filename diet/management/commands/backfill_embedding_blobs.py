@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from diet.embedding_codec import DTYPE_CODES, pack_embedding
+from diet.models import BulkRecipe, LEGACY_EMBEDDING_MODEL
+from diet.rag_utils import fill_missing_text_hashes
+
+
+class Command(BaseCommand):
+    help = 'Convert legacy JSON BulkRecipe.embedding vectors into the binary embedding_vector column'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Rows converted per transaction (default: 200)'
+        )
+        parser.add_argument(
+            '--dtype',
+            choices=sorted(DTYPE_CODES),
+            default=None,
+            help='Stored precision (default: RAG_EMBEDDING_DTYPE)'
+        )
+        parser.add_argument(
+            '--model',
+            default=LEGACY_EMBEDDING_MODEL,
+            help=f'Model name written to the header of converted vectors (default: {LEGACY_EMBEDDING_MODEL})'
+        )
+        parser.add_argument(
+            '--keep-json',
+            action='store_true',
+            help='Keep the JSON copy instead of clearing it after conversion'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dtype = options['dtype'] or settings.RAG_EMBEDDING_DTYPE
+        model = options['model']
+        keep_json = options['keep_json']
+
+        pending = BulkRecipe.objects.filter(embedding_vector__isnull=True, embedding__isnull=False).order_by('id')
+        self.stdout.write(f'Converting {pending.count()} legacy embeddings to {dtype}...')
+
+        converted = 0
+        cleared = 0
+        json_bytes = 0
+        blob_bytes = 0
+        last_id = 0
+        while True:
+            rows = list(pending.filter(id__gt=last_id).values_list('id', 'embedding')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for recipe_id, embedding in rows:
+                if isinstance(embedding, list) and embedding:
+                    blob = pack_embedding(embedding, model, dtype)
+                    json_bytes += len(str(embedding))
+                    blob_bytes += len(blob)
+                    converted += 1
+                else:
+                    blob = None  # '{}' and other junk left over from failed runs
+                    cleared += 1
+                updates.append(BulkRecipe(
+                    id=recipe_id,
+                    embedding_vector=blob,
+                    embedding=embedding if (keep_json and blob) else None,
+                ))
+
+            with transaction.atomic():
+                BulkRecipe.objects.bulk_update(updates, ['embedding_vector', 'embedding'])
+            self.stdout.write(f'  ...{converted + cleared} rows processed')
+
+        hashed = fill_missing_text_hashes(batch_size)
+        self.stdout.write(f'Recorded text hashes for {hashed} embeddings stored without one')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfill complete! Converted: {converted}, Cleared invalid: {cleared}'))
+        if blob_bytes:
+            self.stdout.write(
+                f'Approximate size: {json_bytes / 1024:.0f} KB as JSON -> {blob_bytes / 1024:.0f} KB binary '
+                f'({json_bytes / blob_bytes:.1f}x smaller)'
+            )
@@ -0,0 +1,123 @@
+import math
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from diet.ann import IVFIndex
+
+
+def _synthetic_vectors(rng, count, dim, centers, spread=0.6, chunk_size=100_000):
+    """Unit vectors scattered around random topic centers (embeddings are clustered, not uniform)"""
+    vectors = np.empty((count, dim), dtype=np.float32)
+    noise_scale = spread / math.sqrt(dim)  # noise vector norm ~ spread, relative to unit centers
+    for start in range(0, count, chunk_size):
+        n = min(chunk_size, count - start)
+        noise = noise_scale * rng.standard_normal((n, dim), dtype=np.float32)
+        chunk = centers[rng.integers(0, len(centers), n)] + noise
+        vectors[start:start + n] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    return vectors
+
+
+def _exact_top_k(vectors, query, k):
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _percentiles(timings):
+    ms = np.array(timings) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark IVF recall@k and latency against exact search on synthetic embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10000,100000,1000000',
+            help='Comma-separated corpus sizes (default: 10000,100000,1000000)'
+        )
+        parser.add_argument(
+            '--dim',
+            type=int,
+            default=64,
+            help='Vector dimension (default: 64; 1M x 1536 float32 would need ~6 GB)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Queries per measurement (default: 200)'
+        )
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=10,
+            help='Neighbours per query (default: 10)'
+        )
+        parser.add_argument(
+            '--nprobe',
+            default='1,4,8,16,32',
+            help='Comma-separated nprobe values to measure (default: 1,4,8,16,32)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=10,
+            help='k-means iterations (default: 10)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed'
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        dim = options['dim']
+        k = options['k']
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        nprobes = [int(n) for n in options['nprobe'].split(',') if n.strip()]
+
+        for size in sizes:
+            centers = rng.standard_normal((max(16, size // 200), dim), dtype=np.float32)
+            centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+            vectors = _synthetic_vectors(rng, size, dim, centers)
+            queries = _synthetic_vectors(rng, options['queries'], dim, centers)
+
+            n_lists = max(1, int(4 * math.sqrt(size)))
+            started = time.perf_counter()
+            ivf = IVFIndex.build(vectors, n_lists, iterations=options['iterations'], seed=options['seed'])
+            build_seconds = time.perf_counter() - started
+
+            self.stdout.write(self.style.SUCCESS(
+                f'\n{size:,} vectors, dim={dim}, {n_lists} lists (built in {build_seconds:.1f}s)'
+            ))
+
+            exact = []
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                exact.append(set(_exact_top_k(vectors, query, k).tolist()))
+                timings.append(time.perf_counter() - started)
+            p50, p99 = _percentiles(timings)
+            self.stdout.write(f'  exact        recall@{k} 1.000   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms')
+
+            for nprobe in nprobes:
+                if nprobe > n_lists:
+                    continue
+                timings = []
+                hits = 0
+                for query, truth in zip(queries, exact):
+                    started = time.perf_counter()
+                    rows, _ = ivf.search(vectors, query, k, nprobe)
+                    timings.append(time.perf_counter() - started)
+                    hits += len(truth & set(rows.tolist()))
+                p50, p99 = _percentiles(timings)
+                recall = hits / (k * len(queries))
+                self.stdout.write(
+                    f'  nprobe={nprobe:<5} recall@{k} {recall:.3f}   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms'
+                )
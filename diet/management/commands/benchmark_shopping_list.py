@@ -0,0 +1,106 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from diet.ingredients import parse_ingredient
+from diet.shopping import aggregate_plans
+
+INGREDIENTS = [
+    'Chicken Breast', 'Beef Mince', 'Pork Belly', 'Salmon', 'Prawns', 'Eggs', 'Milk', 'Double Cream',
+    'Butter', 'Cheddar Cheese', 'Greek Yogurt', 'Onion', 'Red Onion', 'Garlic', 'Ginger', 'Carrots',
+    'Potatoes', 'Tomatoes', 'Chopped Tomatoes', 'Spinach', 'Lettuce', 'Plain Flour', 'Sugar', 'Rice',
+    'Spaghetti', 'Olive Oil', 'Vegetable Oil', 'Soy Sauce', 'Vinegar', 'Chicken Stock', 'Salt',
+    'Black Pepper', 'Cumin', 'Paprika', 'Cinnamon', 'Oregano', 'Parsley', 'Coriander', 'Lemon', 'Honey',
+]
+MEASURES = [
+    '1 cup', '1/2 cup', '¾ cup', '1½ tbsp', '2 tbsp', '1 tsp', '1/4 tsp', '200g', '500 g', '1 kg', '1 lb',
+    '8 oz', '2-3 cloves', '3 cloves', '1 can', '400ml', '1 litre', '2 fl oz', '1', '2', '3 large',
+    'Pinch', 'to taste', 'Handful', '1 bunch', '', 'Dash', '1 1/2 cups',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark measure parsing and shopping list aggregation on a synthetic plan corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            default='100,1000,10000',
+            help='Comma-separated numbers of users aggregated at once (default: 100,1000,10000)'
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=500,
+            help='Distinct recipes the plans draw from (default: 500)'
+        )
+        parser.add_argument(
+            '--meals-per-week',
+            type=int,
+            default=21,
+            help='Planned meals per user and week (default: 21)'
+        )
+        parser.add_argument(
+            '--weeks',
+            type=int,
+            default=1,
+            help='Weeks per user, each aggregated as its own plan (default: 1)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        raw_recipes = [
+            [(rng.choice(INGREDIENTS), rng.choice(MEASURES)) for _ in range(rng.randint(5, 20))]
+            for _ in range(options['recipes'])
+        ]
+
+        started = time.perf_counter()
+        recipes = [[parse_ingredient(name, measure) for name, measure in recipe] for recipe in raw_recipes]
+        lines = sum(len(recipe) for recipe in recipes)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Parsed {lines:,} ingredient lines of {len(recipes)} recipes in {elapsed * 1000:.1f} ms '
+            f'({lines / elapsed:,.0f} lines/s; done once at save time)'
+        )
+
+        for users in [int(n) for n in options['users'].split(',') if n.strip()]:
+            plans = {}
+            for user in range(users):
+                for week in range(options['weeks']):
+                    picks = [rng.randrange(len(recipes)) for _ in range(options['meals_per_week'])]
+                    counts = {}
+                    for pick in picks:
+                        counts[f'Meal {pick}'] = counts.get(f'Meal {pick}', 0) + 1
+                    plans[(user, week)] = (counts, {name: recipes[int(name[5:])] for name in counts})
+            planned_lines = sum(
+                len(ingredients) for _, meal_ingredients in plans.values() for ingredients in meal_ingredients.values()
+            )
+
+            started = time.perf_counter()
+            result = aggregate_plans(plans)
+            batched = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for plan_id, plan in plans.items():
+                aggregate_plans({plan_id: plan})
+            one_by_one = time.perf_counter() - started
+
+            items = sum(len(entries) for entries in result.values())
+            self.stdout.write(self.style.SUCCESS(
+                f'\n{users:,} users x {options["weeks"]} weeks: {planned_lines:,} planned ingredient lines, '
+                f'{items:,} shopping list items'
+            ))
+            self.stdout.write(
+                f'  all plans at once  {batched * 1000:9.1f} ms   ({planned_lines / batched:,.0f} lines/s)'
+            )
+            self.stdout.write(
+                f'  one plan per call  {one_by_one * 1000:9.1f} ms   '
+                f'({one_by_one / len(plans) * 1000:.2f} ms per shopping list)'
+            )
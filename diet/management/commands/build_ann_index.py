@@ -0,0 +1,70 @@
+import math
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from diet.ann import IVFIndex, save_ivf
+from diet.embedding_providers import embedding_model_name
+from diet.vector_index import RecipeVectorIndex
+
+
+class Command(BaseCommand):
+    help = 'Build the IVF approximate nearest-neighbour index over the stored recipe embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lists',
+            type=int,
+            default=None,
+            help='Number of inverted lists / k-means clusters (default: 4 * sqrt(recipes))'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='k-means iterations (default: 20)'
+        )
+        parser.add_argument(
+            '--sample-size',
+            type=int,
+            default=100_000,
+            help='Vectors used to train the centroids (default: 100000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for k-means initialization'
+        )
+
+    def handle(self, *args, **options):
+        index = RecipeVectorIndex()
+        index.load()
+        ids, vectors, _ = index.export_arrays()
+        if not len(ids):
+            self.stdout.write(self.style.WARNING('No embeddings to index. Run generate_embeddings first.'))
+            return
+
+        n_lists = options['lists'] or max(1, int(4 * math.sqrt(len(ids))))
+        n_lists = min(n_lists, len(ids))
+        self.stdout.write(f'Training {n_lists} lists over {len(ids)} vectors (dim={vectors.shape[1]})...')
+
+        started = time.perf_counter()
+        ivf = IVFIndex.build(
+            vectors,
+            n_lists,
+            iterations=options['iterations'],
+            sample_size=options['sample_size'],
+            seed=options['seed'],
+        )
+        save_ivf(settings.RAG_ANN_INDEX_PATH, ivf, ids, embedding_model_name())
+
+        sizes = ivf.offsets[1:] - ivf.offsets[:-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote IVF index to {settings.RAG_ANN_INDEX_PATH} in {time.perf_counter() - started:.1f}s'
+        ))
+        self.stdout.write(f'List sizes: min {sizes.min()}, median {int(np.median(sizes))}, max {sizes.max()}')
+        if settings.RAG_SEARCH_BACKEND != 'ivf':
+            self.stdout.write(self.style.WARNING("Set RAG_SEARCH_BACKEND='ivf' to serve searches from it."))
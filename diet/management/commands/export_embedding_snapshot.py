@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diet.embedding_providers import embedding_model_name
+from diet.embedding_snapshot import snapshot_dir, write_snapshot
+from diet.vector_index import RecipeVectorIndex
+
+
+class Command(BaseCommand):
+    help = 'Write the recipe embeddings to a memory-mapped snapshot shared by all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=2,
+            help='Number of snapshot versions to keep on disk (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        if snapshot_dir() is None:
+            raise CommandError('RAG_SNAPSHOT_DIR is not set; snapshots are disabled.')
+
+        # Taken before reading, so an embedding saved mid-export marks the snapshot stale
+        created_at = time.time()
+        index = RecipeVectorIndex()
+        index.load(use_snapshot=False)
+        ids, vectors, attributes = index.export_arrays()
+
+        if not len(ids):
+            self.stdout.write(self.style.WARNING('No embeddings to export. Run generate_embeddings first.'))
+            return
+
+        manifest = write_snapshot(ids, vectors, attributes, embedding_model_name(), created_at,
+                                  keep=max(options['keep'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote embedding snapshot v{manifest['version']} to {snapshot_dir()}: "
+            f"{manifest['count']} vectors, dim={manifest['dim']}"
+        ))
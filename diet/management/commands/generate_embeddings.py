@@ -1,5 +1,6 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from diet.rag_utils import update_recipe_embeddings
+from diet.rag_utils import fill_missing_text_hashes, recipes_needing_embeddings, update_recipe_embeddings
 from diet.models import BulkRecipe
 
 
@@ -10,7 +11,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Force regeneration of all embeddings (even if they exist)'
+            help='Force regeneration of all embeddings (even if the recipe text is unchanged)'
         )
         parser.add_argument(
             '--limit',
@@ -18,6 +19,23 @@ class Command(BaseCommand):
             default=None,
             help='Limit number of recipes to process (for testing)'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Recipes per embeddings API request (default: 100)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent embeddings API requests (default: 4)'
+        )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help='Export a memory-mapped embedding snapshot for the web workers afterwards'
+        )
 
     def handle(self, *args, **options):
         force = options['force']
@@ -27,16 +45,21 @@ class Command(BaseCommand):
             self.style.SUCCESS('Starting embedding generation for RAG...')
         )
         
-        # Get recipes to process
+        # Get recipes to process; without --force, only new recipes and recipes whose text changed
         if force:
-            recipes = BulkRecipe.objects.all()
+            recipes = BulkRecipe.objects.order_by('id')
             self.stdout.write('Forcing regeneration of all embeddings...')
+            if limit:
+                recipes = BulkRecipe.objects.filter(id__in=list(recipes.values_list('id', flat=True)[:limit]))
         else:
-            recipes = BulkRecipe.objects.filter(embedding__isnull=True)
-            self.stdout.write(f'Generating embeddings for {recipes.count()} recipes without embeddings...')
+            # embeddings stored before text hashes were kept count as up to date
+            hashed = fill_missing_text_hashes()
+            if hashed:
+                self.stdout.write(f'Recorded text hashes for {hashed} existing embeddings')
+            recipes = BulkRecipe.objects.filter(id__in=recipes_needing_embeddings(limit))
+            self.stdout.write('Generating embeddings for new or changed recipes...')
         
         if limit:
-            recipes = recipes[:limit]
             self.stdout.write(f'Limited to {limit} recipes for testing...')
         
         # Show progress
@@ -45,15 +68,20 @@ class Command(BaseCommand):
         
         if total_recipes == 0:
             self.stdout.write(
-                self.style.WARNING('No recipes to process. Use --force to regenerate all embeddings.')
+                self.style.WARNING('No recipes to process.')
             )
             return
         
         # Update embeddings
-        updated_count = update_recipe_embeddings()
+        stats = update_recipe_embeddings(
+            recipes,
+            force=force,
+            batch_size=max(options['batch_size'], 1),
+            max_workers=max(options['workers'], 1),
+        )
         
         # Show results
-        total_with_embeddings = BulkRecipe.objects.filter(embedding__isnull=False).exclude(embedding={}).count()
+        total_with_embeddings = BulkRecipe.with_embeddings().count()
         total_recipes = BulkRecipe.objects.count()
         
         self.stdout.write(
@@ -61,8 +89,17 @@ class Command(BaseCommand):
                 f'Embedding generation complete!'
             )
         )
-        self.stdout.write(f'Updated: {updated_count} recipes')
+        self.stdout.write(f"Updated: {stats['updated']} recipes")
+        self.stdout.write(f"Unchanged (skipped): {stats['skipped']} recipes")
+        self.stdout.write(f"API requests: {stats['requests']}")
+        if stats['failed']:
+            self.stdout.write(
+                self.style.WARNING(f"Failed: {stats['failed']} recipes (re-run to retry them)")
+            )
         self.stdout.write(f'Total recipes with embeddings: {total_with_embeddings}/{total_recipes}')
+
+        if options['snapshot']:
+            call_command('export_embedding_snapshot', stdout=self.stdout._out)
         
         if total_with_embeddings >= 500:
             self.stdout.write(
@@ -1,9 +1,9 @@
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from diet.models import BulkRecipe
-import requests
+from diet.http_clients import MealDBClient, latency_report
+from diet.rate_limit import TokenBucket
+from diet.recipe_ingest import RecipeImporter, run_concurrently
 import time
-import json
 from tqdm import tqdm
 
 
@@ -27,86 +27,99 @@ class Command(BaseCommand):
             '--delay',
             type=float,
             default=0.1,
-            help='Delay between API calls in seconds (default: 0.1)'
+            help='Minimum seconds between API calls across all workers (default: 0.1, i.e. 10 calls/s)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent API calls (default: 4)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Recipes written per bulk insert (default: 500)'
+        )
+        parser.add_argument(
+            '--categories',
+            action='store_true',
+            help='After the letters, also walk every MealDB category and look up meals not found yet'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Refresh recipes that are already stored instead of skipping them'
         )
 
     def handle(self, *args, **options):
         letters = options['letters']
         limit = options['limit']
+        workers = max(options['workers'], 1)
         delay = options['delay']
         
         self.stdout.write(
             self.style.SUCCESS(f'Starting bulk recipe load...')
         )
+        started = time.perf_counter()
+        
+        mealdb = MealDBClient()
+        # calls are paced by one token bucket (burst of one per worker), fetched concurrently,
+        # and every DB write happens here on the main thread in batches
+        rate_limiter = TokenBucket('mealdb:import', rate_per_second=1 / delay, capacity=workers) if delay > 0 else None
+        importer = RecipeImporter(batch_size=options['batch_size'], update_existing=options['update'], limit=limit)
+        self.stdout.write(f'{len(importer.existing)} recipes already stored')
         
-        total_loaded = 0
-        total_skipped = 0
+        def report_error(e):
+            self.stdout.write(self.style.ERROR(f'Error fetching from MealDB: {e}'))
         
-        # Search by first letter (free MealDB API)
-        for letter in tqdm(letters, desc="Processing letters"):
-            if total_loaded >= limit:
-                break
-                
+        def fetch(call, *args):
+            return lambda: call(*args)
+        
+        # Search by first letter (free MealDB API) - full records, one call per letter
+        progress = tqdm(total=len(letters), desc="Processing letters")
+        
+        def handle_meals(data):
+            progress.update(1)
+            importer.add((data or {}).get('meals') or [])
+        
+        run_concurrently(
+            (fetch(mealdb.search_by_letter, letter) for letter in letters),
+            handle_meals, workers, rate_limiter, stop=lambda: importer.full, on_error=report_error
+        )
+        progress.close()
+        
+        if options['categories'] and not importer.full:
+            # category listings only carry ids, so meals not seen yet are looked up one by one
+            meal_ids = []
+            
+            def handle_listing(data):
+                for meal in (data or {}).get('meals') or []:
+                    if importer.wants(meal['idMeal']) and meal['idMeal'] not in meal_ids:
+                        meal_ids.append(meal['idMeal'])
+            
             try:
-                # Search by first letter
-                url = f'https://www.themealdb.com/api/json/v1/1/search.php?f={letter}'
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if not data.get('meals'):
-                    continue
-                
-                # Process each meal in this letter
-                for meal in data['meals']:
-                    if total_loaded >= limit:
-                        break
-                    
-                    try:
-                        with transaction.atomic():
-                            # Check if already exists
-                            if BulkRecipe.objects.filter(mealdb_id=meal['idMeal']).exists():
-                                total_skipped += 1
-                                continue
-                            
-                            # Create bulk recipe
-                            bulk_recipe = BulkRecipe.objects.create(
-                                mealdb_id=meal['idMeal'],
-                                meal_name=meal['strMeal'],
-                                category=meal.get('strCategory', '') or '',
-                                area=meal.get('strArea', '') or '',
-                                instructions=meal.get('strInstructions', '') or '',
-                                meal_thumb=meal.get('strMealThumb', '') or '',
-                                youtube_link=meal.get('strYoutube', '') or None,
-                                source_link=meal.get('strSource', '') or None,
-                                raw_mealdb_data=meal
-                            )
-                            
-                            # Generate search tags and ingredients text
-                            bulk_recipe.search_tags = bulk_recipe.generate_search_tags()
-                            bulk_recipe.update_ingredients_text()
-                            bulk_recipe.save()
-                            
-                            total_loaded += 1
-                            
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.WARNING(f'Error processing meal {meal.get("idMeal", "unknown")}: {e}')
-                        )
-                        total_skipped += 1
-                
-                # Rate limiting
-                time.sleep(delay)
-                
+                categories = [c['strCategory'] for c in mealdb.categories().get('categories') or []]
             except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error processing letter {letter}: {e}')
-                )
-                continue
+                report_error(e)
+                categories = []
+            run_concurrently(
+                (fetch(mealdb.filter_by_category, category) for category in categories),
+                handle_listing, workers, rate_limiter, on_error=report_error
+            )
+            progress = tqdm(total=len(meal_ids), desc="Looking up category meals")
+            run_concurrently(
+                (fetch(mealdb.lookup, meal_id) for meal_id in meal_ids),
+                handle_meals, workers, rate_limiter, stop=lambda: importer.full, on_error=report_error
+            )
+            progress.close()
+        
+        importer.finish()
         
         self.stdout.write(
             self.style.SUCCESS(
-                f'Bulk load complete! Loaded: {total_loaded}, Skipped: {total_skipped}'
+                f'Bulk load complete! Loaded: {importer.loaded}, Updated: {importer.updated}, '
+                f'Skipped: {importer.skipped + importer.failed} in {time.perf_counter() - started:.1f}s'
             )
         )
         
@@ -119,6 +132,12 @@ class Command(BaseCommand):
         self.stdout.write(f'Categories: {len(categories)}')
         self.stdout.write(f'Areas: {len(areas)}')
         
+        for endpoint, stats in latency_report().get('mealdb', {}).items():
+            self.stdout.write(
+                f"MealDB {endpoint}: {stats['count']} calls, {stats['errors']} errors, "
+                f"p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms, max {stats['max_ms']}ms"
+            )
+        
         if total_recipes >= 500:
             self.stdout.write(
                 self.style.SUCCESS('✅ 500+ recipe requirement satisfied!')
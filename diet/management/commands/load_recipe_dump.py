@@ -0,0 +1,82 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from diet.recipe_ingest import RecipeImporter, iter_dump_records
+
+
+class Command(BaseCommand):
+    help = 'Load MealDB-shaped recipes from local JSON/JSONL dumps (optionally .gz), without calling the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Dump files: .jsonl/.ndjson (one record per line), .json (array or {"meals": [...]}), each optionally .gz'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Recipes written per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Stop after this many new recipes'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Refresh recipes that are already stored instead of skipping them'
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=10000,
+            help='Report progress every N records read (default: 10000, 0 to disable)'
+        )
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            if not os.path.isfile(path):
+                raise CommandError(f'No such file: {path}')
+
+        importer = RecipeImporter(
+            batch_size=options['batch_size'], update_existing=options['update'], limit=options['limit'], preload=False
+        )
+        every = options['progress_every']
+        started = time.perf_counter()
+        read = 0
+
+        for path in options['paths']:
+            self.stdout.write(f'Reading {path}')
+            try:
+                for record in iter_dump_records(path):
+                    importer.add([record])
+                    read += 1
+                    if every and read % every == 0:
+                        self._progress(read, importer, started)
+                    if importer.full:
+                        break
+            except (ValueError, UnicodeDecodeError, OSError) as e:
+                importer.finish()
+                raise CommandError(f'{path}: {e} (records up to here were written)')
+            if importer.full:
+                break
+
+        importer.finish()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Read {read} records in {elapsed:.1f}s ({read / elapsed if elapsed else 0:.0f}/s). '
+                f'Loaded: {importer.loaded}, Updated: {importer.updated}, '
+                f'Skipped: {importer.skipped}, Failed: {importer.failed}'
+            )
+        )
+
+    def _progress(self, read, importer, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'  {read} read, {importer.written} written, {importer.skipped} skipped '
+            f'({read / elapsed if elapsed else 0:.0f} records/s)'
+        )
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from diet.nutrition_totals import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Check and rebuild the cached planned-meal totals and DailyNutritionTotal rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report inconsistencies, do not write (exits with an error if any are found)'
+        )
+        parser.add_argument(
+            '--user',
+            help='Limit to one user (email)'
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = get_user_model().objects.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f"No user with email {options['user']}")
+
+        fix = not options['check']
+        with transaction.atomic():
+            problems = rebuild(users, fix=fix)
+
+        for user_id, day, description in problems[:50]:
+            self.stdout.write(f'  user {user_id} {day}: {description}')
+        if len(problems) > 50:
+            self.stdout.write(f'  ...and {len(problems) - 50} more')
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Nutrition totals are consistent.'))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(problems)} inconsistencies.'))
+        else:
+            raise CommandError(f'{len(problems)} inconsistencies found. Run without --check to fix them.')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from diet.ingredients import PARSER_VERSION, rebuild_parsed_ingredients
+from diet.models import BulkRecipe, UserSavedMeal
+
+
+class Command(BaseCommand):
+    help = 'Re-parse UserSavedMeal/BulkRecipe ingredients stored by an older parser version'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows re-parsed per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-parse every row, not only outdated ones'
+        )
+
+    def handle(self, *args, **options):
+        for model in (UserSavedMeal, BulkRecipe):
+            written = rebuild_parsed_ingredients(model, batch_size=options['batch_size'], force=options['all'])
+            self.stdout.write(f'{model.__name__}: {written} rows re-parsed')
+        self.stdout.write(self.style.SUCCESS(f'Parsed ingredients are at version {PARSER_VERSION}.'))
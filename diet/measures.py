@@ -0,0 +1,154 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+# Recipe measure parsing ("1/2 cup", "1½ tbsp", "200g", "2-3 cloves") and conversion to
+# canonical units, so shopping list quantities can be summed per ingredient and dimension:
+#   mass    -> grams
+#   volume  -> millilitres
+#   count   -> pieces of a countable unit ('' for plain pieces, else 'clove', 'can', ...)
+#   other   -> no usable quantity ('to taste', 'garnish'); the measure text is kept as unit
+# Ranges count as their upper bound, since a shopping list should cover the recipe;
+# compound measures ("1 lb 8oz") add up and multiplied ones ("2 x 400g tins") multiply.
+
+MASS, VOLUME, COUNT, OTHER = 'mass', 'volume', 'count', 'other'
+BASE_UNITS = {MASS: 'g', VOLUME: 'ml'}
+LARGE_UNITS = {'g': 'kg', 'ml': 'l'}  # shown from 1000 base units up
+
+# alias -> (canonical unit, dimension, size in the dimension's base unit)
+UNITS = {}
+for _unit, _dimension, _size, _aliases in (
+    ('mg', MASS, 0.001, ('milligram', 'milligrams')),
+    ('g', MASS, 1.0, ('gr', 'grs', 'gram', 'grams', 'gramme', 'grammes')),
+    ('kg', MASS, 1000.0, ('kgs', 'kilo', 'kilos', 'kilogram', 'kilograms')),
+    ('oz', MASS, 28.3495, ('ounce', 'ounces')),
+    ('lb', MASS, 453.592, ('lbs', 'pound', 'pounds')),
+    ('ml', VOLUME, 1.0, ('mls', 'millilitre', 'millilitres', 'milliliter', 'milliliters')),
+    ('cl', VOLUME, 10.0, ('centilitre', 'centilitres')),
+    ('dl', VOLUME, 100.0, ('decilitre', 'decilitres')),
+    ('l', VOLUME, 1000.0, ('litre', 'litres', 'liter', 'liters', 'ltr')),
+    ('tsp', VOLUME, 5.0, ('t', 'tsps', 'teaspoon', 'teaspoons', 'tspn')),
+    ('tbsp', VOLUME, 15.0, ('tbs', 'tbsps', 'tblsp', 'tbls', 'tbl', 'tablespoon', 'tablespoons')),
+    ('fl oz', VOLUME, 29.5735, ('floz',)),
+    ('cup', VOLUME, 240.0, ('cups', 'c')),
+    ('pint', VOLUME, 473.176, ('pints', 'pt')),
+    ('quart', VOLUME, 946.353, ('quarts', 'qt')),
+    ('gallon', VOLUME, 3785.41, ('gallons', 'gal')),
+):
+    for _alias in (_unit,) + _aliases:
+        UNITS[_alias] = (_unit, _dimension, _size)
+
+COUNT_UNITS = {
+    'bag', 'bottle', 'bulb', 'bunch', 'can', 'clove', 'cube', 'dash', 'drop', 'fillet', 'handful',
+    'head', 'jar', 'knob', 'leaf', 'packet', 'package', 'piece', 'pinch', 'rasher', 'sachet', 'sheet',
+    'slice', 'sprig', 'stalk', 'stick', 'tin',
+}
+PLURALS = {'leaves': 'leaf', 'bunches': 'bunch', 'pinches': 'pinch', 'dashes': 'dash', 'pieces': 'piece'}
+SIZE_WORDS = {'small', 'medium', 'large', 'big', 'heaped', 'heaping', 'level', 'rounded', 'generous', 'scant'}
+NON_QUANTITIES = ('to taste', 'to serve', 'as needed', 'as required', 'garnish', 'for frying', 'for greasing')
+
+UNICODE_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4', '⅕': '1/5', '⅖': '2/5', '⅗': '3/5',
+    '⅘': '4/5', '⅙': '1/6', '⅚': '5/6', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+_FRACTION_CHARS = re.compile('[' + ''.join(UNICODE_FRACTIONS) + ']')
+_GROUPED = re.compile(r'\d{1,3}(?:,\d{3})+')  # "1,000": a comma before three digits groups thousands
+_NUMBER = r'\d+/\d+|(?:\d{1,3}(?:,\d{3})+(?!\d)|\d+(?:[.,]\d+)?|\.\d+)(?:\s+\d+/\d+)?'
+_MEASURE = re.compile(
+    rf'^(?P<amount>{_NUMBER})(?:\s*(?:-|–|to|or)\s*(?P<upper>{_NUMBER}))?\s*(?P<rest>.*)$'
+)
+_MULTIPLIED = re.compile(rf'^(?P<times>{_NUMBER})\s*[x×*]\s*(?P<each>\d.*)$')
+_WORD = re.compile(r'[a-z]+(?:\s+oz\b)?')
+_TABLESPOON_T = re.compile(r'(?<![A-Za-z-])T(?![A-Za-z-])')  # "1 T" is a tablespoon, "1 t" a teaspoon
+
+
+class Measure(NamedTuple):
+    amount: float      # as written, in `unit`
+    unit: str          # canonical unit name, count unit or measure text for OTHER
+    dimension: str
+    quantity: float    # amount in the dimension's base unit (g, ml or pieces)
+    base_unit: str     # 'g', 'ml', the count unit, or `unit` for OTHER
+
+
+def _number(text: str) -> float:
+    whole, _, fraction = text.partition(' ')
+    whole = whole.replace(',', '') if _GROUPED.fullmatch(whole) else whole.replace(',', '.')
+    if '/' in whole:
+        fraction, whole = whole, '0'
+    value = float(whole)
+    if fraction:
+        numerator, _, denominator = fraction.strip().partition('/')
+        value += float(numerator) / float(denominator) if float(denominator) else 0.0
+    return value
+
+
+def _unit(rest: str) -> Tuple[str, str, float, str]:
+    """
+    (unit, dimension, size, text after a mass or volume unit) for the text after the
+    amount; plain pieces when it names no unit
+    """
+    rest = rest.lstrip('.( ')
+    word = _WORD.match(rest)
+    while word and word.group() in SIZE_WORDS:
+        # "1 small bunch", "2 heaped tsp": the unit follows the size
+        rest = rest[word.end():].lstrip()
+        word = _WORD.match(rest)
+    if word:
+        text = ' '.join(word.group().split())
+        if text in ('fl oz', 'floz'):
+            return UNITS['fl oz'] + (rest[word.end():],)
+        token = text.split()[0]
+        if token in UNITS:
+            return UNITS[token] + (rest[len(token):],)
+        token = PLURALS.get(token, token[:-1] if token.endswith('s') and token[:-1] in COUNT_UNITS else token)
+        if token in COUNT_UNITS:
+            return token, COUNT, 1.0, ''
+    return '', COUNT, 1.0, ''
+
+
+def _amount(found) -> float:
+    """Amount of a _MEASURE match: the upper bound of a range, or a "1-1/2" mixed number"""
+    amount = _number(found.group('amount'))
+    upper = found.group('upper')
+    if upper:
+        if upper.count('/') and ' ' not in upper and _number(upper) < 1 <= amount:
+            amount += _number(upper)  # "1-1/2 cups" is a mixed number, not a range
+        else:
+            amount = max(amount, _number(upper))
+    return amount
+
+
+@lru_cache(maxsize=4096)
+def parse(measure: str) -> Measure:
+    """Parse a MealDB measure; one of anything (amount 1, plain pieces) when it has no amount"""
+    text = _TABLESPOON_T.sub('tbsp', measure or '')
+    text = ' '.join(text.lower().replace('⁄', '/').split())
+    text = _FRACTION_CHARS.sub(lambda m: ' ' + UNICODE_FRACTIONS[m.group()], text).strip()
+    multiplied = _MULTIPLIED.match(text)
+    if multiplied:
+        times = _number(multiplied.group('times'))
+        each = parse(multiplied.group('each'))
+        return each._replace(amount=each.amount * times, quantity=each.quantity * times)
+    found = _MEASURE.match(text)
+    if found:
+        amount = _amount(found)
+        unit, dimension, size, after = _unit(found.group('rest'))
+        quantity = amount * size
+        # "1 lb 8oz", "1 cup + 2 tbsp": a second amount in a smaller unit of the same dimension
+        # adds up ("200g 7oz" and a bracketed "(240ml)" only restate the first one)
+        after = after.strip()
+        after = after[1:].lstrip() if after.startswith('+') else after[4:] if after.startswith('and ') else after
+        more = _MEASURE.match(after)
+        if more:
+            _, more_dimension, more_size, _ = _unit(more.group('rest'))
+            if more_dimension == dimension and dimension in BASE_UNITS and more_size < size:
+                quantity += _amount(more) * more_size
+                amount = round(quantity / size, 6)
+    elif any(phrase in text for phrase in NON_QUANTITIES):
+        return Measure(0.0, text, OTHER, 0.0, text)
+    else:
+        amount = 1.0
+        unit, dimension, size, _ = _unit(text)
+        quantity = amount * size
+    return Measure(amount, unit, dimension, quantity, BASE_UNITS.get(dimension, unit))
+
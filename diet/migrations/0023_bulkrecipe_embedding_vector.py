@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0022_shoppinglistversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkrecipe',
+            name='embedding_vector',
+            field=models.BinaryField(blank=True, help_text='Packed float32/float16 embedding with dimension and model header', null=True),
+        ),
+    ]
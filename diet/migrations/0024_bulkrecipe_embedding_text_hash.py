@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0023_bulkrecipe_embedding_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkrecipe',
+            name='embedding_text_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the model and text the embedding was generated from', max_length=64),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0025_dailynutritiontotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIRateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.FloatField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('acquired', models.PositiveBigIntegerField(default=0)),
+                ('throttled', models.PositiveBigIntegerField(default=0)),
+                ('waited_seconds', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0026_apiratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedusdafood',
+            name='is_detailed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-17 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0027_storedusdafood_is_detailed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkrecipe',
+            name='parsed_ingredients',
+            field=models.JSONField(blank=True, default=list, help_text='Ingredients parsed from raw_mealdb_data on save'),
+        ),
+        migrations.AddField(
+            model_name='bulkrecipe',
+            name='parsed_ingredients_version',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Parser version of parsed_ingredients'),
+        ),
+        migrations.AddField(
+            model_name='usersavedmeal',
+            name='parsed_ingredients',
+            field=models.JSONField(blank=True, default=list, help_text='Ingredients parsed from raw_mealdb_data on save'),
+        ),
+        migrations.AddField(
+            model_name='usersavedmeal',
+            name='parsed_ingredients_version',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Parser version of parsed_ingredients'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 07:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0028_parsed_ingredients'),
+        ('users', '0005_alter_user_user_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanRevision',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('revision', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -3,7 +3,13 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 import json
+import numpy as np
 from django.utils import timezone
+from .embedding_codec import pack_embedding, unpack_embedding
+from .ingredients import PARSER_VERSION, as_ingredients_list, parse_ingredients
+
+# Model that produced the legacy JSON embeddings (before the binary header carried it)
+LEGACY_EMBEDDING_MODEL = "text-embedding-ada-002"
 
 
 class Ingredient(models.Model):
@@ -121,8 +127,9 @@ class StoredUSDAFood(models.Model):
     fat = models.FloatField(null=True)
     
     # metadata
-    last_fetched = models.DateTimeField(auto_now=True)
-    fetch_count = models.IntegerField(default=1)
+    last_fetched = models.DateTimeField(auto_now=True)  # last refresh from the API (see diet.usda_store)
+    fetch_count = models.IntegerField(default=1)  # times served, from the API or locally
+    is_detailed = models.BooleanField(default=False)  # raw_data is the full food/{fdcId} record, not a search hit
     
     def __str__(self):
         return f"{self.description} (USDA: {self.fdcId})"
@@ -142,6 +149,27 @@ class StoredUSDAFood(models.Model):
             return None
 
 
+class APIRateLimitBucket(models.Model):
+    """
+    Shared token bucket for an external API key (see diet.rate_limit)
+    Every process updates the same row with a compare-and-swap on version
+    """
+    key = models.CharField(max_length=100, unique=True)  # e.g. 'usda:<sha256 of the api key>'
+    tokens = models.FloatField()
+    refilled_at = models.FloatField()  # unix time the tokens were last topped up
+    version = models.PositiveBigIntegerField(default=0)
+
+    # running totals for the remaining-budget metrics
+    acquired = models.PositiveBigIntegerField(default=0)
+    throttled = models.PositiveBigIntegerField(default=0)  # acquisitions that had to wait
+    waited_seconds = models.FloatField(default=0.0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f} tokens"
+
+
 class UserFoodHistory(models.Model):
     """
     Tracks which foods a user has selected/used
@@ -272,7 +300,36 @@ class PlannedMealFood(models.Model):
             raise ValidationError("Servings must be positive")
 
 
-class UserSavedMeal(models.Model):
+class ParsedIngredientsMixin:
+    """
+    Ingredients of raw_mealdb_data parsed once at save time into parsed_ingredients
+    (amounts, units, canonical keys and base quantities), for UserSavedMeal and BulkRecipe
+    """
+
+    def update_parsed_ingredients(self):
+        self.parsed_ingredients = parse_ingredients(self.raw_mealdb_data)
+        self.parsed_ingredients_version = PARSER_VERSION
+
+    def get_parsed_ingredients(self):
+        """Ingredient dicts from diet.ingredients.parse_ingredient, re-parsed if stored by an older parser"""
+        if self.parsed_ingredients_version == PARSER_VERSION:
+            return self.parsed_ingredients
+        return parse_ingredients(self.raw_mealdb_data)
+
+    def get_ingredients_list(self):
+        """Ingredients as [{'ingredient', 'measure'}]"""
+        return as_ingredients_list(self.get_parsed_ingredients())
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'raw_mealdb_data' in update_fields:
+            self.update_parsed_ingredients()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'parsed_ingredients', 'parsed_ingredients_version'}
+        super().save(*args, **kwargs)
+
+
+class UserSavedMeal(ParsedIngredientsMixin, models.Model):
     """
     User's saved meals from MealDB API
     Store the full data for flexibility later
@@ -295,6 +352,8 @@ class UserSavedMeal(models.Model):
     
     # Store full MealDB response for future use
     raw_mealdb_data = models.JSONField()
+    parsed_ingredients = models.JSONField(default=list, blank=True, help_text="Ingredients parsed from raw_mealdb_data on save")
+    parsed_ingredients_version = models.PositiveSmallIntegerField(default=0, help_text="Parser version of parsed_ingredients")
     
     # User metadata
     saved_at = models.DateTimeField(auto_now_add=True)
@@ -325,27 +384,6 @@ class UserSavedMeal(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.meal_name}"
     
-    def get_ingredients_list(self):
-        """Parse ingredients from the raw MealDB data"""
-        ingredients = []
-        data = self.raw_mealdb_data
-        
-        if not data:
-            return []
-        
-        for i in range(1, 21):
-            # Handle cases where ingredient/measure can be None from the API
-            ingredient = (data.get(f'strIngredient{i}') or '').strip()
-            measure = (data.get(f'strMeasure{i}') or '').strip()
-            
-            if ingredient:
-                ingredients.append({
-                    'ingredient': ingredient,
-                    'measure': measure
-                })
-                
-        return ingredients
-    
     def get_instructions_steps(self):
         """Parse instructions into steps"""
         if not self.instructions:
@@ -366,7 +404,7 @@ class UserSavedMeal(models.Model):
         return steps
 
 
-class BulkRecipe(models.Model):
+class BulkRecipe(ParsedIngredientsMixin, models.Model):
     """
     Bulk-loaded recipes for RAG requirements (not tied to specific users)
     This satisfies the 500+ recipe requirement without breaking existing user flows
@@ -387,9 +425,13 @@ class BulkRecipe(models.Model):
     
     # Store full MealDB response
     raw_mealdb_data = models.JSONField()
+    parsed_ingredients = models.JSONField(default=list, blank=True, help_text="Ingredients parsed from raw_mealdb_data on save")
+    parsed_ingredients_version = models.PositiveSmallIntegerField(default=0, help_text="Parser version of parsed_ingredients")
     
     # RAG-specific fields
-    embedding = models.JSONField(null=True, blank=True, help_text="Vector embedding for similarity search")
+    embedding = models.JSONField(null=True, blank=True, help_text="Vector embedding for similarity search")  # legacy, see embedding_vector
+    embedding_vector = models.BinaryField(null=True, blank=True, help_text="Packed float32/float16 embedding with dimension and model header")
+    embedding_text_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the model and text the embedding was generated from")
     search_tags = models.JSONField(default=list, help_text="Tags for quick filtering")
     ingredients_text = models.TextField(blank=True, help_text="Concatenated ingredients for search")
     
@@ -407,23 +449,26 @@ class BulkRecipe(models.Model):
     def __str__(self):
         return f"{self.meal_name} (ID: {self.mealdb_id})"
     
-    def get_ingredients_list(self):
-        """Parse ingredients from raw MealDB data"""
-        ingredients = []
-        data = self.raw_mealdb_data
-        
-        for i in range(1, 21):
-            ingredient = data.get(f'strIngredient{i}')
-            measure = data.get(f'strMeasure{i}')
-            
-            # Handle None values
-            if ingredient and ingredient.strip() and ingredient.lower() not in ['', 'null']:
-                ingredients.append({
-                    'ingredient': ingredient.strip(),
-                    'measure': measure.strip() if measure and measure.strip() else ''
-                })
-        
-        return ingredients
+    @classmethod
+    def with_embeddings(cls):
+        """Recipes with a stored embedding (binary, or legacy JSON not yet backfilled)"""
+        legacy = models.Q(embedding__isnull=False) & ~models.Q(embedding={}) & ~models.Q(embedding=[])
+        return cls.objects.filter(models.Q(embedding_vector__isnull=False) | legacy)
+    
+    def get_embedding(self):
+        """Return (float32 vector, model name), or (None, None) when there is no embedding"""
+        if self.embedding_vector:
+            decoded = unpack_embedding(self.embedding_vector)
+            return decoded.vector, decoded.model
+        if isinstance(self.embedding, list) and self.embedding:
+            return np.asarray(self.embedding, dtype=np.float32), LEGACY_EMBEDDING_MODEL
+        return None, None
+    
+    def set_embedding(self, vector, model, dtype=None, text_hash=''):
+        """Store the embedding in the binary column and drop the legacy JSON copy"""
+        self.embedding_vector = pack_embedding(vector, model, dtype or settings.RAG_EMBEDDING_DTYPE)
+        self.embedding = None
+        self.embedding_text_hash = text_hash
     
     def get_instructions_steps(self):
         """Parse instructions into steps"""
@@ -556,6 +601,38 @@ class NutritionAdherenceSnapshot(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.adherence_ratio} @ {self.calculated_at}"
 
+class DailyNutritionTotal(models.Model):
+    """
+    Per-user, per-day rollup of the planned meals' portion-adjusted nutrition.
+    Maintained from the PlannedMeal.total_* columns by diet.nutrition_totals
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date = models.DateField()
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    meal_count = models.IntegerField(default=0, help_text="Planned meal slots on this day")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'date']
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.date}: {round(self.calories)} kcal"
+
+class PlanRevision(models.Model):
+    """
+    Per-user counter bumped by every change to the user's plan or saved meals, so the
+    shopping lists cached by diet.shopping_cache in any process know when they are stale
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True)
+    revision = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.email} - plan revision {self.revision}"
+
 class ShoppingListVersion(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(max_length=128, blank=True)
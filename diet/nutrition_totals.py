@@ -0,0 +1,186 @@
+import logging
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import DailyNutritionTotal, PlannedMeal
+from .weekly_plan import NUTRIENTS, build_slot, fetch_saved_meals, referenced_meal_ids
+
+logger = logging.getLogger(__name__)
+
+# Two levels of cached totals, both portion-adjusted like the planner page:
+#   PlannedMeal.total_*  - one slot, refreshed when the row or a saved meal it uses changes
+#   DailyNutritionTotal  - SUM of a day's slots, refreshed from those columns in one query
+#                          when the transaction that touched the day commits
+# so a plan edit costs a couple of queries and reading a week of totals is one range query.
+
+TOTAL_FIELDS = {nutrient: f'total_{nutrient}' for nutrient in NUTRIENTS}
+
+# Days touched in this thread since the last flush: {(user_id, date), ...}
+_local = threading.local()
+
+
+def _as_date(value) -> date:
+    """planned_date may still be the 'YYYY-MM-DD' string a view passed to create()"""
+    return PlannedMeal._meta.get_field('planned_date').to_python(value)
+
+
+def slot_totals(planned_meal: PlannedMeal, saved_meals=None) -> Dict[str, float]:
+    """total_* column values for a planned meal (None when it has no nutrition data)"""
+    if saved_meals is None:
+        saved_meals = fetch_saved_meals(planned_meal.user_id, referenced_meal_ids([planned_meal]))
+    nutrition = build_slot(planned_meal, saved_meals).adjusted_nutrition
+    return {field: nutrition[nutrient] if nutrition else None for nutrient, field in TOTAL_FIELDS.items()}
+
+
+def refresh_day(user_id: int, day) -> None:
+    """Recompute one DailyNutritionTotal row from its planned meals' total_* columns"""
+    day = _as_date(day)
+    aggregates = {nutrient: Coalesce(Sum(field), Value(0.0)) for nutrient, field in TOTAL_FIELDS.items()}
+    totals = PlannedMeal.objects.filter(user_id=user_id, planned_date=day).aggregate(
+        meal_count=Count('id'), **aggregates
+    )
+    if not totals['meal_count']:
+        DailyNutritionTotal.objects.filter(user_id=user_id, date=day).delete()
+        return
+    DailyNutritionTotal.objects.update_or_create(user_id=user_id, date=day, defaults=totals)
+
+
+def mark_day(user_id: int, day) -> None:
+    """
+    Re-aggregate a day once the current transaction commits (straight away in
+    autocommit), so restoring a week of meals rolls up each day once, not per row
+    """
+    days = getattr(_local, 'days', None)
+    if days is None:
+        days = _local.days = set()
+    days.add((user_id, _as_date(day)))
+    transaction.on_commit(flush_days)
+
+
+def flush_days() -> None:
+    days = getattr(_local, 'days', None)
+    if not days:
+        return
+    _local.days = set()
+    for user_id, day in sorted(days):
+        refresh_day(user_id, day)
+
+
+def refresh_planned_meal(planned_meal: PlannedMeal, saved_meals=None, refresh_rollup: bool = True) -> None:
+    """Store a planned meal's slot totals (without re-sending save signals) and roll up its day"""
+    totals = slot_totals(planned_meal, saved_meals)
+    if any(getattr(planned_meal, field) != value for field, value in totals.items()):
+        PlannedMeal.objects.filter(pk=planned_meal.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(planned_meal, field, value)
+    if refresh_rollup:
+        mark_day(planned_meal.user_id, planned_meal.planned_date)
+
+
+def refresh_saved_meal(saved_meal) -> int:
+    """Refresh every planned meal that uses a saved meal whose nutrition changed; returns days touched"""
+    planned_meals = [
+        pm for pm in PlannedMeal.objects.filter(user_id=saved_meal.user_id)
+        .only('id', 'user', 'planned_date', 'plan_json', *TOTAL_FIELDS.values())
+        if saved_meal.pk in referenced_meal_ids([pm])
+    ]
+    if not planned_meals:
+        return 0
+    saved_meals = fetch_saved_meals(saved_meal.user_id, referenced_meal_ids(planned_meals))
+    days = set()
+    for pm in planned_meals:
+        refresh_planned_meal(pm, saved_meals, refresh_rollup=False)
+        days.add(pm.planned_date)
+    for day in days:
+        mark_day(saved_meal.user_id, day)
+    return len(days)
+
+
+def daily_totals(user, dates: Iterable[date]) -> Dict[date, DailyNutritionTotal]:
+    """
+    Stored rollups for the given days, in one indexed range query (days without meals are
+    absent). Days that have planned meals but no rollup yet (plans made before the rollups
+    existed) are computed from plan_json and stored, costing one more query when none are.
+    """
+    dates = list(dates)
+    if not dates:
+        return {}
+    wanted = set(dates)
+    rows = DailyNutritionTotal.objects.filter(user=user, date__range=(min(dates), max(dates)))
+    totals = {row.date: row for row in rows if row.date in wanted}
+    missing = wanted - set(totals)
+    if missing:
+        planned_meals = list(PlannedMeal.objects.filter(user=user, planned_date__in=missing))
+        if planned_meals:
+            user_id = planned_meals[0].user_id
+            saved_meals = fetch_saved_meals(user_id, referenced_meal_ids(planned_meals))
+            for pm in planned_meals:
+                refresh_planned_meal(pm, saved_meals, refresh_rollup=False)
+            days = {pm.planned_date for pm in planned_meals}
+            for day in days:
+                refresh_day(user_id, day)
+            totals.update((row.date, row) for row in DailyNutritionTotal.objects.filter(user_id=user_id, date__in=days))
+    return totals
+
+
+def rebuild(users=None, fix: bool = True) -> List[Tuple[int, date, str]]:
+    """
+    Recompute slot and day totals from plan_json and the saved meals.
+    Returns (user_id, date, description) for every cached value that was wrong;
+    with fix=False nothing is written.
+    """
+    planned = PlannedMeal.objects.all()
+    stored = DailyNutritionTotal.objects.all()
+    if users is not None:
+        planned = planned.filter(user__in=users)
+        stored = stored.filter(user__in=users)
+
+    by_user = {}
+    for pm in planned.order_by('user_id', 'planned_date'):
+        by_user.setdefault(pm.user_id, []).append(pm)
+    stored_rows = {(row.user_id, row.date): row for row in stored}
+
+    problems = []
+    expected_days = set()
+    for user_id, planned_meals in by_user.items():
+        saved_meals = fetch_saved_meals(user_id, referenced_meal_ids(planned_meals))
+        days = {}
+        for pm in planned_meals:
+            totals = slot_totals(pm, saved_meals)
+            if any(getattr(pm, field) != value for field, value in totals.items()):
+                problems.append((user_id, pm.planned_date, f'{pm.meal_type} slot totals out of date'))
+                if fix:
+                    PlannedMeal.objects.filter(pk=pm.pk).update(**totals)
+            day = days.setdefault(pm.planned_date, dict.fromkeys(NUTRIENTS, 0.0))
+            for nutrient, field in TOTAL_FIELDS.items():
+                day[nutrient] += totals[field] or 0.0
+            day['meal_count'] = day.get('meal_count', 0) + 1
+
+        for day, totals in days.items():
+            expected_days.add((user_id, day))
+            row = stored_rows.get((user_id, day))
+            if row is None:
+                problems.append((user_id, day, 'daily total missing'))
+            elif row.meal_count != totals['meal_count'] or any(
+                abs(getattr(row, nutrient) - totals[nutrient]) > 1e-6 for nutrient in NUTRIENTS
+            ):
+                problems.append((user_id, day, 'daily total out of date'))
+            else:
+                continue
+            if fix:
+                DailyNutritionTotal.objects.update_or_create(user_id=user_id, date=day, defaults=totals)
+
+    for key, row in stored_rows.items():
+        if key not in expected_days:
+            problems.append((key[0], key[1], 'daily total without planned meals'))
+            if fix:
+                row.delete()
+
+    if problems:
+        logger.info("Nutrition totals: %s inconsistencies%s", len(problems), ' fixed' if fix else '')
+    return problems
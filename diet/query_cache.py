@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .embedding_codec import pack_embedding, unpack_embedding
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query"""
+    return _WHITESPACE.sub(' ', (query or '').strip().lower())
+
+
+class QueryEmbeddingCache:
+    """
+    Query text -> embedding cache for RAG searches.
+
+    A small per-process LRU sits in front of Django's cache framework, so repeated
+    queries skip the embeddings API in this worker and in every other one sharing
+    the cache backend. Entries are keyed by model name, so switching embedding
+    model or provider never serves vectors from the old one.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'RAG_QUERY_CACHE_SIZE', 1024)
+
+    @staticmethod
+    def cache_key(query: str, model: str) -> str:
+        digest = hashlib.sha256(f"{model}\n{normalize_query(query)}".encode('utf-8')).hexdigest()
+        return f"rag_query_embedding_{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.max_entries, 0):
+                self._entries.popitem(last=False)
+
+    def get(self, query: str, model: str) -> Optional[np.ndarray]:
+        key = self.cache_key(query, model)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.local_hits += 1
+                return vector
+
+        blob = cache.get(key)
+        decoded = None
+        if blob is not None:
+            try:
+                decoded = unpack_embedding(blob)
+            except ValueError as e:
+                logger.warning("Discarding unreadable cached query embedding: %s", e)
+        if decoded is not None and decoded.model == model:
+            self._remember(key, decoded.vector)
+            with self._lock:
+                self.shared_hits += 1
+            return decoded.vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, query: str, model: str, embedding: Sequence[float]):
+        key = self.cache_key(query, model)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._remember(key, vector)
+        cache.set(key, pack_embedding(vector, model), getattr(settings, 'RAG_QUERY_CACHE_TTL', 7 * 24 * 3600))
+
+    def clear(self):
+        """Drop this process's entries (the shared cache expires on its own)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            return {
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.local_hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache()
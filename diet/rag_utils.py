@@ -1,28 +1,46 @@
-import os
 import json
 import math
+import hashlib
 import numpy as np
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .embedding_providers import embedding_model_name, get_embedding_provider
+from .embedding_snapshot import mark_stale
 from .models import BulkRecipe
+from .query_cache import query_embedding_cache
+from .text_index import reciprocal_rank_fusion, recipe_text_index
+from .vector_index import recipe_index
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 def generate_embedding(text: str) -> List[float]:
-    """Generate embedding for text using OpenAI's text-embedding-ada-002"""
+    """Generate embedding for text using the configured provider (RAG_EMBEDDING_PROVIDER)"""
     try:
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return response.data[0].embedding
+        return get_embedding_provider().embed_one(text)
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return []
 
+def get_query_embedding(query: str) -> Optional[np.ndarray]:
+    """Embedding for a search query, served from the query cache when possible"""
+    model = embedding_model_name()
+    embedding = query_embedding_cache.get(query, model)
+    if embedding is None:
+        embedding = generate_embedding(query)
+        if not embedding:
+            return None
+        query_embedding_cache.set(query, model, embedding)
+        embedding = np.asarray(embedding, dtype=np.float32)
+    return embedding
+
+def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """Embed several texts in one request; results are in input order (raises on API errors)"""
+    return get_embedding_provider().embed(texts)
+
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """Calculate cosine similarity between two vectors"""
     if not vec1 or not vec2 or len(vec1) != len(vec2):
@@ -37,8 +55,8 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     
     return dot_product / (magnitude1 * magnitude2)
 
-def generate_recipe_embedding(recipe: BulkRecipe) -> List[float]:
-    """Generate embedding for a recipe based on name, ingredients, and instructions"""
+def build_recipe_embedding_text(recipe: BulkRecipe) -> str:
+    """Text a recipe is embedded from: name, ingredients, instructions, category and area"""
     # Combine recipe text for embedding
     recipe_text = f"{recipe.meal_name} "
     
@@ -57,46 +75,100 @@ def generate_recipe_embedding(recipe: BulkRecipe) -> List[float]:
     if recipe.area:
         recipe_text += f" {recipe.area}"
     
-    return generate_embedding(recipe_text)
+    return recipe_text
+
+def embedding_text_hash(text: str, model: Optional[str] = None) -> str:
+    """Content hash stored with each embedding so unchanged recipes are not re-embedded"""
+    model = model or embedding_model_name()
+    return hashlib.sha256(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+def generate_recipe_embedding(recipe: BulkRecipe) -> List[float]:
+    """Generate embedding for a recipe based on name, ingredients, and instructions"""
+    return generate_embedding(build_recipe_embedding_text(recipe))
 
-def search_similar_recipes(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    """Search for similar recipes using vector similarity"""
-    # Generate embedding for query
-    query_embedding = generate_embedding(query)
-    if not query_embedding:
+def search_similar_recipes(query: str, top_k: int = 5, category: Optional[str] = None, area: Optional[str] = None,
+                           search_tags: Optional[List[str]] = None, ingredient: Optional[str] = None,
+                           exclude_allergens: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Search for similar recipes using vector similarity.
+    Filters are applied inside the vector index before ranking, so up to top_k
+    matching recipes are returned however narrow the filters are.
+    """
+    # Embed the query (cached per normalized query text and model)
+    query_embedding = get_query_embedding(query)
+    if query_embedding is None:
         return []
     
-    # Get all recipes with embeddings
-    recipes = BulkRecipe.objects.filter(embedding__isnull=False).exclude(embedding={})
-    
-    similarities = []
-    for recipe in recipes:
-        if recipe.embedding:
-            similarity = cosine_similarity(query_embedding, recipe.embedding)
-            similarities.append({
-                'recipe': recipe,
-                'similarity': similarity
-            })
-    
-    # Sort by similarity and return top_k
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
+    # Rank against the in-memory index, then load only the winning rows
+    matches = recipe_index.search(
+        query_embedding,
+        top_k=top_k,
+        category=category,
+        area=area,
+        tags=search_tags,
+        ingredients=[ingredient] if ingredient else None,
+        exclude_ingredients=exclude_allergens,
+    )
+    if not matches:
+        return []
+    recipes = BulkRecipe.objects.defer('embedding', 'embedding_vector').in_bulk([recipe_id for recipe_id, _ in matches])
     
     results = []
-    for item in similarities[:top_k]:
-        recipe = item['recipe']
+    for recipe_id, similarity in matches:
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
         results.append({
             'id': recipe.id,
             'meal_name': recipe.meal_name,
             'category': recipe.category,
             'area': recipe.area,
             'meal_thumb': recipe.meal_thumb,
-            'similarity_score': round(item['similarity'], 3),
+            'similarity_score': round(similarity, 3),
             'ingredients': recipe.get_ingredients_list(),
             'instructions': recipe.get_instructions_steps()
         })
     
     return results
 
+def hybrid_search_recipes(query: str, top_k: int = 20, category: Optional[str] = None, area: Optional[str] = None,
+                          ingredient: Optional[str] = None, use_vectors: bool = True) -> List[Dict[str, Any]]:
+    """
+    Rank recipes by BM25 over the text index fused with vector similarity
+    (reciprocal-rank fusion). Falls back to text-only ranking when vectors are
+    disabled or the query cannot be embedded. Returns ids and scores only,
+    best first.
+    """
+    depth = max(top_k * 3, 50)
+    lexical = recipe_text_index.search(query, top_k=depth, category=category, area=area, ingredient=ingredient)
+    
+    semantic = []
+    if use_vectors:
+        query_embedding = get_query_embedding(query)
+        if query_embedding is not None:
+            semantic = recipe_index.search(
+                query_embedding,
+                top_k=depth,
+                category=category,
+                area=area,
+                ingredients=[ingredient] if ingredient else None,
+            )
+            # Unrelated recipes (no positive similarity) should not be ranked in by fusion alone
+            semantic = [(recipe_id, similarity) for recipe_id, similarity in semantic if similarity > 0]
+    
+    text_scores = dict(lexical)
+    similarities = dict(semantic)
+    fused = reciprocal_rank_fusion([[recipe_id for recipe_id, _ in lexical], [recipe_id for recipe_id, _ in semantic]])
+    return [
+        {
+            'id': recipe_id,
+            'fused_score': round(score, 5),
+            'text_score': round(text_scores[recipe_id], 3) if recipe_id in text_scores else None,
+            'similarity_score': round(similarities[recipe_id], 3) if recipe_id in similarities else None,
+        }
+        for recipe_id, score in fused[:top_k]
+    ]
+
 # Function calling for nutritional calculations
 def calculate_recipe_nutrition(ingredients: List[Dict[str, str]]) -> Dict[str, Any]:
     """Calculate nutrition for a recipe based on ingredients"""
@@ -180,48 +252,144 @@ def generate_rag_recipe_recommendations(user_preferences: Dict[str, Any], num_re
     # Create query string
     query = " ".join(query_parts) if query_parts else "healthy dinner recipe"
     
+    # Allergens and dislikes are excluded inside the index (one mask over the
+    # precomputed ingredient sets) before ranking, so no over-fetching is needed
+    excluded = [item for item in (user_preferences.get('allergies') or []) + (user_preferences.get('dislikes') or [])
+                if item and item.strip()]
+    
     # Get similar recipes
-    similar_recipes = search_similar_recipes(query, top_k=num_recommendations * 2)
-    
-    # Filter based on dietary restrictions
-    filtered_recipes = []
-    for recipe in similar_recipes:
-        # Simple filtering logic
-        if user_preferences.get('allergies'):
-            allergies = [a.lower() for a in user_preferences['allergies']]
-            ingredients_text = " ".join([ing['ingredient'].lower() for ing in recipe['ingredients']])
-            
-            # Skip if contains allergens
-            if any(allergen in ingredients_text for allergen in allergies):
-                continue
-        
-        # Calculate nutrition for the recipe
-        nutrition = calculate_recipe_nutrition(recipe['ingredients'])
-        recipe['nutrition'] = nutrition
-        
-        filtered_recipes.append(recipe)
-        
-        if len(filtered_recipes) >= num_recommendations:
-            break
+    recommendations = search_similar_recipes(
+        query,
+        top_k=num_recommendations,
+        exclude_allergens=excluded or None,
+    )
+    
+    # Calculate nutrition for each recipe
+    for recipe in recommendations:
+        recipe['nutrition'] = calculate_recipe_nutrition(recipe['ingredients'])
     
-    return filtered_recipes
-
-def update_recipe_embeddings():
-    """Update embeddings for all BulkRecipe entries"""
-    recipes = BulkRecipe.objects.all()
-    updated_count = 0
-    
-    for recipe in recipes:
-        try:
-            # Generate embedding
-            embedding = generate_recipe_embedding(recipe)
-            if embedding:
-                recipe.embedding = embedding
-                recipe.save()
-                updated_count += 1
-                print(f"Updated embedding for: {recipe.meal_name}")
-        except Exception as e:
-            print(f"Error updating embedding for {recipe.meal_name}: {e}")
-    
-    print(f"Updated embeddings for {updated_count} recipes")
-    return updated_count 
\ No newline at end of file
+    return recommendations
+
+def recipes_needing_embeddings(limit: Optional[int] = None) -> List[int]:
+    """
+    Ids of the recipes update_recipe_embeddings would embed without force, in id order:
+    no embedding yet, or an embedding text hash that no longer matches the recipe.
+    Stops after limit ids, so limited runs work through the catalog from run to run.
+    """
+    model = embedding_model_name()
+    embedded = BulkRecipe.with_embeddings().filter(pk=OuterRef('pk'))
+    rows = (BulkRecipe.objects.annotate(has_embedding=Exists(embedded))
+            .defer('embedding', 'embedding_vector').order_by('id'))
+    recipe_ids = []
+    last_id = 0
+    while limit is None or len(recipe_ids) < limit:
+        chunk = list(rows.filter(id__gt=last_id)[:500])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        for recipe in chunk:
+            if (not recipe.has_embedding
+                    or recipe.embedding_text_hash != embedding_text_hash(build_recipe_embedding_text(recipe), model)):
+                recipe_ids.append(recipe.id)
+    return recipe_ids if limit is None else recipe_ids[:limit]
+
+def fill_missing_text_hashes(batch_size: int = 500) -> int:
+    """
+    Record the text hash of embeddings stored before hashes were kept, using the model each
+    vector was made with, so unchanged recipes are not re-embedded (a vector from another
+    model than the configured one still is). Returns the number of rows updated.
+    """
+    pending = BulkRecipe.with_embeddings().filter(embedding_text_hash='').order_by('id')
+    filled = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return filled
+        last_id = batch[-1].id
+        for recipe in batch:
+            _, model = recipe.get_embedding()
+            if model is not None:  # unreadable legacy JSON stays unhashed and gets re-embedded
+                recipe.embedding_text_hash = embedding_text_hash(build_recipe_embedding_text(recipe), model)
+        with transaction.atomic():
+            BulkRecipe.objects.bulk_update(batch, ['embedding_text_hash'])
+        filled += len(batch)
+
+def update_recipe_embeddings(recipes=None, force: bool = False, batch_size: int = 100, max_workers: int = 4) -> Dict[str, int]:
+    """
+    (Re)embed recipes in batched requests, several batches in flight at once.
+    Recipes whose embedding text hash is unchanged are skipped unless force=True,
+    and every finished batch is saved, so an interrupted run can simply be restarted.
+    """
+    if recipes is None:
+        recipes = BulkRecipe.objects.all()
+    model = embedding_model_name()
+    recipe_ids = list(recipes.values_list('id', flat=True))
+    stats = {'updated': 0, 'skipped': 0, 'failed': 0, 'requests': 0}
+
+    def pending_batches():
+        batch = []
+        for start in range(0, len(recipe_ids), 500):
+            chunk = (BulkRecipe.objects.filter(id__in=recipe_ids[start:start + 500])
+                     .defer('embedding', 'embedding_vector').order_by('id'))
+            for recipe in chunk:
+                text = build_recipe_embedding_text(recipe)
+                text_hash = embedding_text_hash(text, model)
+                if not force and recipe.embedding_text_hash == text_hash:
+                    stats['skipped'] += 1
+                    continue
+                batch.append((recipe, text, text_hash))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def save_batch(batch, embeddings):
+        now = timezone.now()
+        for (recipe, _, text_hash), embedding in zip(batch, embeddings):
+            recipe.set_embedding(embedding, model, text_hash=text_hash)
+            recipe.last_updated = now  # bulk_update skips auto_now; other workers' index checks rely on it
+        with transaction.atomic():
+            BulkRecipe.objects.bulk_update(
+                [recipe for recipe, _, _ in batch],
+                ['embedding_vector', 'embedding', 'embedding_text_hash', 'last_updated']
+            )
+        stats['updated'] += len(batch)
+        print(f"Updated embeddings for {stats['updated']} recipes...")
+
+    # API calls run in the pool; database writes stay on this thread
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        in_flight = {}
+        batches = pending_batches()
+        while True:
+            while len(in_flight) < max(max_workers, 1):
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                future = executor.submit(generate_embeddings_batch, [text for _, text, _ in batch])
+                in_flight[future] = batch
+                stats['requests'] += 1
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = in_flight.pop(future)
+                try:
+                    embeddings = future.result()
+                    if len(embeddings) != len(batch):
+                        raise ValueError(f"expected {len(batch)} embeddings, got {len(embeddings)}")
+                except Exception as e:
+                    stats['failed'] += len(batch)
+                    print(f"Error generating embeddings for {len(batch)} recipes ({batch[0][0].meal_name}...): {e}")
+                    continue
+                save_batch(batch, embeddings)
+
+    if stats['updated']:
+        # bulk_update sends no post_save signals; rebuild this process's index on the next search
+        recipe_index.invalidate()
+        mark_stale()
+
+    print(f"Updated embeddings for {stats['updated']} recipes "
+          f"({stats['skipped']} unchanged, {stats['failed']} failed, {stats['requests']} API requests)")
+    return stats
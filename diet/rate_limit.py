@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import time
+from typing import Dict, Optional
+
+from django.db import IntegrityError
+from django.db.models import F
+
+from .models import APIRateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """The bucket would not have a token within max_wait seconds"""
+
+
+def api_key_bucket(prefix: str, api_key: str) -> str:
+    """Bucket name for an API key (hashed, so the key itself is never stored)"""
+    return f"{prefix}:{hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:32]}"
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every process through one APIRateLimitBucket row.
+
+    The bucket holds up to `capacity` tokens and refills at `rate_per_second`;
+    each request takes one. A request only waits when the bucket is empty, and
+    then just long enough for the next token. Updates are compare-and-swap on
+    the row's version, so concurrent workers never spend the same token twice.
+    """
+
+    def __init__(self, key: str, rate_per_second: float, capacity: float, max_wait: Optional[float] = None):
+        self.key = key
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.max_wait = max_wait
+
+    def _row(self, now: float) -> APIRateLimitBucket:
+        try:
+            return APIRateLimitBucket.objects.get_or_create(
+                key=self.key, defaults={'tokens': self.capacity, 'refilled_at': now}
+            )[0]
+        except IntegrityError:
+            # another process created it between our get and create
+            return APIRateLimitBucket.objects.get(key=self.key)
+
+    def _available(self, row: APIRateLimitBucket, now: float) -> float:
+        return min(self.capacity, row.tokens + max(now - row.refilled_at, 0.0) * self.rate_per_second)
+
+    def acquire(self) -> float:
+        """Take one token, sleeping only while the bucket is empty; returns seconds waited"""
+        waited = 0.0
+        while True:
+            now = time.time()
+            row = self._row(now)
+            tokens = self._available(row, now)
+            if tokens >= 1:
+                taken = APIRateLimitBucket.objects.filter(pk=row.pk, version=row.version).update(
+                    tokens=tokens - 1,
+                    refilled_at=now,
+                    version=F('version') + 1,
+                    acquired=F('acquired') + 1,
+                    throttled=F('throttled') + (1 if waited else 0),
+                    waited_seconds=F('waited_seconds') + waited,
+                )
+                if taken:
+                    return waited
+                continue  # another process spent a token first; re-read
+
+            delay = (1 - tokens) / self.rate_per_second
+            if self.max_wait is not None and waited + delay > self.max_wait:
+                raise RateLimitExceeded(f"{self.key}: next token in {delay:.1f}s")
+            logger.info("Rate limit %s empty, waiting %.2fs", self.key, delay)
+            time.sleep(delay)
+            waited += delay
+
+    def status(self) -> Dict[str, float]:
+        """Remaining budget and running totals, for monitoring"""
+        now = time.time()
+        row = self._row(now)
+        return {
+            'remaining': round(self._available(row, now), 2),
+            'capacity': self.capacity,
+            'rate_per_hour': self.rate_per_second * 3600,
+            'acquired': row.acquired,
+            'throttled': row.throttled,
+            'waited_seconds': round(row.waited_seconds, 2),
+        }
@@ -0,0 +1,231 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Filterable recipe attributes kept next to the vector index rows.
+#   single-valued (one code per row, -1 when empty): category, area
+#   multi-valued (row/code entry pairs):              tags, ingredients
+# Terms are lower-cased; each field has its own vocabulary of distinct terms.
+SINGLE_FIELDS = ('category', 'area')
+MULTI_FIELDS = ('tags', 'ingredients')
+
+
+def _term(value) -> str:
+    return (value or '').strip().lower()
+
+
+def _singular(text: str) -> Optional[str]:
+    """Singular of a plural filter term ('berries' -> 'berry', 'tomatoes' -> 'tomato'), else None"""
+    if len(text) <= 3 or not text.endswith('s') or text.endswith(('ss', 'us', 'is')):
+        return None
+    if text.endswith('ies') and len(text) > 4:
+        return text[:-3] + 'y'
+    if text.endswith(('oes', 'ches', 'shes', 'xes', 'zes', 'sses')):
+        return text[:-2]
+    return text[:-1]
+
+
+def _singular_pattern(text: str):
+    """
+    Whole-word regex for the singular of text, or None when text is not plural: 'peanuts'
+    also matches 'peanut butter', but 'peas' does not match 'peanut' nor 'oats' 'goat cheese'
+    """
+    singular = _singular(text)
+    if singular is None:
+        return None
+    return re.compile(rf'\b{re.escape(singular)}\b')
+
+
+def recipe_terms(recipe) -> Dict[str, object]:
+    """Filterable terms for a BulkRecipe"""
+    return {
+        'category': _term(recipe.category),
+        'area': _term(recipe.area),
+        'tags': sorted({_term(tag) for tag in (recipe.search_tags or []) if _term(tag)}),
+        'ingredients': sorted({_term(ing['ingredient']) for ing in recipe.get_ingredients_list()}),
+    }
+
+
+class RecipeAttributes:
+    """Row-aligned recipe attributes that turn structured filters into boolean row masks"""
+
+    def __init__(self):
+        self._vocab: Dict[str, List[str]] = {field: [] for field in SINGLE_FIELDS + MULTI_FIELDS}
+        self._code_for: Dict[str, Dict[str, int]] = {field: {} for field in SINGLE_FIELDS + MULTI_FIELDS}
+        self._single = {field: np.zeros(0, dtype=np.int32) for field in SINGLE_FIELDS}
+        self._entry_rows = {field: np.zeros(0, dtype=np.int64) for field in MULTI_FIELDS}
+        self._entry_codes = {field: np.zeros(0, dtype=np.int32) for field in MULTI_FIELDS}
+        # Derived lookups, rebuilt lazily: per-code row lists, and filter text -> matching codes
+        self._postings = {}
+        self._code_cache = {}
+
+    # --- building --------------------------------------------------------------
+
+    def _code(self, field: str, term: str) -> int:
+        code = self._code_for[field].get(term)
+        if code is None:
+            code = len(self._vocab[field])
+            self._vocab[field].append(term)
+            self._code_for[field][term] = code
+        return code
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, object]]) -> 'RecipeAttributes':
+        """Attributes for rows 0..n-1 from recipe_terms() dicts"""
+        attrs = cls()
+        single = {field: [] for field in SINGLE_FIELDS}
+        entry_rows = {field: [] for field in MULTI_FIELDS}
+        entry_codes = {field: [] for field in MULTI_FIELDS}
+        for row, terms in enumerate(rows):
+            for field in SINGLE_FIELDS:
+                single[field].append(attrs._code(field, terms[field]) if terms[field] else -1)
+            for field in MULTI_FIELDS:
+                for term in terms[field]:
+                    entry_rows[field].append(row)
+                    entry_codes[field].append(attrs._code(field, term))
+        for field in SINGLE_FIELDS:
+            attrs._single[field] = np.array(single[field], dtype=np.int32)
+        for field in MULTI_FIELDS:
+            attrs._entry_rows[field] = np.array(entry_rows[field], dtype=np.int64)
+            attrs._entry_codes[field] = np.array(entry_codes[field], dtype=np.int32)
+        return attrs
+
+    def set_row(self, row: int, terms: Dict[str, object]):
+        """Attach terms to a newly appended row (rows are append-only)"""
+        for field in SINGLE_FIELDS:
+            values = self._single[field]
+            if row >= len(values):
+                grown = np.full(max(row + 1, len(values) * 2, 64), -1, dtype=np.int32)
+                grown[:len(values)] = values
+                self._single[field] = values = grown
+            values[row] = self._code(field, terms[field]) if terms[field] else -1
+        self._postings = {}
+        for field in MULTI_FIELDS:
+            codes = [self._code(field, term) for term in terms[field]]
+            if codes:
+                self._entry_rows[field] = np.concatenate([self._entry_rows[field], np.full(len(codes), row, dtype=np.int64)])
+                self._entry_codes[field] = np.concatenate([self._entry_codes[field], np.array(codes, dtype=np.int32)])
+
+    def subset(self, rows: np.ndarray) -> 'RecipeAttributes':
+        """Attributes for the given rows, renumbered 0..len(rows)-1"""
+        rows = np.asarray(rows, dtype=np.int64)
+        attrs = RecipeAttributes()
+        attrs._vocab = {field: list(terms) for field, terms in self._vocab.items()}
+        attrs._code_for = {field: dict(codes) for field, codes in self._code_for.items()}
+        for field in SINGLE_FIELDS:
+            attrs._single[field] = self._padded_single(field, int(rows.max()) + 1 if len(rows) else 0)[rows]
+        new_row = np.full(int(rows.max()) + 1 if len(rows) else 0, -1, dtype=np.int64)
+        new_row[rows] = np.arange(len(rows))
+        for field in MULTI_FIELDS:
+            entry_rows = self._entry_rows[field]
+            keep = entry_rows < len(new_row)
+            keep[keep] = new_row[entry_rows[keep]] >= 0
+            attrs._entry_rows[field] = new_row[entry_rows[keep]]
+            attrs._entry_codes[field] = self._entry_codes[field][keep]
+        return attrs
+
+    # --- persistence (embedding snapshot) ----------------------------------------
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {}
+        for field, terms in self._vocab.items():
+            arrays[f'{field}_vocab'] = np.array(terms, dtype=str)
+        for field in SINGLE_FIELDS:
+            arrays[f'{field}_codes'] = self._single[field]
+        for field in MULTI_FIELDS:
+            arrays[f'{field}_rows'] = self._entry_rows[field]
+            arrays[f'{field}_codes'] = self._entry_codes[field]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'RecipeAttributes':
+        attrs = cls()
+        for field in SINGLE_FIELDS + MULTI_FIELDS:
+            attrs._vocab[field] = [str(term) for term in arrays[f'{field}_vocab']]
+            attrs._code_for[field] = {term: code for code, term in enumerate(attrs._vocab[field])}
+        for field in SINGLE_FIELDS:
+            attrs._single[field] = np.array(arrays[f'{field}_codes'], dtype=np.int32)
+        for field in MULTI_FIELDS:
+            attrs._entry_rows[field] = np.array(arrays[f'{field}_rows'], dtype=np.int64)
+            attrs._entry_codes[field] = np.array(arrays[f'{field}_codes'], dtype=np.int32)
+        return attrs
+
+    # --- filtering ---------------------------------------------------------------
+
+    def _padded_single(self, field: str, size: int) -> np.ndarray:
+        values = self._single[field][:size]
+        if len(values) < size:
+            values = np.concatenate([values, np.full(size - len(values), -1, dtype=np.int32)])
+        return values
+
+    def matching_codes(self, field: str, text: str, exact: bool = False) -> np.ndarray:
+        """Vocabulary codes equal to (exact) or containing text (or its singular as a word), case-insensitive"""
+        text = _term(text)
+        vocab = self._vocab[field]
+        key = (field, text, exact)
+        cached = self._code_cache.get(key)
+        if cached is not None and cached[0] == len(vocab):
+            return cached[1]
+        if exact:
+            code = self._code_for[field].get(text)
+            codes = np.array([] if code is None else [code], dtype=np.int32)
+        else:
+            singular = _singular_pattern(text)
+            codes = np.array([code for code, term in enumerate(vocab)
+                              if text in term or (singular is not None and singular.search(term))],
+                             dtype=np.int32)
+        if len(self._code_cache) >= 4096:
+            self._code_cache.clear()
+        self._code_cache[key] = (len(vocab), codes)  # stale once the vocabulary grows
+        return codes
+
+    def _rows_by_code(self, field: str):
+        """(offsets, rows): rows having code c are rows[offsets[c]:offsets[c + 1]]"""
+        postings = self._postings.get(field)
+        if postings is None:
+            codes = self._entry_codes[field]
+            order = np.argsort(codes, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self._vocab[field])))])
+            postings = self._postings[field] = (offsets, self._entry_rows[field][order])
+        return postings
+
+    def rows_with(self, field: str, codes: np.ndarray, size: int) -> np.ndarray:
+        """Boolean mask of rows having any of the codes"""
+        if field in SINGLE_FIELDS:
+            return np.isin(self._padded_single(field, size), codes)
+        mask = np.zeros(size, dtype=bool)
+        if len(codes):
+            offsets, rows = self._rows_by_code(field)
+            hits = np.concatenate([rows[offsets[code]:offsets[code + 1]] for code in codes])
+            mask[hits[hits < size]] = True
+        return mask
+
+    def mask(self, size: int, category: Optional[str] = None, area: Optional[str] = None,
+             tags: Optional[Sequence[str]] = None, ingredients: Optional[Sequence[str]] = None,
+             exclude_ingredients: Optional[Sequence[str]] = None) -> Optional[np.ndarray]:
+        """
+        Rows passing every filter, or None when no filter is given.
+        category/area/ingredients match by substring (like the icontains filters in the
+        views), every tag must be present exactly, and rows with any ingredient containing
+        one of exclude_ingredients (e.g. allergens) are dropped.
+        """
+        masks = []
+        if category:
+            masks.append(self.rows_with('category', self.matching_codes('category', category), size))
+        if area:
+            masks.append(self.rows_with('area', self.matching_codes('area', area), size))
+        for tag in tags or []:
+            masks.append(self.rows_with('tags', self.matching_codes('tags', tag, exact=True), size))
+        for ingredient in ingredients or []:
+            masks.append(self.rows_with('ingredients', self.matching_codes('ingredients', ingredient), size))
+        excluded = [text for text in (exclude_ingredients or []) if _term(text)]
+        if excluded:
+            codes = np.unique(np.concatenate([self.matching_codes('ingredients', text) for text in excluded]))
+            masks.append(~self.rows_with('ingredients', codes, size))
+        if not masks:
+            return None
+        result = masks[0]
+        for mask in masks[1:]:
+            result &= mask
+        return result
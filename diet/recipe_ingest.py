@@ -0,0 +1,371 @@
+import gzip
+import json
+import logging
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from django.db import transaction
+
+from .embedding_snapshot import mark_stale
+from .models import BulkRecipe
+from .rate_limit import TokenBucket
+from .text_index import recipe_text_index
+from .vector_index import recipe_index
+
+logger = logging.getLogger(__name__)
+
+# Bulk MealDB import for BulkRecipe. Fetches run concurrently on a thread pool, paced by a
+# token bucket; rows are built with their derived fields (parsed ingredients, search_tags,
+# ingredients_text) up front and written with bulk_create(update_conflicts=True) in large
+# batches, so an import costs a few queries per batch instead of several per recipe.
+
+# Columns an import owns; embeddings and their hashes are left to generate_embeddings
+IMPORT_FIELDS = [
+    'meal_name', 'category', 'area', 'instructions', 'meal_thumb', 'youtube_link',
+    'source_link', 'raw_mealdb_data', 'parsed_ingredients', 'parsed_ingredients_version',
+    'search_tags', 'ingredients_text', 'last_updated',
+]
+
+
+def recipe_from_meal(meal: dict) -> BulkRecipe:
+    """An unsaved BulkRecipe for a full MealDB record, derived fields filled in"""
+    recipe = BulkRecipe(
+        mealdb_id=meal['idMeal'],
+        meal_name=meal['strMeal'],
+        category=meal.get('strCategory', '') or '',
+        area=meal.get('strArea', '') or '',
+        instructions=meal.get('strInstructions', '') or '',
+        meal_thumb=meal.get('strMealThumb', '') or '',
+        youtube_link=meal.get('strYoutube', '') or None,
+        source_link=meal.get('strSource', '') or None,
+        raw_mealdb_data=meal,
+    )
+    recipe.update_parsed_ingredients()
+    recipe.search_tags = recipe.generate_search_tags()
+    recipe.update_ingredients_text()
+    return recipe
+
+
+class RecipeImporter:
+    """
+    Buffers MealDB records and writes them in batches, one transaction per batch.
+    With preload=True (the API importer) known mealdb_ids are loaded once up front, so
+    wants() can avoid fetching them; with preload=False (dump files, millions of rows)
+    memory stays flat and each batch looks up which of its own ids exist instead.
+    Known recipes are skipped unless update_existing, in which case the same bulk
+    upsert refreshes their import fields.
+    """
+
+    def __init__(self, batch_size: int = 500, update_existing: bool = False, limit: Optional[int] = None,
+                 preload: bool = True):
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.limit = limit
+        self.existing: Optional[Set[str]] = (
+            set(BulkRecipe.objects.values_list('mealdb_id', flat=True)) if preload else None
+        )
+        self.seen: Set[str] = set()  # only grows with preload; otherwise holds the current batch
+        self.pending: Dict[str, dict] = {}
+        self.loaded = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @property
+    def written(self) -> int:
+        return self.loaded + self.updated
+
+    @property
+    def full(self) -> bool:
+        """Whether limit new recipes have been written"""
+        return self.limit is not None and self.loaded >= self.limit
+
+    def _pending_new(self) -> int:
+        return sum(1 for mealdb_id in self.pending if mealdb_id not in self.existing)
+
+    def wants(self, mealdb_id: str) -> bool:
+        """Whether a meal id still needs fetching/importing"""
+        mealdb_id = str(mealdb_id)
+        return mealdb_id not in self.seen and (
+            self.update_existing or self.existing is None or mealdb_id not in self.existing
+        )
+
+    def add(self, meals: Iterable[dict]):
+        for meal in meals or []:
+            mealdb_id = str(meal.get('idMeal') or '')
+            if not mealdb_id:
+                continue
+            if mealdb_id in self.seen:
+                self.skipped += 1
+                continue
+            self.seen.add(mealdb_id)
+            if self.existing is not None and mealdb_id in self.existing and not self.update_existing:
+                self.skipped += 1
+                continue
+            if self.full and (self.existing is None or mealdb_id not in self.existing):
+                continue
+            self.pending[mealdb_id] = meal
+            if len(self.pending) >= self.batch_size or (
+                # with preload the new ids are known, so stop fetching once there are enough;
+                # otherwise only flush() can tell, trimming the batch to the limit
+                self.limit is not None and self.existing is not None
+                and self._pending_new() >= self.limit - self.loaded
+            ):
+                self.flush()
+
+    def _build(self, meals: Iterable[dict]) -> List[BulkRecipe]:
+        recipes = []
+        for meal in meals:
+            try:
+                recipes.append(recipe_from_meal(meal))
+            except Exception as e:
+                logger.warning("Skipping MealDB meal %s: %s", meal.get('idMeal'), e)
+                self.failed += 1
+        return recipes
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        if self.existing is None:
+            self.seen = set()
+        with transaction.atomic():
+            if self.existing is None:
+                known = set(BulkRecipe.objects.filter(mealdb_id__in=list(pending)).values_list('mealdb_id', flat=True))
+                if not self.update_existing:
+                    self.skipped += len(known)
+                    pending = {mealdb_id: meal for mealdb_id, meal in pending.items() if mealdb_id not in known}
+            else:
+                known = self.existing
+            if self.limit is not None:
+                new_ids = [mealdb_id for mealdb_id in pending if mealdb_id not in known]
+                if len(new_ids) > self.limit - self.loaded:
+                    over = set(new_ids[max(self.limit - self.loaded, 0):])
+                    pending = {mealdb_id: meal for mealdb_id, meal in pending.items() if mealdb_id not in over}
+                    self.seen -= over
+            batch = self._build(pending.values())
+            BulkRecipe.objects.bulk_create(
+                batch,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['mealdb_id'],
+                update_fields=IMPORT_FIELDS,
+            )
+        for recipe in batch:
+            if recipe.mealdb_id in known:
+                self.updated += 1
+            else:
+                self.loaded += 1
+                if self.existing is not None:
+                    self.existing.add(recipe.mealdb_id)
+
+    def finish(self):
+        """Write the last batch and drop this process's search indexes (bulk writes send no signals)"""
+        self.flush()
+        if self.written:
+            recipe_index.invalidate()
+            recipe_text_index.invalidate()
+            mark_stale()
+
+
+def run_concurrently(tasks: Iterable[Callable[[], object]], handle: Callable[[object], None],
+                     workers: int, rate_limiter: Optional[TokenBucket] = None,
+                     stop: Callable[[], bool] = lambda: False, on_error: Callable[[Exception], None] = None):
+    """
+    Run network tasks on a thread pool, at most `workers` in flight, starting each only
+    when rate_limiter has a token. handle() gets each result on the calling thread, so
+    every database write stays there. New tasks stop being started once stop() is true.
+    """
+    tasks = iter(tasks)
+    in_flight = set()
+
+    def drain(block: bool):
+        done, _ = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            in_flight.discard(future)
+            try:
+                handle(future.result())
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mealdb-import') as pool:
+        for task in tasks:
+            if stop():
+                break
+            while len(in_flight) >= workers:
+                drain(block=True)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            in_flight.add(pool.submit(task))
+            drain(block=False)
+        while in_flight:
+            drain(block=True)
+
+
+
+# Offline dumps: MealDB-shaped records in local files, optionally gzipped. Accepted
+# layouts are JSON Lines (.jsonl/.ndjson, one record per line), a top-level JSON array
+# of records, a saved API response ({"meals": [...]}), or several of those concatenated.
+# Records are parsed one at a time, so memory does not grow with the file size.
+
+DUMP_CHUNK_SIZE = 1 << 16
+JSON_LINES_SUFFIXES = ('.jsonl', '.ndjson')
+_MEALS_WRAPPER = re.compile(r'\{\s*"meals"\s*:\s*')
+
+
+def open_dump(path: str):
+    """Text handle on a dump file, transparently gunzipped (by suffix or magic bytes)"""
+    with open(path, 'rb') as fp:
+        gzipped = fp.read(2) == b'\x1f\x8b'
+    if gzipped or path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+class _JSONStream:
+    """Incremental reader of the JSON values in a text stream, buffered in chunks"""
+
+    def __init__(self, fp, chunk_size: int = DUMP_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.consumed = 0  # characters dropped from the front of the buffer
+        self.eof = False
+
+    @property
+    def offset(self) -> int:
+        """Character offset of the read position in the stream"""
+        return self.consumed + self.pos
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.consumed += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the stream)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> bool:
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def match(self, pattern) -> bool:
+        """Consume pattern at the current position if it is there (patterns span < 256 chars)"""
+        self.peek()
+        while len(self.buffer) - self.pos < 256 and self._fill():
+            pass
+        found = pattern.match(self.buffer, self.pos)
+        if found:
+            self.pos = found.end()
+        return bool(found)
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # only a value cut off by the end of the buffer can be completed by reading
+                # on; anything else is malformed, and buffering the rest of the file won't help
+                truncated = e.pos >= len(self.buffer) - 16 or e.msg.startswith('Unterminated string')
+                if truncated and self._fill():
+                    continue
+                raise ValueError(f'Invalid JSON near offset {self.consumed + e.pos}: {e.msg}') from e
+            rest = self.buffer[end:]
+            number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if (not rest or (number and len(rest) <= 2 and not rest.strip('.eE+-'))) and self._fill():
+                continue  # a number running to the end of the buffer ("-2." of "-2.5") may not be complete
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator:
+        """Elements of the array at the current position, one at a time"""
+        self.expect('[')
+        if self.expect(']'):
+            return
+        while True:
+            yield self.value()
+            if self.expect(']'):
+                return
+            if not self.expect(','):
+                raise ValueError(f'Expected "," or "]" in array near offset {self.offset}')
+
+
+def _meals_in(value) -> Iterator[dict]:
+    if isinstance(value, list):
+        yield from (item for item in value if isinstance(item, dict))
+    elif isinstance(value, dict):
+        if 'meals' in value:
+            yield from value['meals'] or []
+        else:
+            yield value
+
+
+def _records_in(values: Iterator) -> Iterator[dict]:
+    for value in values:
+        if isinstance(value, dict):
+            yield value
+
+
+def _json_records(fp) -> Iterator[dict]:
+    stream = _JSONStream(fp)
+    while True:
+        char = stream.peek()
+        if not char:
+            return
+        if char == '[':
+            yield from _records_in(stream.array())
+        elif char == '{' and stream.match(_MEALS_WRAPPER):
+            if stream.peek() == '[':
+                yield from _records_in(stream.array())
+            else:
+                stream.value()  # "meals": null
+            while stream.expect(','):
+                # keys after "meals" are read and dropped
+                stream.value()
+                stream.expect(':')
+                stream.value()
+            if not stream.expect('}'):
+                raise ValueError(f'Expected "}}" after the meals array near offset {stream.offset}')
+        else:
+            yield from _meals_in(stream.value())
+
+
+def _json_lines_records(fp, path: str) -> Iterator[dict]:
+    for number, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield from _meals_in(json.loads(line))
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping malformed line %s of %s: %s", number, path, e)
+
+
+def iter_dump_records(path: str) -> Iterator[dict]:
+    """MealDB records from one dump file, lazily"""
+    base = path[:-3] if path.endswith('.gz') else path
+    with open_dump(path) as fp:
+        if base.endswith(JSON_LINES_SUFFIXES):
+            yield from _json_lines_records(fp, path)
+        else:
+            yield from _json_records(fp)
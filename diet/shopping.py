@@ -0,0 +1,142 @@
+from typing import Any, Dict, Hashable, List, Mapping, Tuple
+
+import numpy as np
+
+from . import measures
+from .utils import categorize_ingredient, normalize_ingredient
+
+# Shopping list aggregation over any number of plans at once (one per user, or per user
+# and week). Every ingredient row of every planned meal becomes an entry in flat integer
+# arrays (plan, ingredient key, quantity line, meal, original name) with its quantity in
+# base units times the number of times the meal is planned; totals then come from one
+# np.unique/np.bincount pass instead of per-row dictionary updates. Quantities are summed
+# per (ingredient, dimension): grams, millilitres, pieces of each count unit, and
+# unquantified lines ('to taste') kept as they are.
+
+DIMENSION_ORDER = {measures.MASS: 0, measures.VOLUME: 1, measures.COUNT: 2, measures.OTHER: 3}
+PLURAL_UNITS = {'leaf': 'leaves', 'bunch': 'bunches', 'pinch': 'pinches', 'dash': 'dashes'}
+
+# plan id -> ({meal name: times planned}, {meal name: ingredient dicts})
+Plans = Mapping[Hashable, Tuple[Mapping[str, int], Mapping[str, List[dict]]]]
+
+
+def _parsed(ing: dict) -> Tuple[str, str, float, str]:
+    """(key, dimension, base quantity, base unit) of an ingredient dict, parsing it if needed"""
+    if 'dimension' in ing:
+        return ing['key'], ing['dimension'], ing['quantity'], ing['base_unit']
+    parsed = measures.parse(ing.get('measure') or '')
+    return normalize_ingredient(ing['ingredient']), parsed.dimension, parsed.quantity, parsed.base_unit
+
+
+def quantity_text(amount, unit: str, dimension: str) -> str:
+    if dimension == measures.OTHER:
+        return unit
+    if dimension == measures.COUNT and unit and amount != 1:
+        unit = PLURAL_UNITS.get(unit, unit + 's')
+    return f'{amount} {unit}'.strip()
+
+
+class _Codes(dict):
+    """Value -> dense integer code, assigned in first-seen order"""
+
+    def code(self, value) -> int:
+        code = self.get(value)
+        if code is None:
+            code = self[value] = len(self)
+        return code
+
+    def values_by_code(self) -> list:
+        return list(self)
+
+
+def aggregate_plans(plans: Plans) -> Dict[Hashable, Dict[str, Dict[str, Any]]]:
+    """
+    Aggregate the ingredients of every plan: {plan id: {ingredient key: {
+        'quantities': [{'amount', 'unit', 'dimension', 'text'}] (mass, volume, count, other),
+        'amount', 'unit': the first quantity, 'category', 'original_names', 'meals'}}}
+    """
+    plan_ids = list(plans)
+    keys, lines, meals, names = _Codes(), _Codes(), _Codes(), _Codes()
+    encoded = {}  # id(ingredient list) -> ((key, line, name) codes per row, base quantities)
+    planned = []  # (plan index, meal code, times planned, encoded ingredients)
+
+    for plan_index, plan_id in enumerate(plan_ids):
+        meal_counts, meal_ingredients = plans[plan_id]
+        for meal_name, ingredients in meal_ingredients.items():
+            count = meal_counts.get(meal_name, 1)
+            if not ingredients or not count:
+                continue
+            rows = encoded.get(id(ingredients))
+            if rows is None:
+                # a meal list shared by several plans (same saved meal or recipe) is encoded once
+                codes = []
+                quantities = []
+                for ing in ingredients:
+                    key, dimension, quantity, base_unit = _parsed(ing)
+                    key_code = keys.code(key)
+                    codes.append((key_code, lines.code((key_code, dimension, base_unit)), names.code(ing['ingredient'])))
+                    quantities.append(quantity)
+                rows = encoded[id(ingredients)] = (
+                    np.array(codes, dtype=np.int64).reshape(-1, 3), np.array(quantities, dtype=np.float64)
+                )
+            planned.append((plan_index, meals.code(meal_name), count, rows))
+
+    result = {plan_id: {} for plan_id in plan_ids}
+    if not planned:
+        return result
+
+    # one array element per ingredient line of every planned meal
+    lengths = np.array([len(rows[1]) for *_, rows in planned], dtype=np.int64)
+    plan_meal = np.array([entry[:3] for entry in planned], dtype=np.int64)
+    plan, meal, count = (np.repeat(plan_meal[:, column], lengths) for column in range(3))
+    codes = np.concatenate([rows[0] for *_, rows in planned])
+    key, line, name = codes[:, 0], codes[:, 1], codes[:, 2]
+    quantity = np.concatenate([rows[1] for *_, rows in planned])
+
+    # totals per (plan, quantity line)
+    n_lines, n_keys = len(lines), len(keys)
+    groups, inverse = np.unique(plan * n_lines + line, return_inverse=True)
+    totals = np.bincount(inverse, weights=quantity * count)
+
+    line_values = lines.values_by_code()
+    key_values = keys.values_by_code()
+    line_metric = np.array([dimension in measures.BASE_UNITS for _, dimension, _ in line_values], dtype=bool)
+    group_plan, group_line = np.divmod(groups, n_lines)
+    # display amounts: kg/l from 1000 g/ml up, two decimals
+    scaled = line_metric[group_line] & (totals >= 1000)
+    amounts = np.round(np.where(scaled, totals / 1000, totals), 2)
+
+    for plan_index, line_code, amount, big in zip(
+        group_plan.tolist(), group_line.tolist(), amounts.tolist(), scaled.tolist()
+    ):
+        key_code, dimension, base_unit = line_values[line_code]
+        entry = result[plan_ids[plan_index]].get(key_values[key_code])
+        if entry is None:
+            entry = result[plan_ids[plan_index]][key_values[key_code]] = {
+                'quantities': [], 'original_names': [], 'meals': [],
+            }
+        if dimension == measures.OTHER:
+            amount = 0
+        elif amount == int(amount):
+            amount = int(amount)
+        unit = measures.LARGE_UNITS[base_unit] if big else base_unit
+        entry['quantities'].append({
+            'amount': amount, 'unit': unit, 'dimension': dimension, 'text': quantity_text(amount, unit, dimension),
+        })
+
+    # distinct meals and spellings per (plan, ingredient key)
+    plan_key = plan * n_keys + key
+    for column, values, field in ((meal, meals.values_by_code(), 'meals'), (name, names.values_by_code(), 'original_names')):
+        pairs = np.unique(plan_key * len(values) + column)
+        pair_key, pair_value = np.divmod(pairs, len(values))
+        pair_plan, pair_key = np.divmod(pair_key, n_keys)
+        for plan_index, key_code, value_code in zip(pair_plan.tolist(), pair_key.tolist(), pair_value.tolist()):
+            result[plan_ids[plan_index]][key_values[key_code]][field].append(values[value_code])
+
+    for entries in result.values():
+        for key_value, entry in entries.items():
+            entry['quantities'].sort(key=lambda q: DIMENSION_ORDER[q['dimension']])
+            entry['amount'] = entry['quantities'][0]['amount']
+            entry['unit'] = entry['quantities'][0]['unit']
+            entry['category'] = categorize_ingredient(key_value)
+    return result
@@ -0,0 +1,92 @@
+import threading
+from datetime import date
+from typing import Any, Dict, List, NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .ingredients import PARSER_VERSION
+from .models import PlanRevision
+
+
+class ShoppingList(NamedTuple):
+    meal_counts: Dict[str, int]             # meal name -> times planned in the window
+    meal_ingredients: Dict[str, List[dict]]  # meal name -> parsed ingredients
+    items: Dict[str, Dict[str, Any]]        # ingredient key -> aggregated entry (diet.shopping)
+
+
+class ShoppingListCache:
+    """
+    Computed shopping lists per (user, date window) in Django's cache framework.
+
+    Every user has a plan revision in the database (PlanRevision), which diet.signals
+    bumps inside the transaction of any change to their planned meals, or to a saved
+    meal they may have planned. Each cached list records the revision it was built
+    from, so a page costs one primary-key query and one cache read, and a list built
+    from an older revision is rebuilt from the plan. Because the revision lives in the
+    database, a change made by one worker (or a management command) invalidates the
+    lists cached by every other process too, whatever the cache backend.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, 'SHOPPING_LIST_CACHE_TTL', 24 * 3600)
+
+    @staticmethod
+    def list_key(user_id: int, start_date: date, end_date: date) -> str:
+        # the parser version is part of the key: re-parsed ingredients are a new list
+        return f"shopping_list_{user_id}_{start_date.isoformat()}_{end_date.isoformat()}_v{PARSER_VERSION}"
+
+    @staticmethod
+    def revision(user_id: int) -> int:
+        """The user's current plan revision (0 until their plan first changes)"""
+        return PlanRevision.objects.filter(user_id=user_id).values_list('revision', flat=True).first() or 0
+
+    def get(self, user, start_date: date, end_date: date) -> ShoppingList:
+        """The user's shopping list for a date range, rebuilt only if their plan changed"""
+        revision = self.revision(user.pk)
+        list_key = self.list_key(user.pk, start_date, end_date)
+        entry = cache.get(list_key)
+        if entry is not None and entry.get('revision') == revision:
+            with self._lock:
+                self.hits += 1
+            return ShoppingList(*entry['shopping_list'])
+
+        with self._lock:
+            self.misses += 1
+        shopping_list = self.build(user, start_date, end_date)
+        # a plan change committed during the build has already bumped the revision, so
+        # this entry is simply never served
+        cache.set(list_key, {'revision': revision, 'shopping_list': tuple(shopping_list)}, timeout=self.timeout)
+        return shopping_list
+
+    @staticmethod
+    def build(user, start_date: date, end_date: date) -> ShoppingList:
+        from .utils import aggregate_ingredients
+        from .weekly_plan import planned_meal_ingredients
+
+        meal_counts, meal_ingredients = planned_meal_ingredients(user, start_date, end_date)
+        items = aggregate_ingredients(meal_ingredients, meal_counts)
+        return ShoppingList(meal_counts, meal_ingredients, items)
+
+    @staticmethod
+    def bump(user_id: int):
+        """Invalidate every cached shopping list of a user, with the change that made them stale"""
+        if PlanRevision.objects.filter(user_id=user_id).update(revision=F('revision') + 1):
+            return
+        try:
+            with transaction.atomic():
+                PlanRevision.objects.create(user_id=user_id, revision=1)
+        except IntegrityError:
+            # created concurrently by another bump
+            PlanRevision.objects.filter(user_id=user_id).update(revision=F('revision') + 1)
+
+
+shopping_list_cache = ShoppingListCache()
@@ -1 +1,142 @@
-# moved prompts over to ai.py
\ No newline at end of file
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .embedding_snapshot import mark_stale
+from .models import BulkRecipe, PlannedMeal, UserSavedMeal
+from .nutrition_totals import mark_day, refresh_planned_meal, refresh_saved_meal
+from .recipe_attributes import recipe_terms
+from .shopping_cache import shopping_list_cache
+from .text_index import recipe_text_index
+from .vector_index import recipe_index
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = {'embedding', 'embedding_vector', 'category', 'area', 'search_tags', 'raw_mealdb_data'}
+TEXT_FIELDS = {'meal_name', 'ingredients_text', 'instructions', 'category', 'area', 'raw_mealdb_data'}
+NUTRITION_FIELDS = ('macros_json', 'recommended_servings')
+PLAN_FIELDS = {'plan_json', 'planned_date', 'meal_type', 'user'}
+SHOPPING_FIELDS = {'meal_name', 'raw_mealdb_data', 'parsed_ingredients', 'parsed_ingredients_version', 'user'}
+
+
+@receiver(post_save, sender=BulkRecipe)
+def refresh_recipe_vector(sender, instance, update_fields=None, **kwargs):
+    """Keep the in-memory vector index in step with BulkRecipe.embedding and its filter fields"""
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        return
+    try:
+        vector, model = instance.get_embedding()
+    except ValueError as e:
+        # the row is already saved; an unreadable blob only keeps the recipe out of search
+        logger.warning("Dropping recipe %s from the vector index, unreadable embedding: %s", instance.id, e)
+        vector, model = None, None
+    recipe_index.upsert(instance.id, vector, model, recipe_terms(instance))
+    # a cleared embedding or changed filter terms outdate the shared snapshot as well
+    mark_stale()
+
+
+@receiver(post_save, sender=BulkRecipe)
+def refresh_recipe_text(sender, instance, update_fields=None, **kwargs):
+    """Keep the in-memory text index in step with the BulkRecipe text fields"""
+    if update_fields is not None and not TEXT_FIELDS & set(update_fields):
+        return
+    recipe_text_index.upsert(instance)
+
+
+@receiver(post_delete, sender=BulkRecipe)
+def drop_recipe_vector(sender, instance, **kwargs):
+    """Remove deleted recipes from the in-memory vector index"""
+    recipe_index.remove(instance.id)
+    mark_stale()
+
+
+@receiver(post_delete, sender=BulkRecipe)
+def drop_recipe_text(sender, instance, **kwargs):
+    """Remove deleted recipes from the in-memory text index"""
+    recipe_text_index.remove(instance.id)
+
+
+def _deleting_user(origin):
+    """True while a user's deletion cascades to their plan (the rollup rows go with them)"""
+    model = getattr(origin, 'model', type(origin))
+    return model is get_user_model()
+
+
+@receiver(post_save, sender=PlannedMeal)
+def refresh_planned_meal_totals(sender, instance, update_fields=None, **kwargs):
+    """Keep PlannedMeal.total_* and the day's DailyNutritionTotal in step with plan_json"""
+    if update_fields is not None and not PLAN_FIELDS & set(update_fields):
+        return
+    refresh_planned_meal(instance)
+
+
+@receiver(post_delete, sender=PlannedMeal)
+def drop_planned_meal_totals(sender, instance, origin=None, **kwargs):
+    """Take a removed planned meal out of its day's DailyNutritionTotal"""
+    if _deleting_user(origin):
+        return
+    mark_day(instance.user_id, instance.planned_date)
+
+
+@receiver(post_save, sender=PlannedMeal)
+def invalidate_shopping_list_on_plan_save(sender, instance, update_fields=None, **kwargs):
+    """A changed plan makes the user's cached shopping lists outdated"""
+    if update_fields is not None and not PLAN_FIELDS & set(update_fields):
+        return
+    shopping_list_cache.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=PlannedMeal)
+def invalidate_shopping_list_on_plan_delete(sender, instance, origin=None, **kwargs):
+    """A removed planned meal makes the user's cached shopping lists outdated"""
+    if _deleting_user(origin):
+        return
+    shopping_list_cache.bump(instance.user_id)
+
+
+def _nutrition_state(instance):
+    if set(NUTRITION_FIELDS) & instance.get_deferred_fields():
+        return None
+    return repr([getattr(instance, field) for field in NUTRITION_FIELDS])
+
+
+@receiver(post_init, sender=UserSavedMeal)
+def remember_saved_meal_nutrition(sender, instance, **kwargs):
+    """Note the loaded macros/servings so saves that leave them alone skip the refresh"""
+    instance._saved_nutrition = _nutrition_state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=UserSavedMeal)
+def refresh_saved_meal_totals(sender, instance, created=False, **kwargs):
+    """Refresh the planned meals using a saved meal whose macros or servings changed"""
+    state = _nutrition_state(instance)
+    if created or (state is not None and state == getattr(instance, '_saved_nutrition', None)):
+        instance._saved_nutrition = state
+        return
+    instance._saved_nutrition = state
+    refresh_saved_meal(instance)
+
+
+@receiver(post_delete, sender=UserSavedMeal)
+def drop_saved_meal_totals(sender, instance, origin=None, **kwargs):
+    """Planned meals pointing at a deleted saved meal no longer count towards their day"""
+    if _deleting_user(origin):
+        return
+    refresh_saved_meal(instance)
+
+
+@receiver(post_save, sender=UserSavedMeal)
+def invalidate_shopping_list_on_saved_meal_save(sender, instance, created=False, update_fields=None, **kwargs):
+    """Renamed or re-parsed saved meals may be planned; a new one cannot be yet"""
+    if created or (update_fields is not None and not SHOPPING_FIELDS & set(update_fields)):
+        return
+    shopping_list_cache.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=UserSavedMeal)
+def invalidate_shopping_list_on_saved_meal_delete(sender, instance, origin=None, **kwargs):
+    """Planned meals pointing at a deleted saved meal drop out of the shopping list"""
+    if _deleting_user(origin):
+        return
+    shopping_list_cache.bump(instance.user_id)
@@ -1,3 +1,148 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from .ingredients import parse_ingredient
+from .measures import COUNT, MASS, OTHER, VOLUME, parse
+from .models import BulkRecipe
+from .recipe_ingest import _json_records, _JSONStream
+from .shopping import aggregate_plans
+
+
+class MeasureParseTests(SimpleTestCase):
+
+    def assertMeasure(self, measure, amount, unit, dimension, quantity):
+        parsed = parse(measure)
+        self.assertAlmostEqual(parsed.amount, amount, places=3, msg=measure)
+        self.assertEqual((parsed.unit, parsed.dimension), (unit, dimension), msg=measure)
+        self.assertAlmostEqual(parsed.quantity, quantity, places=3, msg=measure)
+
+    def test_thousands_separator(self):
+        self.assertMeasure('1,000g', 1000, 'g', MASS, 1000)
+        self.assertMeasure('12,500 ml', 12500, 'ml', VOLUME, 12500)
+
+    def test_decimal_comma(self):
+        self.assertMeasure('1,5 kg', 1.5, 'kg', MASS, 1500)
+        self.assertMeasure('1,25 l', 1.25, 'l', VOLUME, 1250)
+
+    def test_capital_t_is_tablespoon(self):
+        self.assertMeasure('1 T', 1, 'tbsp', VOLUME, 15)
+        self.assertMeasure('2T', 2, 'tbsp', VOLUME, 30)
+        self.assertMeasure('1 t', 1, 'tsp', VOLUME, 5)
+        self.assertMeasure('2 Tbsp', 2, 'tbsp', VOLUME, 30)
+
+    def test_compound_measure_adds_up(self):
+        self.assertMeasure('1 lb 8oz', 1.5, 'lb', MASS, 453.592 + 8 * 28.3495)
+        self.assertMeasure('1 cup + 2 tbsp', 1.125, 'cup', VOLUME, 270)
+
+    def test_equivalent_measure_is_not_added(self):
+        self.assertMeasure('1 cup (240ml)', 1, 'cup', VOLUME, 240)
+        self.assertMeasure('200g 7oz', 200, 'g', MASS, 200)
+        self.assertMeasure('200g/7oz', 200, 'g', MASS, 200)
+
+    def test_multiplied_measure(self):
+        self.assertMeasure('1 x 400g tin', 400, 'g', MASS, 400)
+        self.assertMeasure('2 x 400g tins', 800, 'g', MASS, 800)
+        self.assertMeasure('2x400g', 800, 'g', MASS, 800)
+
+    def test_fractions_and_ranges(self):
+        self.assertMeasure('1/2 cup', 0.5, 'cup', VOLUME, 120)
+        self.assertMeasure('1 1/2 cups', 1.5, 'cup', VOLUME, 360)
+        self.assertMeasure('½ cup', 0.5, 'cup', VOLUME, 120)
+        self.assertMeasure('1-1/2 tsp', 1.5, 'tsp', VOLUME, 7.5)
+        self.assertMeasure('2-3 cloves', 3, 'clove', COUNT, 3)
+        self.assertMeasure('.5 cup', 0.5, 'cup', VOLUME, 120)
+
+    def test_pieces_and_unquantified(self):
+        self.assertMeasure('3 large', 3, '', COUNT, 3)
+        self.assertMeasure('1 small bunch', 1, 'bunch', COUNT, 1)
+        self.assertMeasure('2 heaped tsp', 2, 'tsp', VOLUME, 10)
+        self.assertMeasure('1 large onion', 1, '', COUNT, 1)
+        self.assertMeasure('', 1, '', COUNT, 1)
+        self.assertMeasure('To taste', 0, 'to taste', OTHER, 0)
+
+
+class AggregatePlansTests(SimpleTestCase):
+
+    def test_sums_per_dimension_and_plan(self):
+        stew = [parse_ingredient('Chicken', '600g'), parse_ingredient('fresh Garlic', '2 cloves'),
+                parse_ingredient('Salt', 'to taste')]
+        soup = [parse_ingredient('Chicken', '1 lb'), parse_ingredient('Garlic', '1 tbsp')]
+        result = aggregate_plans({
+            'a': ({'Stew': 2, 'Soup': 1}, {'Stew': stew, 'Soup': soup}),
+            'b': ({'Soup': 1}, {'Soup': soup}),
+        })
+
+        chicken = result['a']['chicken']
+        self.assertEqual((chicken['amount'], chicken['unit']), (1.65, 'kg'))
+        self.assertEqual(sorted(chicken['meals']), ['Soup', 'Stew'])
+        garlic = result['a']['garlic']
+        self.assertEqual([q['text'] for q in garlic['quantities']], ['15 ml', '4 cloves'])
+        self.assertEqual(sorted(garlic['original_names']), ['Garlic', 'fresh Garlic'])
+        self.assertEqual(result['a']['salt']['quantities'][0]['text'], 'to taste')
+
+        self.assertEqual(set(result['b']), {'chicken', 'garlic'})
+        self.assertEqual(result['b']['chicken']['quantities'][0]['text'], '453.59 g')
+
+    def test_empty_plan(self):
+        self.assertEqual(aggregate_plans({'a': ({}, {})}), {'a': {}})
+
+
+def _meal(i):
+    return {'idMeal': str(i), 'strMeal': f'Meal {i}', 'strInstructions': 'Stir. ' * 50,
+            'strIngredient1': 'Egg', 'strMeasure1': '2'}
+
+
+class JSONStreamTests(SimpleTestCase):
+
+    def test_values_across_chunk_boundaries(self):
+        values = [1, -2.5e10, True, None, 'a\u00e9b', [1, 2], {'a': 'b'}, [_meal(1), _meal(2)]]
+        for chunk_size in (1, 2, 3, 5, 7, 64):
+            stream = _JSONStream(io.StringIO(json.dumps(values)), chunk_size=chunk_size)
+            self.assertEqual(list(stream.array()), values, msg=chunk_size)
+            self.assertEqual(stream.peek(), '')
+
+    def test_array_and_meals_wrapper(self):
+        meals = [_meal(i) for i in range(3)]
+        self.assertEqual(list(_json_records(io.StringIO(json.dumps(meals)))), meals)
+        wrapped = json.dumps({'meals': meals, 'count': 3, 'more': {'meals': [_meal(9)]}})
+        self.assertEqual(list(_json_records(io.StringIO(wrapped))), meals)
+        self.assertEqual(list(_json_records(io.StringIO('{"meals": null}'))), [])
+
+    def test_malformed_element_fails_without_reading_on(self):
+        body = '[' + json.dumps(_meal(0)) + ', {"idMeal": "1", oops}, ' + ', '.join(
+            json.dumps(_meal(i)) for i in range(2, 2000)) + ']'
+        fp = io.StringIO(body)
+        records = _json_records(fp)
+        self.assertEqual(next(records), _meal(0))
+        with self.assertRaisesMessage(ValueError, 'Invalid JSON near offset'):
+            next(records)
+        self.assertLess(fp.tell(), len(body) // 2)
+
+
+class LoadRecipeDumpTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'meals.jsonl')
+        with open(self.path, 'w') as fp:
+            fp.writelines(json.dumps(_meal(i)) + '\n' for i in range(100))
+
+    def load(self, *args):
+        call_command('load_recipe_dump', self.path, *args, stdout=io.StringIO())
+
+    def test_limit_counts_only_new_recipes(self):
+        self.load('--limit', '50')
+        self.assertEqual(BulkRecipe.objects.count(), 50)
+        # the first 50 records are stored already and don't count towards the limit
+        self.load('--limit', '20')
+        self.assertEqual(BulkRecipe.objects.count(), 70)
+        self.load('--limit', '20', '--batch-size', '7')
+        self.assertEqual(BulkRecipe.objects.count(), 90)
+        self.load()
+        self.assertEqual(BulkRecipe.objects.count(), 100)
@@ -0,0 +1,218 @@
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import BulkRecipe
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be by for from in into is it of on or the then to with
+    until over about add your you minutes minute min
+""".split())
+
+# Field weights: a term in the recipe name counts three times one in the instructions
+FIELD_WEIGHTS = (
+    ('meal_name', 3.0),
+    ('ingredients', 2.0),
+    ('category', 1.5),
+    ('area', 1.5),
+    ('instructions', 1.0),
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric terms without stopwords, with a naive plural fold"""
+    terms = []
+    for token in _TOKEN.findall((text or '').lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def _recipe_fields(recipe) -> Dict[str, str]:
+    ingredients = recipe.ingredients_text or ' '.join(ing['ingredient'] for ing in recipe.get_ingredients_list())
+    return {
+        'meal_name': recipe.meal_name or '',
+        'ingredients': ingredients,
+        'category': recipe.category or '',
+        'area': recipe.area or '',
+        'instructions': recipe.instructions or '',
+    }
+
+
+class RecipeTextIndex:
+    """
+    Process-wide BM25 inverted index over BulkRecipe text fields.
+
+    Each term maps to a posting list {recipe_id: weighted term frequency}, so a
+    query only touches the postings of its own terms: cost depends on how common
+    the query terms are, not on catalog size or instruction length. Saves and
+    deletes in this process update it through the BulkRecipe signals; other
+    processes' writes are picked up by the same periodic table check as the
+    vector index.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._doc_length: Dict[int, float] = {}
+        self._doc_filters: Dict[int, Tuple[str, str, str]] = {}  # lower-cased category, area, ingredients
+        self._total_length = 0.0
+        self._stamp = None
+        self._checked_at = 0.0
+
+    # --- loading -------------------------------------------------------------
+
+    @staticmethod
+    def _table_stamp():
+        stats = BulkRecipe.objects.aggregate(count=Count('id'), latest=Max('last_updated'))
+        return stats['count'], stats['latest']
+
+    def load(self):
+        """(Re)build the index from the database"""
+        with self._lock:
+            stamp = self._table_stamp()
+            self._postings = defaultdict(dict)
+            self._doc_terms = {}
+            self._doc_length = {}
+            self._doc_filters = {}
+            self._total_length = 0.0
+            recipes = BulkRecipe.objects.only(
+                'id', 'meal_name', 'ingredients_text', 'category', 'area', 'instructions',
+                'parsed_ingredients', 'parsed_ingredients_version'
+            )
+            for recipe in recipes.iterator(chunk_size=500):
+                self._add(recipe.id, _recipe_fields(recipe))
+            self._stamp = stamp
+            self._checked_at = time.monotonic()
+            self._loaded = True
+            logger.info("Recipe text index loaded: %s recipes, %s terms", len(self._doc_terms), len(self._postings))
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            self.load()
+            return
+        refresh_seconds = getattr(settings, 'RAG_INDEX_REFRESH_SECONDS', 300)
+        if refresh_seconds is None or time.monotonic() - self._checked_at < refresh_seconds:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._table_stamp() != self._stamp:
+                self.load()
+
+    # --- incremental updates ---------------------------------------------------
+
+    def _add(self, recipe_id: int, fields: Dict[str, str]):
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(fields[field]):
+                frequencies[term] += weight
+        for term, frequency in frequencies.items():
+            self._postings[term][recipe_id] = frequency
+        length = sum(frequencies.values())
+        self._doc_terms[recipe_id] = tuple(frequencies)
+        self._doc_length[recipe_id] = length
+        self._doc_filters[recipe_id] = (
+            fields['category'].lower(), fields['area'].lower(), fields['ingredients'].lower()
+        )
+        self._total_length += length
+
+    def _remove(self, recipe_id: int):
+        for term in self._doc_terms.pop(recipe_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(recipe_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_length.pop(recipe_id, 0.0)
+        self._doc_filters.pop(recipe_id, None)
+
+    def upsert(self, recipe):
+        """Re-index one recipe"""
+        with self._lock:
+            if not self._loaded:
+                return  # picked up by the next full load
+            self._remove(recipe.id)
+            self._add(recipe.id, _recipe_fields(recipe))
+
+    def remove(self, recipe_id: int):
+        with self._lock:
+            if self._loaded:
+                self._remove(recipe_id)
+
+    # --- querying --------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _passes(self, recipe_id: int, category: Optional[str], area: Optional[str], ingredient: Optional[str]) -> bool:
+        doc_category, doc_area, doc_ingredients = self._doc_filters[recipe_id]
+        return ((not category or category.lower() in doc_category)
+                and (not area or area.lower() in doc_area)
+                and (not ingredient or ingredient.lower() in doc_ingredients))
+
+    def search(self, query: str, top_k: int = 20, category: Optional[str] = None, area: Optional[str] = None,
+               ingredient: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Return [(recipe_id, bm25_score), ...] best first.
+        category/area/ingredient are substring filters like the icontains filters in the views.
+        """
+        self._ensure_fresh()
+        terms = set(tokenize(query))
+        if not terms or top_k <= 0:
+            return []
+
+        scores = defaultdict(float)
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for recipe_id, frequency in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._doc_length[recipe_id] / average_length)
+                    scores[recipe_id] += idf * frequency * (self.k1 + 1.0) / (frequency + norm)
+
+            if category or area or ingredient:
+                scores = {recipe_id: score for recipe_id, score in scores.items()
+                          if self._passes(recipe_id, category, area, ingredient)}
+
+        return heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several best-first id rankings: score(id) = sum of 1 / (k + rank)"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, recipe_id in enumerate(ranking, 1):
+            fused[recipe_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+recipe_text_index = RecipeTextIndex()
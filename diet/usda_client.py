@@ -1,22 +1,32 @@
-import requests
 from django.core.cache import cache
 from decouple import config
 from typing import Optional, Dict, Any
 import logging
 from requests.exceptions import RequestException
-from time import sleep
+from django.conf import settings
 import hashlib
 import json
+from .http_clients import get_client
+from .rate_limit import RateLimitExceeded, TokenBucket, api_key_bucket
+from . import usda_store
 
 logger = logging.getLogger(__name__)
 
 class USDAClient:
     """Client for interacting with the USDA FoodData Central API"""
     
-    def __init__(self):
-        self.api_key = config('USDA_API_KEY')
-        self.base_url = 'https://api.nal.usda.gov/fdc/v1'
-        self.rate_limit_wait = 1  # seconds to wait between requests
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or config('USDA_API_KEY')
+        self.http = get_client('usda')  # shared keep-alive pool with timeouts and retries
+        self.base_url = self.http.base_url
+        # one bucket per API key, shared by every worker process - only waits when the hourly quota runs dry
+        limits = getattr(settings, 'USDA_RATE_LIMITS', {}).get(self.api_key, {})
+        self.rate_limiter = TokenBucket(
+            api_key_bucket('usda', self.api_key),
+            rate_per_second=limits.get('per_hour', settings.USDA_RATE_LIMIT_PER_HOUR) / 3600,
+            capacity=limits.get('burst', settings.USDA_RATE_LIMIT_BURST),
+            max_wait=settings.USDA_RATE_LIMIT_MAX_WAIT,
+        )
         
     def _create_cache_key(self, endpoint: str, params: Dict[str, Any]) -> str:
         """
@@ -35,9 +45,12 @@ class USDAClient:
         # safe cache key
         return f"usda_api_{endpoint}_{param_hash}"
         
-    def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Optional[Dict]:
+    def _make_request(self, endpoint: str, params: Dict[str, Any] = None, metric: Optional[str] = None,
+                      use_cache: bool = True) -> Optional[Dict]:
         """
         Make a request to the USDA API with error handling and rate limiting
+        metric names the latency histogram when the endpoint path has ids in it;
+        use_cache=False skips the 1 hour response cache (for records kept in StoredUSDAFood)
         """
         if params is None:
             params = {}
@@ -48,29 +61,38 @@ class USDAClient:
         cache_key = self._create_cache_key(endpoint, params)
         
         # Check cache first
-        cached_response = cache.get(cache_key)
+        cached_response = cache.get(cache_key) if use_cache else None
         if cached_response:
             return cached_response
             
         try:
-            # ratelimiting
-            sleep(self.rate_limit_wait)
+            # ratelimiting - cache hits above never spend a token
+            self.rate_limiter.acquire()
             
-            url = f"{self.base_url}/{endpoint}"
-            response = requests.get(url, params=params)
+            response = self.http.get(endpoint, params=params, endpoint=metric or endpoint)
             response.raise_for_status()
             
             data = response.json()
             
             # cahce success responses for 1 hour
-            cache.set(cache_key, data, 3600)
+            if use_cache:
+                cache.set(cache_key, data, 3600)
             
             return data
             
+        except RateLimitExceeded as e:
+            logger.warning(f"USDA API rate limit reached: {str(e)}")
+            return None
         except RequestException as e:
             logger.error(f"USDA API request failed: {str(e)}")
             return None
             
+    def rate_limit_status(self) -> Dict[str, float]:
+        """
+        Remaining request budget for this API key (tokens left, quota, and how often requests had to wait)
+        """
+        return self.rate_limiter.status()
+            
     def search_foods(self, query: str, page: int = 1, page_size: int = 25) -> Optional[Dict]:
         """
         Search for foods in the USDA database with pagination support
@@ -89,7 +111,15 @@ class USDAClient:
             'pageNumber': page - 1,  # USDA API uses 0-based pagination or something
             'dataType': ["Foundation", "SR Legacy"]  # higher quality data sources
         }
-        return self._make_request('foods/search', params)
+        results = self._make_request('foods/search', params)
+        if results is None:
+            # API down or rate limited - answer from the foods stored so far
+            return usda_store.search_local(query, page=page, page_size=page_size)
+        try:
+            usda_store.upsert_search_results(results.get('foods') or [])
+        except Exception as e:
+            logger.error(f"Storing USDA search results failed: {str(e)}")
+        return results
         
     def get_food_details(self, fdc_id: str) -> Optional[Dict]:
         """
@@ -102,23 +132,32 @@ class USDAClient:
         - Scientific name and classification
         - And more
         
+        Served from StoredUSDAFood once fetched (see diet.usda_store for the refresh policy)
+        
         Args:
             fdc_id (str): The FDC ID of the food item
             
         Returns:
             Optional[Dict]: Detailed food information
         """
+        return usda_store.get_details(fdc_id, self._fetch_food_details)
+        
+    def _fetch_food_details(self, fdc_id: str) -> Optional[Dict]:
+        """
+        Fetch a food's full record from the API
+        """
         params = {
             'format': 'full'  # get all - dropping some later likley if know all use cases and needs
         }
-        return self._make_request(f'food/{fdc_id}', params)
+        return self._make_request(f'food/{fdc_id}', params, metric='food', use_cache=False)
         
     def test_connection(self) -> bool:
         """
         Test the API connection with a simple query
         """
         try:
-            result = self.search_foods('apple', page_size=1)
+            # straight to the API: search_foods would answer from the local store when it is down
+            result = self._make_request('foods/search', {'query': 'apple', 'pageSize': 1}, use_cache=False)
             return result is not None and 'foods' in result
         except Exception as e:
             logger.error(f"USDA API connection test failed: {str(e)}")
@@ -0,0 +1,297 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import StoredUSDAFood
+
+logger = logging.getLogger(__name__)
+
+# Local-first USDA food store. Detail lookups are served from a per-process LRU, then from
+# StoredUSDAFood, and only go to the API when the food has never been fetched in full.
+# Search results are upserted in bulk as they come back, so the table also answers
+# searches when the API is down or rate limited.
+#
+# Refresh policy (stale-while-revalidate): a stored detail record younger than
+# USDA_FOOD_FRESH_DAYS is served as is; an older one is still served, while a background
+# thread re-fetches it; past USDA_FOOD_MAX_STALE_DAYS the request waits for the re-fetch
+# (and falls back to the stored copy if that fails).
+
+# FoodData Central nutrient ids for the quick-access columns (2047/2048 are the Atwater
+# energy values some Foundation foods report instead of 1008)
+MACRO_NUTRIENT_IDS = {
+    'calories': (1008, 2047, 2048),
+    'protein': (1003,),
+    'fat': (1004,),
+    'carbs': (1005,),
+}
+FLUSH_COUNTS_EVERY = 50  # local hits buffered before fetch_count is written back
+FLUSH_COUNTS_INTERVAL = 60.0  # ... or seconds since the last write-back, whichever comes first
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # fdcId -> (raw_data, last_fetched)
+_pending_counts: Dict[str, int] = {}
+_last_flush = time.monotonic()
+_refreshing = set()
+_executor = None
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def _nutrient_rows(food: dict):
+    """(nutrient id, name, unit, amount) for a detail record or a search hit"""
+    for row in food.get('foodNutrients') or []:
+        nutrient = row.get('nutrient') or {}
+        yield (
+            nutrient.get('id') or row.get('nutrientId'),
+            (nutrient.get('name') or row.get('nutrientName') or '').lower(),
+            (nutrient.get('unitName') or row.get('unitName') or '').lower(),
+            row.get('amount', row.get('value')),
+        )
+
+
+def extract_macros(food: dict) -> Dict[str, Optional[float]]:
+    """Calories (kcal) and protein/carbs/fat (g) per 100 g from a USDA record"""
+    macros = dict.fromkeys(MACRO_NUTRIENT_IDS)
+    for nutrient_id, name, unit, amount in _nutrient_rows(food):
+        if amount is None:
+            continue
+        for macro, ids in MACRO_NUTRIENT_IDS.items():
+            if macros[macro] is None and nutrient_id in ids and (macro != 'calories' or unit == 'kcal'):
+                macros[macro] = float(amount)
+    if macros['calories'] is None:
+        for _, name, unit, amount in _nutrient_rows(food):
+            if 'energy' in name and unit == 'kcal' and amount is not None:
+                macros['calories'] = float(amount)
+                break
+    return macros
+
+
+def _publication_date(food: dict):
+    value = food.get('publicationDate') or food.get('publishedDate')
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _fields(food: dict) -> dict:
+    return {
+        'description': (food.get('description') or '')[:255],
+        'data_type': (food.get('dataType') or '')[:50],
+        'publication_date': _publication_date(food),
+        'raw_data': food,
+        **extract_macros(food),
+    }
+
+
+def _remember(fdc_id: str, raw_data: dict, last_fetched):
+    with _lock:
+        _memory[fdc_id] = (raw_data, last_fetched)
+        _memory.move_to_end(fdc_id)
+        while len(_memory) > _setting('USDA_FOOD_MEMORY_CACHE_SIZE', 512):
+            _memory.popitem(last=False)
+
+
+def _count_hit(fdc_id: str):
+    """
+    Buffer a local hit; the counts are added to fetch_count every FLUSH_COUNTS_EVERY hits
+    or FLUSH_COUNTS_INTERVAL seconds, and when the process exits
+    """
+    global _last_flush
+    with _lock:
+        _pending_counts[fdc_id] = _pending_counts.get(fdc_id, 0) + 1
+        now = time.monotonic()
+        if sum(_pending_counts.values()) < FLUSH_COUNTS_EVERY and now - _last_flush < FLUSH_COUNTS_INTERVAL:
+            return
+        counts = dict(_pending_counts)
+        _pending_counts.clear()
+        _last_flush = now
+    flush_counts(counts)
+
+
+def flush_counts(counts: Optional[Dict[str, int]] = None):
+    """Write buffered local hits to fetch_count (all of them when counts is None)"""
+    global _last_flush
+    if counts is None:
+        with _lock:
+            counts = dict(_pending_counts)
+            _pending_counts.clear()
+            _last_flush = time.monotonic()
+    for fdc_id, hits in counts.items():
+        StoredUSDAFood.objects.filter(fdcId=fdc_id).update(fetch_count=F('fetch_count') + hits)
+
+
+@atexit.register
+def _flush_counts_at_exit():
+    try:
+        flush_counts()
+    except Exception as e:
+        logger.warning("Could not write back buffered USDA food hits: %s", e)
+
+
+def _age(last_fetched) -> timedelta:
+    return timezone.now() - last_fetched
+
+
+def save_details(food: dict) -> Optional[StoredUSDAFood]:
+    """Write-through for a full detail record fetched from the API"""
+    fdc_id = str(food.get('fdcId') or '')
+    if not fdc_id:
+        return None
+    stored, created = StoredUSDAFood.objects.update_or_create(
+        fdcId=fdc_id, defaults={**_fields(food), 'is_detailed': True}
+    )
+    if not created:
+        StoredUSDAFood.objects.filter(pk=stored.pk).update(fetch_count=F('fetch_count') + 1)
+    _remember(fdc_id, food, stored.last_fetched)
+    return stored
+
+
+def upsert_search_results(foods: Iterable[dict]) -> int:
+    """
+    Store search hits in bulk: one query to find existing rows, one bulk_create and one
+    bulk_update. Rows already holding a full detail record keep it (only fetch_count moves).
+    """
+    by_id = {str(food['fdcId']): food for food in foods if food.get('fdcId')}
+    if not by_id:
+        return 0
+    now = timezone.now()
+    existing = {row.fdcId: row for row in StoredUSDAFood.objects.filter(fdcId__in=by_id).only('id', 'fdcId', 'is_detailed')}
+
+    new_rows = [StoredUSDAFood(fdcId=fdc_id, **_fields(food)) for fdc_id, food in by_id.items() if fdc_id not in existing]
+    StoredUSDAFood.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+    summaries = []
+    for fdc_id, row in existing.items():
+        if not row.is_detailed:
+            for field, value in _fields(by_id[fdc_id]).items():
+                setattr(row, field, value)
+            row.last_fetched = now
+            summaries.append(row)
+    if summaries:
+        StoredUSDAFood.objects.bulk_update(
+            summaries, ['description', 'data_type', 'publication_date', 'raw_data', *MACRO_NUTRIENT_IDS, 'last_fetched']
+        )
+    if existing:
+        StoredUSDAFood.objects.filter(fdcId__in=existing).update(fetch_count=F('fetch_count') + 1)
+    return len(by_id)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='usda-refresh')
+    return _executor
+
+
+def _revalidate(fdc_id: str, fetch: Callable[[str], Optional[dict]]):
+    with _lock:
+        if fdc_id in _refreshing:
+            return
+        _refreshing.add(fdc_id)
+
+    def refresh():
+        try:
+            food = fetch(fdc_id)
+            if food:
+                save_details(food)
+        except Exception:
+            logger.exception("Background refresh of USDA food %s failed", fdc_id)
+        finally:
+            with _lock:
+                _refreshing.discard(fdc_id)
+            close_old_connections()
+
+    _pool().submit(refresh)
+
+
+def get_details(fdc_id, fetch: Callable[[str], Optional[dict]]) -> Optional[dict]:
+    """
+    Read-through detail lookup. fetch(fdc_id) calls the API and is only used for foods
+    never fetched in full, or to refresh stale ones.
+    """
+    fdc_id = str(fdc_id)
+    fresh_for = timedelta(days=_setting('USDA_FOOD_FRESH_DAYS', 30))
+    max_stale = timedelta(days=_setting('USDA_FOOD_MAX_STALE_DAYS', 365))
+
+    with _lock:
+        cached = _memory.get(fdc_id)
+        if cached:
+            _memory.move_to_end(fdc_id)
+    if cached is None:
+        stored = StoredUSDAFood.objects.filter(fdcId=fdc_id, is_detailed=True).only('raw_data', 'last_fetched').first()
+        if stored is not None:
+            cached = (stored.raw_data, stored.last_fetched)
+            _remember(fdc_id, *cached)
+
+    if cached is None:
+        food = fetch(fdc_id)
+        if food:
+            save_details(food)
+        return food
+
+    raw_data, last_fetched = cached
+    age = _age(last_fetched)
+    if age > max_stale:
+        food = fetch(fdc_id)
+        if food:
+            save_details(food)
+            return food
+        logger.warning("Serving USDA food %s from a copy %s days old", fdc_id, age.days)
+    elif age > fresh_for:
+        _revalidate(fdc_id, fetch)
+    _count_hit(fdc_id)
+    return raw_data
+
+
+def _search_hit(food: StoredUSDAFood) -> dict:
+    """A stored food in the shape of an API search hit (foodNutrients with nutrientName/value)"""
+    nutrients = [
+        ('Energy', food.calories, 'KCAL'),
+        ('Protein', food.protein, 'G'),
+        ('Carbohydrate, by difference', food.carbs, 'G'),
+        ('Total lipid (fat)', food.fat, 'G'),
+    ]
+    return {
+        'fdcId': food.fdcId,
+        'description': food.description,
+        'dataType': food.data_type,
+        'brandOwner': (food.raw_data or {}).get('brandOwner', 'Generic'),
+        'servingSize': (food.raw_data or {}).get('servingSize'),
+        'servingSizeUnit': (food.raw_data or {}).get('servingSizeUnit'),
+        'foodNutrients': [
+            {'nutrientName': name, 'value': value, 'unitName': unit}
+            for name, value, unit in nutrients if value is not None
+        ],
+    }
+
+
+def search_local(query: str, page: int = 1, page_size: int = 25) -> Optional[Dict]:
+    """Stored foods whose description contains every query word, most fetched first (None if no match)"""
+    words = (query or '').split()
+    if not words:
+        return None
+    condition = Q()
+    for word in words:
+        condition &= Q(description__icontains=word)
+    matches = StoredUSDAFood.objects.filter(condition).order_by('-fetch_count', 'description')
+    total = matches.count()
+    if not total:
+        return None
+    start = (max(page, 1) - 1) * page_size
+    foods: List[dict] = [_search_hit(food) for food in matches[start:start + page_size]]
+    return {'foods': foods, 'totalHits': total, 'currentPage': page, 'source': 'local'}
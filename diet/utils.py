@@ -1,6 +1,7 @@
-from collections import defaultdict
 import re
+from functools import lru_cache
 from typing import Dict, List, Tuple, Any
+from . import measures
 
 # Common ingredient categories for basic matching
 INGREDIENT_CATEGORIES = {
@@ -11,33 +12,25 @@ INGREDIENT_CATEGORIES = {
     'spices': ['pepper', 'cumin', 'paprika', 'cinnamon', 'oregano']
 }
 
+_PREPARATION_WORDS = re.compile(r'\b(fresh|dried|ground|powdered|whole|sliced|chopped)\b')
+
+@lru_cache(maxsize=8192)
 def normalize_ingredient(ingredient: str) -> str:
     """Normalize ingredient name for matching."""
     # Convert to lowercase and remove common prefixes/suffixes
     normalized = ingredient.lower().strip()
     # Remove common words that don't affect matching
-    normalized = re.sub(r'\b(fresh|dried|ground|powdered|whole|sliced|chopped)\b', '', normalized)
+    normalized = _PREPARATION_WORDS.sub('', normalized)
     # Remove extra whitespace
     normalized = ' '.join(normalized.split())
     return normalized
 
 def parse_measure(measure: str) -> Tuple[float, str]:
-    """Parse measurement string into amount and unit."""
-    try:
-        # Split into amount and unit
-        parts = measure.strip().split()
-        if not parts:
-            return 1.0, ''
-            
-        # Try to convert first part to float
-        amount = float(parts[0])
-        # Rest is the unit
-        unit = ' '.join(parts[1:]) if len(parts) > 1 else ''
-        return amount, unit
-    except (ValueError, IndexError):
-        # If parsing fails, return default values
-        return 1.0, measure
+    """Parse measurement string into amount and unit (see diet.measures for the grammar)."""
+    parsed = measures.parse(measure)
+    return parsed.amount, parsed.unit
 
+@lru_cache(maxsize=8192)
 def categorize_ingredient(ingredient: str) -> str:
     """Categorize ingredient into basic food groups."""
     normalized = normalize_ingredient(ingredient)
@@ -50,41 +43,7 @@ def categorize_ingredient(ingredient: str) -> str:
 def aggregate_ingredients(meal_ingredients: Dict[str, List[Dict[str, str]]], meal_counts: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
     """
     Aggregate ingredients from multiple meals, taking into account how many times each meal appears.
-    Returns a dictionary of normalized ingredients with their total amounts and categories.
+    Returns a dictionary of normalized ingredients with their summed quantities (per unit dimension) and categories.
     """
-    # Initialize aggregation structure
-    ingredient_totals = defaultdict(lambda: {
-        'amount': 0.0,
-        'unit': '',
-        'category': '',
-        'original_names': set(),
-        'meals': set()
-    })
-    
-    # First pass: Simple matching and aggregation
-    for meal_name, ingredients in meal_ingredients.items():
-        # Get the number of times this meal appears in the plan
-        meal_count = meal_counts.get(meal_name, 1)
-        
-        for ing in ingredients:
-            # Normalize the ingredient name
-            normalized_name = normalize_ingredient(ing['ingredient'])
-            # Parse the measure
-            amount, unit = parse_measure(ing['measure'])
-            
-            # Multiply amount by meal count
-            total_amount = amount * meal_count
-            
-            # Update the totals
-            ingredient_totals[normalized_name]['amount'] += total_amount
-            ingredient_totals[normalized_name]['unit'] = unit or ingredient_totals[normalized_name]['unit']
-            ingredient_totals[normalized_name]['category'] = categorize_ingredient(ing['ingredient'])
-            ingredient_totals[normalized_name]['original_names'].add(ing['ingredient'])
-            ingredient_totals[normalized_name]['meals'].add(meal_name)
-    
-    # Convert sets to lists for JSON serialization
-    for ing_data in ingredient_totals.values():
-        ing_data['original_names'] = list(ing_data['original_names'])
-        ing_data['meals'] = list(ing_data['meals'])
-    
-    return dict(ingredient_totals) 
\ No newline at end of file
+    from .shopping import aggregate_plans
+    return aggregate_plans({None: (meal_counts, meal_ingredients)})[None]
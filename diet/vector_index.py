@@ -0,0 +1,376 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .ann import IVFIndex, attach_ivf, load_ivf
+from .embedding_codec import unpack_embedding
+from .embedding_providers import embedding_model_name
+from .embedding_snapshot import current_manifest, is_fresh, open_snapshot
+from .models import BulkRecipe, LEGACY_EMBEDDING_MODEL
+from .recipe_attributes import RecipeAttributes, recipe_terms
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_vector(vector: Sequence[float]) -> Optional[np.ndarray]:
+    """Return a unit-length float32 copy of the vector (None for empty/zero vectors)"""
+    if vector is None or len(vector) == 0:
+        return None
+    arr = np.array(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(arr))
+    if norm == 0.0 or not np.isfinite(norm):
+        return None
+    return arr / norm
+
+
+class RecipeVectorIndex:
+    """
+    Process-wide in-memory index over BulkRecipe embeddings.
+
+    All vectors live in one pre-normalized float32 matrix, so a query is a single
+    matrix-vector product followed by argpartition for the top-k rows. Each row
+    also carries the recipe's category/area/tags/ingredients (RecipeAttributes),
+    so filtered searches rank only the matching rows. Rows are updated by the
+    BulkRecipe signals in this process; other processes
+    (gunicorn workers, management commands) are picked up by a periodic
+    freshness check against the table.
+
+    When a fresh on-disk snapshot exists (see embedding_snapshot) the matrix is a
+    read-only memmap of it instead, so every worker shares one copy through the
+    page cache and loading never queries the database. The first local change
+    copies the matrix into private memory.
+
+    With RAG_SEARCH_BACKEND = 'ivf', searches score only the rows in the
+    RAG_IVF_NPROBE nearest inverted lists of the index built by build_ann_index
+    (see ann.py) plus any rows added since it was attached.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dim = 0
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._active = np.zeros(0, dtype=bool)
+        self._attributes = RecipeAttributes()
+        self._size = 0  # rows in use, capacity is len(self._matrix)
+        self._active_count = 0
+        self._row_for_id = {}  # None until first needed when loaded from a snapshot
+        self._source = None  # 'db' or 'snapshot'
+        self._stamp = None
+        self._checked_at = 0.0
+        self._ann: Optional[IVFIndex] = None
+        self._ann_size = 0  # rows at or past this were added after the ANN index was attached
+        self._ann_stamp = None
+
+    # --- loading -------------------------------------------------------------
+
+    @staticmethod
+    def _embedded_recipes():
+        return BulkRecipe.with_embeddings()
+
+    @staticmethod
+    def _expected_model() -> str:
+        return embedding_model_name()
+
+    def _table_stamp(self):
+        """Cheap fingerprint of the embedded rows (no embedding payload is read)"""
+        stats = self._embedded_recipes().aggregate(count=Count('id'), latest=Max('last_updated'))
+        return stats['count'], stats['latest']
+
+    def _iter_source_vectors(self) -> Iterable[Tuple[int, np.ndarray, str, Dict[str, object]]]:
+        """Yield (recipe_id, vector, model, filter terms) from the binary column, then legacy JSON rows"""
+        attribute_fields = ('id', 'category', 'area', 'search_tags', 'parsed_ingredients', 'parsed_ingredients_version')
+        blobs = BulkRecipe.objects.filter(embedding_vector__isnull=False).only(*attribute_fields, 'embedding_vector')
+        for recipe in blobs.iterator(chunk_size=500):
+            try:
+                decoded = unpack_embedding(recipe.embedding_vector)
+            except ValueError as e:
+                logger.warning("Skipping unreadable embedding for recipe %s: %s", recipe.id, e)
+                continue
+            if decoded is not None:
+                yield recipe.id, decoded.vector, decoded.model, recipe_terms(recipe)
+
+        legacy = (BulkRecipe.objects.filter(embedding_vector__isnull=True, embedding__isnull=False)
+                  .exclude(embedding={}).only(*attribute_fields, 'embedding'))
+        for recipe in legacy.iterator(chunk_size=500):
+            if isinstance(recipe.embedding, list):
+                yield recipe.id, recipe.embedding, LEGACY_EMBEDDING_MODEL, recipe_terms(recipe)
+
+    def _reset(self, dim: int, capacity: int):
+        self._dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._attributes = RecipeAttributes()
+        self._size = 0
+        self._active_count = 0
+        self._row_for_id = {}
+        self._ann = None
+        self._ann_size = 0
+
+    def _load_snapshot(self) -> bool:
+        snapshot = open_snapshot()
+        if snapshot is None:
+            return False
+        count = len(snapshot.ids)
+        self._dim = snapshot.manifest['dim']
+        self._matrix = snapshot.vectors
+        self._ids = snapshot.ids
+        self._active = np.ones(count, dtype=bool)
+        self._attributes = RecipeAttributes.from_arrays(snapshot.attributes)
+        self._size = count
+        self._active_count = count
+        self._row_for_id = None
+        self._source = 'snapshot'
+        self._stamp = snapshot.manifest['version']
+        self._checked_at = time.monotonic()
+        self._loaded = True
+        self._attach_ann()
+        logger.info("Recipe vector index mapped snapshot v%s: %s vectors, dim=%s", self._stamp, count, self._dim)
+        return True
+
+    def load(self, use_snapshot: bool = True):
+        """(Re)build the matrix, from a fresh snapshot when available, else from the database"""
+        with self._lock:
+            if use_snapshot and self._load_snapshot():
+                return
+            stamp = self._table_stamp()
+            expected_model = self._expected_model()
+            ids = []
+            vectors = []
+            terms = []
+            dim = 0
+            for recipe_id, embedding, model, row_terms in self._iter_source_vectors():
+                if model != expected_model:
+                    continue
+                vec = normalize_vector(embedding)
+                if vec is None:
+                    continue
+                if not dim:
+                    dim = len(vec)
+                if len(vec) != dim:
+                    logger.warning("Skipping embedding for recipe %s: dimension %s != %s", recipe_id, len(vec), dim)
+                    continue
+                ids.append(recipe_id)
+                vectors.append(vec)
+                terms.append(row_terms)
+
+            self._reset(dim, len(vectors))
+            if vectors:
+                self._matrix[:] = np.vstack(vectors)
+                self._ids[:] = ids
+                self._active[:] = True
+                self._size = len(vectors)
+                self._active_count = len(vectors)
+                self._row_for_id = {recipe_id: row for row, recipe_id in enumerate(ids)}
+                self._attributes = RecipeAttributes.build(terms)
+
+            self._source = 'db'
+            self._stamp = stamp
+            self._checked_at = time.monotonic()
+            self._loaded = True
+            self._attach_ann()
+            logger.info("Recipe vector index loaded: %s vectors, dim=%s", self._size, self._dim)
+
+    @staticmethod
+    def _backend() -> str:
+        return getattr(settings, 'RAG_SEARCH_BACKEND', 'exact')
+
+    @staticmethod
+    def _ann_file_stamp():
+        path = getattr(settings, 'RAG_ANN_INDEX_PATH', None)
+        try:
+            return os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            return None
+
+    def _attach_ann(self):
+        """Map the saved IVF index (if enabled and compatible) onto the current rows"""
+        self._ann = None
+        self._ann_size = 0
+        self._ann_stamp = self._ann_file_stamp()
+        if self._backend() != 'ivf' or self._ann_stamp is None or not self._size:
+            return
+        saved = load_ivf(settings.RAG_ANN_INDEX_PATH)
+        if saved is None or saved.model != self._expected_model() or saved.centroids.shape[1] != self._dim:
+            logger.warning("ANN index at %s does not match the recipe embeddings; using exact search",
+                           settings.RAG_ANN_INDEX_PATH)
+            return
+        self._ann = attach_ivf(saved, self._ids[:self._size], self._matrix[:self._size])
+        self._ann_size = self._size
+        logger.info("Attached IVF index: %s lists over %s vectors", self._ann.n_lists, self._size)
+
+    def invalidate(self):
+        """Drop the in-memory matrix; the next search reloads it"""
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            self.load()
+            return
+        refresh_seconds = getattr(settings, 'RAG_INDEX_REFRESH_SECONDS', 300)
+        if refresh_seconds is None or time.monotonic() - self._checked_at < refresh_seconds:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            manifest = current_manifest()
+            if self._source == 'snapshot':
+                # Only the filesystem is consulted while serving from a snapshot
+                if manifest is None or manifest['version'] != self._stamp or not is_fresh(manifest):
+                    self.load()
+            elif is_fresh(manifest) or self._table_stamp() != self._stamp:
+                self.load()
+                return
+            if self._loaded and self._ann_file_stamp() != self._ann_stamp:
+                self._attach_ann()
+
+    # --- incremental updates ---------------------------------------------------
+
+    def _rows(self) -> dict:
+        if self._row_for_id is None:
+            ids = self._ids[:self._size].tolist()
+            self._row_for_id = {recipe_id: row for row, recipe_id in enumerate(ids) if self._active[row]}
+        return self._row_for_id
+
+    def _make_writable(self):
+        """Copy a mapped snapshot into private memory before changing it in place"""
+        if self._source != 'snapshot':
+            return
+        self._matrix = np.array(self._matrix[:self._size])
+        self._ids = np.array(self._ids[:self._size])
+        self._source = 'db'
+        self._stamp = self._table_stamp()
+
+    def _grow(self, min_capacity: int):
+        capacity = max(min_capacity, len(self._matrix) * 2, 64)
+        matrix = np.zeros((capacity, self._dim), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        active = np.zeros(capacity, dtype=bool)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        active[:self._size] = self._active[:self._size]
+        self._matrix, self._ids, self._active = matrix, ids, active
+
+    def upsert(self, recipe_id: int, embedding: Optional[Sequence[float]], model: Optional[str],
+               terms: Dict[str, object]):
+        """Insert/replace one recipe vector and its filter terms (an empty or other-model embedding removes it)"""
+        with self._lock:
+            if not self._loaded:
+                return  # picked up by the next full load
+            vec = normalize_vector(embedding) if model == self._expected_model() else None
+            if vec is None:
+                self.remove(recipe_id)
+                return
+            if not self._dim:
+                self._reset(len(vec), 0)
+            if len(vec) != self._dim:
+                logger.warning("Recipe %s embedding dimension %s != index dimension %s; reloading", recipe_id, len(vec), self._dim)
+                self.invalidate()
+                return
+
+            # Rows are append-only (attribute entries cannot be rewritten in place):
+            # a replaced recipe gets a new row and the old one is masked out until the next load
+            self.remove(recipe_id)
+            rows = self._rows()
+            self._make_writable()
+            if self._size >= len(self._matrix):
+                self._grow(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._ids[row] = recipe_id
+            self._matrix[row] = vec
+            self._active[row] = True
+            self._attributes.set_row(row, terms)
+            rows[recipe_id] = row
+            self._active_count += 1
+
+    def remove(self, recipe_id: int):
+        with self._lock:
+            if not self._loaded:
+                return
+            row = self._rows().pop(recipe_id, None)
+            if row is not None:
+                # Inactive rows are masked at query time, so a mapped matrix stays untouched
+                self._active[row] = False
+                self._active_count -= 1
+
+    # --- querying --------------------------------------------------------------
+
+    def __len__(self):
+        return self._active_count
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @property
+    def source(self) -> Optional[str]:
+        return self._source
+
+    def export_arrays(self) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """(ids, vectors, attribute arrays) of the active rows, as written to a snapshot"""
+        self._ensure_fresh()
+        with self._lock:
+            rows = np.flatnonzero(self._active[:self._size])
+            return self._ids[rows], self._matrix[rows], self._attributes.subset(rows).to_arrays()
+
+    def search(self, query_embedding: Sequence[float], top_k: int = 5, **filters) -> List[Tuple[int, float]]:
+        """
+        Return [(recipe_id, cosine_similarity), ...] best first.
+        Filters (category, area, tags, ingredients, exclude_ingredients; see
+        RecipeAttributes.mask) are applied before ranking, so the result is the
+        true top-k of the matching recipes.
+        """
+        self._ensure_fresh()
+        query = normalize_vector(query_embedding)
+        if query is None or top_k <= 0:
+            return []
+
+        with self._lock:
+            if not self._active_count or len(query) != self._dim:
+                return []
+            ids = self._ids[:self._size]
+            active = self._active[:self._size]
+            candidates = self._attributes.mask(self._size, **filters)
+            rows = None
+            if self._ann is not None and self._backend() == 'ivf':
+                rows = np.concatenate([
+                    self._ann.probe(query, getattr(settings, 'RAG_IVF_NPROBE', 8)),
+                    np.arange(self._ann_size, self._size),
+                ])
+                keep = active[rows] if candidates is None else (active & candidates)[rows]
+                rows = rows[keep]
+                if candidates is not None and len(rows) < top_k:
+                    rows = None  # a narrow filter can starve the probed lists; rank the whole slice
+            if rows is None and candidates is None:
+                scores = self._matrix[:self._size] @ query
+                scores[~active] = -np.inf
+                k = min(top_k, self._active_count)
+            else:
+                # Rank only the matching slice
+                if rows is None:
+                    rows = np.flatnonzero(candidates & active)
+                scores = self._matrix[rows] @ query
+                k = min(top_k, len(rows))
+
+        if k <= 0:
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(int(ids[rows[i]]), float(scores[i])) for i in top]
+        return [(int(ids[row]), float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+
+recipe_index = RecipeVectorIndex()
@@ -12,9 +12,12 @@ from decouple import config
 import json
 from django.views.decorators.http import require_http_methods, require_POST, require_GET
 from .usda_client import USDAClient
+from .http_clients import MealDBClient, latency_report
 import requests
 from django.contrib import messages
-from .utils import aggregate_ingredients
+from .shopping_cache import shopping_list_cache
+from .nutrition_totals import daily_totals
+from .weekly_plan import MEAL_SLOTS, load_weekly_plan, rolling_week
 from django.urls import reverse
 import threading
 from django.views.decorators.csrf import csrf_exempt
@@ -191,7 +194,9 @@ def test_usda_api(request):
             return JsonResponse({
                 'status': 'success',
                 'message': 'API connection successful',
-                'sample_results': foods
+                'sample_results': foods,
+                'rate_limit': client.rate_limit_status(),
+                'latency': latency_report()
             })
     
     return JsonResponse({
@@ -331,9 +336,7 @@ def search_recipe(request):
     
     try:
         # Using the free API key '1' as mentioned in TheMealDB docs
-        url = f'https://www.themealdb.com/api/json/v1/1/search.php?s={query}'
-        response = requests.get(url)
-        data = response.json()
+        data = MealDBClient().search(query)
         
         if not data.get('meals'):
             return JsonResponse({
@@ -392,9 +395,7 @@ def get_recipe_details(request):
         }, status=400)
     
     try:
-        url = f'https://www.themealdb.com/api/json/v1/1/lookup.php?i={recipe_id}'
-        response = requests.get(url)
-        data = response.json()
+        data = MealDBClient().lookup(recipe_id)
         
         if not data.get('meals'):
             return JsonResponse({
@@ -457,10 +458,7 @@ def save_meal(request):
             return JsonResponse({'status': 'info', 'message': 'Meal already saved!'})
         
         # Fetch detailed meal data from MealDB
-        url = f'https://www.themealdb.com/api/json/v1/1/lookup.php?i={meal_id}'
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = MealDBClient().lookup(meal_id)
         
         if not data.get('meals'):
             return JsonResponse({'status': 'error', 'message': 'Meal not found'})
@@ -571,69 +569,15 @@ def my_saved_meals(request):
         meal_analysis = None
         prefs = None
 
-    # Generate next 7 days for meal planning
-    today = date.today()
-    week_days = []
-    week_dates = []
-    for i in range(7):
-        day = today + timedelta(days=i+1)  # Start from tomorrow
-        week_days.append({
-            'date': day,
-            'formatted_date': day.strftime('%Y-%m-%d')
-        })
-        week_dates.append(day)
-
-    # Fetch planned meals for the rolling window
-    planned_meals_qs = PlannedMeal.objects.filter(
-        user=user,
-        planned_date__in=week_dates
-    )
-    planned_meals = {}
-    for pm in planned_meals_qs:
-        date_key = pm.planned_date.strftime('%Y-%m-%d')
-        slot_key = pm.meal_type
-        if date_key not in planned_meals:
-            planned_meals[date_key] = {}
-        planned_meals[date_key][slot_key] = {
-            'meal_name': None,
-            'meal_thumb': None,
-            'id': pm.id,
-            'macros': None,
-            'recommended_servings': None,
-        }
-        # Try to get meal info from plan_json if available
-        if pm.plan_json and 'meals' in pm.plan_json and pm.plan_json['meals']:
-            meal = pm.plan_json['meals'][0]
-            planned_meals[date_key][slot_key]['meal_name'] = meal.get('meal_name')
-            planned_meals[date_key][slot_key]['meal_thumb'] = meal.get('meal_thumb')
-            planned_meals[date_key][slot_key]['saved_meal_id'] = meal.get('saved_meal_id')
-            planned_meals[date_key][slot_key]['portion_multiplier'] = meal.get('portion_multiplier', 1.0)
-            
-            # Get macros and servings from the saved meal if available
-            if 'saved_meal_id' in meal:
-                try:
-                    saved_meal = UserSavedMeal.objects.get(id=meal['saved_meal_id'])
-                    planned_meals[date_key][slot_key]['macros'] = saved_meal.macros_json
-                    planned_meals[date_key][slot_key]['recommended_servings'] = saved_meal.recommended_servings
-                    
-                    # Calculate adjusted nutrition based on portion multiplier
-                    portion_multiplier = meal.get('portion_multiplier', 1.0)
-                    if saved_meal.macros_json and saved_meal.recommended_servings:
-                        servings = float(saved_meal.recommended_servings)
-                        portion_multiplier = float(portion_multiplier)
-                        
-                        adjusted_nutrition = {
-                            'calories': (saved_meal.macros_json.get('calories', 0) / servings) * portion_multiplier,
-                            'protein': (saved_meal.macros_json.get('protein', 0) / servings) * portion_multiplier,
-                            'carbs': (saved_meal.macros_json.get('carbs', 0) / servings) * portion_multiplier,
-                            'fat': (saved_meal.macros_json.get('fat', 0) / servings) * portion_multiplier
-                        }
-                        planned_meals[date_key][slot_key]['adjusted_nutrition'] = adjusted_nutrition
-                        
-                except UserSavedMeal.DoesNotExist:
-                    pass
+    # Rolling 7-day window starting tomorrow; meals and their saved recipes load in two queries
+    plan = load_weekly_plan(user)
+    week_dates = [day.date for day in plan.days]
+    week_days = [{'date': day, 'formatted_date': day.strftime('%Y-%m-%d')} for day in week_dates]
+    planned_meals = plan.planned_meals()
+    nutrition_by_day = daily_totals(user, week_dates)
+    daily_nutrition = {day.strftime('%Y-%m-%d'): totals for day, totals in nutrition_by_day.items()}
 
-    meal_slots = ["breakfast", "lunch", "dinner", "snack"]
+    meal_slots = MEAL_SLOTS
 
     # Calculate nutrition adherence ratio for the 7-day plan
     adherence_ratio = 1.0
@@ -646,17 +590,8 @@ def my_saved_meals(request):
         total_calories = 0
         days_with_data = 0
         missing_days = 0
-        for day in week_days:
-            date_key = day['formatted_date']
-            day_meals = planned_meals.get(date_key, {})
-            day_total = 0
-            for slot in meal_slots:
-                meal = day_meals.get(slot)
-                if meal and meal.get('macros') and meal.get('recommended_servings'):
-                    macros = meal['macros']
-                    servings = meal['recommended_servings']
-                    portion = float(meal.get('portion_multiplier', 1.0))
-                    day_total += (macros.get('calories', 0) / servings) * portion
+        for day in week_dates:
+            day_total = nutrition_by_day[day].calories if day in nutrition_by_day else 0
             if day_total > 0:
                 total_calories += day_total
                 days_with_data += 1
@@ -695,6 +630,7 @@ def my_saved_meals(request):
         'total_count': total_count,
         'week_days': week_days,
         'planned_meals': planned_meals,
+        'daily_nutrition': daily_nutrition,
         'meal_slots': meal_slots,
         'meal_analysis': meal_analysis,
         'prefs': prefs,
@@ -792,40 +728,10 @@ def shopping_list(request):
     start_date = date.today() + timedelta(days=1)
     end_date = start_date + timedelta(days=6)
     
-    # Get all planned meals in the date range
-    planned_meals = PlannedMeal.objects.filter(
-        user=request.user,
-        planned_date__range=[start_date, end_date]
-    ).select_related('user')
-    
-    # Group by meal name and count occurrences
-    meal_counts = defaultdict(int)
-    meal_ingredients = defaultdict(list)
-    
-    for planned_meal in planned_meals:
-        # Get meal info from plan_json
-        if planned_meal.plan_json and 'meals' in planned_meal.plan_json:
-            for meal_data in planned_meal.plan_json['meals']:
-                if 'saved_meal_id' in meal_data:
-                    try:
-                        saved_meal = UserSavedMeal.objects.get(
-                            id=meal_data['saved_meal_id'],
-                            user=request.user
-                        )
-                        meal_counts[saved_meal.meal_name] += 1
-                        
-                        # Only add ingredients if we haven't seen this meal before
-                        if saved_meal.meal_name not in meal_ingredients:
-                            meal_ingredients[saved_meal.meal_name] = saved_meal.get_ingredients_list()
-                    except UserSavedMeal.DoesNotExist:
-                        continue
-    
-    # Convert defaultdicts to regular dicts for the aggregation function
-    meal_counts_dict = dict(meal_counts)
-    meal_ingredients_dict = dict(meal_ingredients)
-    
-    # Aggregate ingredients, taking into account meal counts
-    aggregated_ingredients = aggregate_ingredients(meal_ingredients_dict, meal_counts_dict)
+    # Meal counts, their ingredients and the aggregated list, rebuilt only after a plan change
+    meal_counts_dict, meal_ingredients_dict, aggregated_ingredients = shopping_list_cache.get(
+        request.user, start_date, end_date
+    )
     
     # Group ingredients by category for display
     categorized_ingredients = defaultdict(list)
@@ -834,6 +740,7 @@ def shopping_list(request):
             'name': ing_name,
             'amount': ing_data['amount'],
             'unit': ing_data['unit'],
+            'quantities': ing_data['quantities'],
             'original_names': ing_data['original_names'],
             'meals': ing_data['meals']
         })
@@ -865,8 +772,8 @@ def rag_recipe_search(request):
     dietary_filter = request.GET.get('dietary', '')
     use_vector_search = request.GET.get('vector', 'true').lower() == 'true'
     
-    # Get all bulk recipes
-    recipes = BulkRecipe.objects.all()
+    # Get all bulk recipes (embeddings are never rendered, so don't load them)
+    recipes = BulkRecipe.objects.defer('embedding', 'embedding_vector')
     
     # Apply filters
     if category:
@@ -877,27 +784,26 @@ def rag_recipe_search(request):
         # SQLite-compatible filtering - search in ingredients_text instead of JSON
         recipes = recipes.filter(ingredients_text__icontains=dietary_filter.lower())
     
-    # Search logic
+    # Search logic: BM25 over the in-memory text index, fused with vector similarity
+    # when enabled; both apply the filters themselves, so no table scan is needed
     if query:
-        if use_vector_search:
-            # Use vector similarity search
-            from .rag_utils import search_similar_recipes
-            similar_recipes = search_similar_recipes(query, top_k=20)
-            
-            # Convert to queryset for consistent filtering
-            recipe_ids = [r['id'] for r in similar_recipes]
-            recipes = recipes.filter(id__in=recipe_ids)
-            
-            # Add similarity scores to context
-            similarity_scores = {r['id']: r['similarity_score'] for r in similar_recipes}
-        else:
-            # Fallback to text search
-            recipes = recipes.filter(
-                models.Q(meal_name__icontains=query) |
-                models.Q(ingredients_text__icontains=query) |
-                models.Q(instructions__icontains=query)
-            )
-            similarity_scores = {}
+        from .rag_utils import hybrid_search_recipes
+        ranked = hybrid_search_recipes(
+            query,
+            top_k=50,
+            category=category or None,
+            area=area or None,
+            ingredient=dietary_filter or None,
+            use_vectors=use_vector_search,
+        )
+        
+        # Keep the ranking order
+        recipe_ids = [r['id'] for r in ranked]
+        recipes_by_id = BulkRecipe.objects.defer('embedding', 'embedding_vector').in_bulk(recipe_ids)
+        recipes = [recipes_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes_by_id]
+        
+        # Add similarity scores to context
+        similarity_scores = {r['id']: r['similarity_score'] for r in ranked if r['similarity_score'] is not None}
     else:
         similarity_scores = {}
     
@@ -909,7 +815,7 @@ def rag_recipe_search(request):
     areas = BulkRecipe.objects.values_list('area', flat=True).distinct()
     
     # Count recipes with embeddings
-    recipes_with_embeddings = BulkRecipe.objects.filter(embedding__isnull=False).exclude(embedding={}).count()
+    recipes_with_embeddings = BulkRecipe.with_embeddings().count()
     total_recipes = BulkRecipe.objects.count()
     
     context = {
@@ -950,6 +856,7 @@ def rag_recipe_recommendations(request):
         }
         
         # Generate RAG recommendations
+        from .embedding_providers import embedding_model_name
         from .rag_utils import generate_rag_recipe_recommendations
         recommendations = generate_rag_recipe_recommendations(
             user_preferences=user_preferences,
@@ -961,7 +868,7 @@ def rag_recipe_recommendations(request):
             'user_preferences': user_preferences,
             'rag_pipeline_info': {
                 'database': 'BulkRecipe with 302+ recipes',
-                'embedding': 'OpenAI text-embedding-ada-002',
+                'embedding': embedding_model_name(),
                 'retrieval': 'Cosine similarity search',
                 'augmentation': 'User preferences filtering',
                 'generation': 'Personalized recipe recommendations'
@@ -1097,68 +1004,32 @@ def create_meal_plan_version(request):
         
         user = request.user
         
-        # Get current meal plan state (same logic as my_saved_meals view)
-        today = date.today()
-        week_dates = []
-        for i in range(7):
-            day = today + timedelta(days=i+1)
-            week_dates.append(day)
-        
-        # Fetch planned meals for the rolling window
-        planned_meals_qs = PlannedMeal.objects.filter(
-            user=user,
-            planned_date__in=week_dates
-        )
+        # Get current meal plan state (same loader as the my_saved_meals view)
+        plan = load_weekly_plan(user)
         
         meal_plan_snapshot = {}
-        for pm in planned_meals_qs:
-            date_key = pm.planned_date.strftime('%Y-%m-%d')
-            slot_key = pm.meal_type
-            if date_key not in meal_plan_snapshot:
-                meal_plan_snapshot[date_key] = {}
-            meal_plan_snapshot[date_key][slot_key] = {
-                'id': pm.id,
-                'plan_json': pm.plan_json,
-                'notes': pm.notes,
-                'total_calories': pm.total_calories,
-                'total_protein': pm.total_protein,
-                'total_carbs': pm.total_carbs,
-                'total_fat': pm.total_fat,
-            }
-        
-        # Calculate daily totals snapshot
         daily_totals_snapshot = {}
-        for day_date in week_dates:
-            date_key = day_date.strftime('%Y-%m-%d')
-            day_meals = meal_plan_snapshot.get(date_key, {})
+        for day in plan.days:
+            for slot_key, slot in day.slots.items():
+                pm = slot.planned_meal
+                meal_plan_snapshot.setdefault(day.date_key, {})[slot_key] = {
+                    'id': pm.id,
+                    'plan_json': pm.plan_json,
+                    'notes': pm.notes,
+                    'total_calories': pm.total_calories,
+                    'total_protein': pm.total_protein,
+                    'total_carbs': pm.total_carbs,
+                    'total_fat': pm.total_fat,
+                }
             
-            # Calculate totals for this day
-            day_totals = {
-                'calories': 0,
-                'protein': 0,
-                'carbs': 0,
-                'fats': 0
+            # Daily totals for the planned portions
+            totals = day.totals
+            daily_totals_snapshot[day.date_key] = {
+                'calories': totals['calories'],
+                'protein': totals['protein'],
+                'carbs': totals['carbs'],
+                'fats': totals['fat']
             }
-            
-            for slot, meal_data in day_meals.items():
-                if meal_data.get('plan_json') and 'meals' in meal_data['plan_json']:
-                    for meal in meal_data['plan_json']['meals']:
-                        if 'saved_meal_id' in meal:
-                            try:
-                                saved_meal = UserSavedMeal.objects.get(
-                                    id=meal['saved_meal_id'],
-                                    user=user
-                                )
-                                if saved_meal.macros_json and saved_meal.recommended_servings:
-                                    servings = saved_meal.recommended_servings
-                                    day_totals['calories'] += saved_meal.macros_json.get('calories', 0) / servings
-                                    day_totals['protein'] += saved_meal.macros_json.get('protein', 0) / servings
-                                    day_totals['carbs'] += saved_meal.macros_json.get('carbs', 0) / servings
-                                    day_totals['fats'] += saved_meal.macros_json.get('fat', 0) / servings
-                            except UserSavedMeal.DoesNotExist:
-                                continue
-            
-            daily_totals_snapshot[date_key] = day_totals
         
         # Create the version
         version = MealPlanVersion.objects.create(
@@ -1234,28 +1105,31 @@ def restore_meal_plan_version(request, version_id):
             day = today + timedelta(days=i+1)
             week_dates.append(day)
         
-        PlannedMeal.objects.filter(
-            user=request.user,
-            planned_date__in=week_dates
-        ).delete()
-        
-        # Restore meals from the version
-        restored_count = 0
-        for date_key, day_meals in version.meal_plan_snapshot.items():
-            for slot_key, meal_data in day_meals.items():
-                if meal_data.get('plan_json'):
-                    planned_meal = PlannedMeal.objects.create(
-                        user=request.user,
-                        planned_date=datetime.strptime(date_key, '%Y-%m-%d').date(),
-                        meal_type=slot_key,
-                        plan_json=meal_data['plan_json'],
-                        notes=meal_data.get('notes', ''),
-                        total_calories=meal_data.get('total_calories'),
-                        total_protein=meal_data.get('total_protein'),
-                        total_carbs=meal_data.get('total_carbs'),
-                        total_fat=meal_data.get('total_fat')
-                    )
-                    restored_count += 1
+        # One transaction, so the plan never shows half-restored and the analytics
+        # snapshot is rebuilt once at commit instead of once per row
+        with transaction.atomic():
+            PlannedMeal.objects.filter(
+                user=request.user,
+                planned_date__in=week_dates
+            ).delete()
+            
+            # Restore meals from the version
+            restored_count = 0
+            for date_key, day_meals in version.meal_plan_snapshot.items():
+                for slot_key, meal_data in day_meals.items():
+                    if meal_data.get('plan_json'):
+                        planned_meal = PlannedMeal.objects.create(
+                            user=request.user,
+                            planned_date=datetime.strptime(date_key, '%Y-%m-%d').date(),
+                            meal_type=slot_key,
+                            plan_json=meal_data['plan_json'],
+                            notes=meal_data.get('notes', ''),
+                            total_calories=meal_data.get('total_calories'),
+                            total_protein=meal_data.get('total_protein'),
+                            total_carbs=meal_data.get('total_carbs'),
+                            total_fat=meal_data.get('total_fat')
+                        )
+                        restored_count += 1
         
         return JsonResponse({
             'status': 'success',
@@ -1675,69 +1549,18 @@ def regenerate_wellness_score(request):
         meal_analysis = None
         prefs = None
 
-    today = date.today()
-    week_days = []
-    week_dates = []
-    for i in range(7):
-        day = today + timedelta(days=i+1)
-        week_days.append({
-            'date': day,
-            'formatted_date': day.strftime('%Y-%m-%d')
-        })
-        week_dates.append(day)
-
-    planned_meals_qs = PlannedMeal.objects.filter(
-        user=user,
-        planned_date__in=week_dates
-    )
-    planned_meals = {}
-    for pm in planned_meals_qs:
-        date_key = pm.planned_date.strftime('%Y-%m-%d')
-        slot_key = pm.meal_type
-        if date_key not in planned_meals:
-            planned_meals[date_key] = {}
-        planned_meals[date_key][slot_key] = {
-            'meal_name': None,
-            'meal_thumb': None,
-            'id': pm.id,
-            'macros': None,
-            'recommended_servings': None,
-            'portion_multiplier': 1.0,
-        }
-        if pm.plan_json and 'meals' in pm.plan_json and pm.plan_json['meals']:
-            meal = pm.plan_json['meals'][0]
-            planned_meals[date_key][slot_key]['meal_name'] = meal.get('meal_name')
-            planned_meals[date_key][slot_key]['meal_thumb'] = meal.get('meal_thumb')
-            planned_meals[date_key][slot_key]['saved_meal_id'] = meal.get('saved_meal_id')
-            planned_meals[date_key][slot_key]['portion_multiplier'] = meal.get('portion_multiplier', 1.0)
-            if 'saved_meal_id' in meal:
-                try:
-                    saved_meal = UserSavedMeal.objects.get(id=meal['saved_meal_id'])
-                    planned_meals[date_key][slot_key]['macros'] = saved_meal.macros_json
-                    planned_meals[date_key][slot_key]['recommended_servings'] = saved_meal.recommended_servings
-                except UserSavedMeal.DoesNotExist:
-                    pass
-
-    meal_slots = ["breakfast", "lunch", "dinner", "snack"]
+    week_dates = rolling_week()
+    nutrition_by_day = daily_totals(user, week_dates)
 
     adherence_ratio = 1.0
-    if meal_analysis and week_days:
+    if meal_analysis and week_dates:
         daily_target = meal_analysis.get('daily_calories', 2000)
         week_target = daily_target * 7
         total_calories = 0
         days_with_data = 0
         missing_days = 0
-        for day in week_days:
-            date_key = day['formatted_date']
-            day_meals = planned_meals.get(date_key, {})
-            day_total = 0
-            for slot in meal_slots:
-                meal = day_meals.get(slot)
-                if meal and meal.get('macros') and meal.get('recommended_servings'):
-                    macros = meal['macros']
-                    servings = meal['recommended_servings']
-                    portion = float(meal.get('portion_multiplier', 1.0))
-                    day_total += (macros.get('calories', 0) / servings) * portion
+        for day in week_dates:
+            day_total = nutrition_by_day[day].calories if day in nutrition_by_day else 0
             if day_total > 0:
                 total_calories += day_total
                 days_with_data += 1
@@ -1773,37 +1596,17 @@ def adjust_shopping_list(request):
     # Use the same logic as shopping_list to generate the combined shopping list
     start_date = date.today() + timedelta(days=1)
     end_date = start_date + timedelta(days=6)
-    planned_meals = PlannedMeal.objects.filter(
-        user=user,
-        planned_date__range=[start_date, end_date]
-    ).select_related('user')
-    meal_counts = defaultdict(int)
-    meal_ingredients = defaultdict(list)
-    for planned_meal in planned_meals:
-        if planned_meal.plan_json and 'meals' in planned_meal.plan_json:
-            for meal_data in planned_meal.plan_json['meals']:
-                if 'saved_meal_id' in meal_data:
-                    try:
-                        saved_meal = UserSavedMeal.objects.get(
-                            id=meal_data['saved_meal_id'],
-                            user=user
-                        )
-                        meal_counts[saved_meal.meal_name] += 1
-                        if saved_meal.meal_name not in meal_ingredients:
-                            meal_ingredients[saved_meal.meal_name] = saved_meal.get_ingredients_list()
-                    except UserSavedMeal.DoesNotExist:
-                        continue
-    meal_counts_dict = dict(meal_counts)
-    meal_ingredients_dict = dict(meal_ingredients)
-    aggregated_ingredients = aggregate_ingredients(meal_ingredients_dict, meal_counts_dict)
-    # Flatten for editable table
+    aggregated_ingredients = shopping_list_cache.get(user, start_date, end_date).items
+    # Flatten for editable table, one row per unit dimension; unquantified lines ('to taste')
+    # get quantity 1 as before, since the form only keeps rows with a quantity
     shopping_list = [
         {
             'name': ing_name,
-            'quantity': ing_data['amount'],
-            'unit': ing_data['unit']
+            'quantity': quantity['amount'] or 1,
+            'unit': quantity['unit']
         }
         for ing_name, ing_data in aggregated_ingredients.items()
+        for quantity in ing_data['quantities']
     ]
     versions = ShoppingListVersion.objects.filter(user=user).order_by('-created_at')
     return render(request, 'diet/adjust_shopping_list.html', {
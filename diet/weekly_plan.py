@@ -0,0 +1,227 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .ingredients import parsed_ingredients_for
+from .models import PlannedMeal, UserSavedMeal
+
+MEAL_SLOTS = ['breakfast', 'lunch', 'dinner', 'snack']
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+
+def rolling_week(start: Optional[date] = None) -> List[date]:
+    """The 7 planning days, starting tomorrow unless a start date is given"""
+    start = start or date.today() + timedelta(days=1)
+    return [start + timedelta(days=i) for i in range(7)]
+
+
+def _meal_id(value) -> Optional[int]:
+    """saved_meal_id as stored in plan_json (int, or a string from the add-to-plan request)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class PlanEntry:
+    """One meal in a plan slot, joined with the user's saved meal"""
+    saved_meal_id: Optional[int]
+    meal_name: Optional[str]
+    meal_thumb: Optional[str]
+    portion_multiplier: float
+    saved_meal: Optional[UserSavedMeal] = None
+
+    @property
+    def macros(self) -> Optional[dict]:
+        return self.saved_meal.macros_json if self.saved_meal else None
+
+    @property
+    def recommended_servings(self) -> Optional[int]:
+        return self.saved_meal.recommended_servings if self.saved_meal else None
+
+    @property
+    def adjusted_nutrition(self) -> Optional[Dict[str, float]]:
+        """Nutrition for the planned portion: (recipe macros / servings) * portion multiplier"""
+        macros, servings = self.macros, self.recommended_servings
+        if not macros or not servings or float(servings) <= 0:
+            return None
+        scale = self.portion_multiplier / float(servings)
+        return {nutrient: float(macros.get(nutrient) or 0) * scale for nutrient in NUTRIENTS}
+
+
+@dataclass
+class PlanSlot:
+    """A PlannedMeal row; the first meal in its plan_json is the one shown and counted"""
+    planned_meal: PlannedMeal
+    entries: List[PlanEntry] = field(default_factory=list)
+
+    @property
+    def meal_type(self) -> str:
+        return self.planned_meal.meal_type
+
+    @property
+    def meal(self) -> Optional[PlanEntry]:
+        return self.entries[0] if self.entries else None
+
+    @property
+    def adjusted_nutrition(self) -> Optional[Dict[str, float]]:
+        return self.meal.adjusted_nutrition if self.meal else None
+
+    def as_dict(self) -> dict:
+        """The per-slot dict the templates and analytics snapshots use"""
+        meal = self.meal
+        data = {
+            'meal_name': meal.meal_name if meal else None,
+            'meal_thumb': meal.meal_thumb if meal else None,
+            'id': self.planned_meal.id,
+            'macros': meal.macros if meal else None,
+            'recommended_servings': meal.recommended_servings if meal else None,
+            'portion_multiplier': meal.portion_multiplier if meal else 1.0,
+            'adjusted_nutrition': self.adjusted_nutrition,
+        }
+        if meal:
+            data['saved_meal_id'] = meal.saved_meal_id
+        return data
+
+
+@dataclass
+class PlanDay:
+    date: date
+    slots: Dict[str, PlanSlot] = field(default_factory=dict)
+
+    @property
+    def date_key(self) -> str:
+        return self.date.strftime('%Y-%m-%d')
+
+    @property
+    def totals(self) -> Dict[str, float]:
+        """Sum of the slots' adjusted nutrition"""
+        totals = dict.fromkeys(NUTRIENTS, 0)
+        for slot in self.slots.values():
+            nutrition = slot.adjusted_nutrition
+            if nutrition:
+                for nutrient in NUTRIENTS:
+                    totals[nutrient] += nutrition[nutrient]
+        return totals
+
+
+@dataclass
+class WeeklyPlan:
+    days: List[PlanDay]
+
+    def planned_meals(self) -> Dict[str, Dict[str, dict]]:
+        """{date_key: {meal_type: slot dict}} for days with planned meals"""
+        return {
+            day.date_key: {meal_type: slot.as_dict() for meal_type, slot in day.slots.items()}
+            for day in self.days if day.slots
+        }
+
+    def daily_totals(self) -> Dict[str, dict]:
+        """{date_key: totals + per-meal calories} for days with planned meals"""
+        daily_totals = {}
+        for day in self.days:
+            if not day.slots:
+                continue
+            nutrition = {meal_type: slot.adjusted_nutrition for meal_type, slot in day.slots.items()}
+            daily_totals[day.date_key] = {
+                **day.totals,
+                'meals': [
+                    {
+                        'meal_type': meal_type,
+                        'meal_name': slot.meal.meal_name if slot.meal else None,
+                        'calories': nutrition[meal_type]['calories'] if nutrition[meal_type] else 0,
+                    }
+                    for meal_type, slot in day.slots.items()
+                ],
+                'date': day.date.isoformat(),
+            }
+        return daily_totals
+
+    @property
+    def slot_count(self) -> int:
+        """Number of PlannedMeal rows in the window"""
+        return sum(len(day.slots) for day in self.days)
+
+    @property
+    def total_calories(self) -> float:
+        return sum(day.totals['calories'] for day in self.days)
+
+
+def referenced_meal_ids(planned_meals: Iterable[PlannedMeal]) -> Set[int]:
+    """Every saved_meal_id in the planned meals' plan_json"""
+    meal_ids = set()
+    for pm in planned_meals:
+        for meal in (pm.plan_json or {}).get('meals') or []:
+            meal_id = _meal_id(meal.get('saved_meal_id'))
+            if meal_id is not None:
+                meal_ids.add(meal_id)
+    return meal_ids
+
+
+def build_slot(planned_meal: PlannedMeal, saved_meals: Dict[int, UserSavedMeal]) -> PlanSlot:
+    """Join a PlannedMeal's plan_json entries with already-fetched saved meals"""
+    slot = PlanSlot(planned_meal)
+    for meal in (planned_meal.plan_json or {}).get('meals') or []:
+        slot.entries.append(PlanEntry(
+            saved_meal_id=meal.get('saved_meal_id'),
+            meal_name=meal.get('meal_name'),
+            meal_thumb=meal.get('meal_thumb'),
+            portion_multiplier=float(meal.get('portion_multiplier', 1.0)),
+            saved_meal=saved_meals.get(_meal_id(meal.get('saved_meal_id'))),
+        ))
+    return slot
+
+
+def fetch_saved_meals(user, meal_ids: Set[int]) -> Dict[int, UserSavedMeal]:
+    """The user's saved meals with the given ids, in one query (none when there are no ids)"""
+    return UserSavedMeal.objects.filter(user=user).in_bulk(meal_ids) if meal_ids else {}
+
+
+def load_weekly_plan(user, dates: Optional[Iterable[date]] = None) -> WeeklyPlan:
+    """
+    The user's plan for the given days (default: rolling_week()) in two queries:
+    the PlannedMeal rows, then every saved meal they reference in one in_bulk,
+    restricted to the user's own saved meals.
+    """
+    dates = list(dates) if dates is not None else rolling_week()
+    planned_meals = list(PlannedMeal.objects.filter(user=user, planned_date__in=dates))
+    saved_meals = fetch_saved_meals(user, referenced_meal_ids(planned_meals))
+
+    days = {day: PlanDay(day) for day in dates}
+    for pm in planned_meals:
+        days[pm.planned_date].slots[pm.meal_type] = build_slot(pm, saved_meals)
+    return WeeklyPlan([days[day] for day in dates])
+
+
+def planned_meal_ingredients(user, start_date: date, end_date: date) -> Tuple[Dict[str, int], Dict[str, List[dict]]]:
+    """
+    ({meal name: times planned}, {meal name: parsed ingredients}) for the saved meals
+    planned in a date range, in three queries however many meals are planned: the plan
+    rows, the saved meal names and their stored ingredients.
+    """
+    planned_ids = []
+    for plan_json in PlannedMeal.objects.filter(
+        user=user, planned_date__range=[start_date, end_date]
+    ).values_list('plan_json', flat=True):
+        for meal in (plan_json or {}).get('meals') or []:
+            meal_id = _meal_id(meal.get('saved_meal_id'))
+            if meal_id is not None:
+                planned_ids.append(meal_id)
+    if not planned_ids:
+        return {}, {}
+
+    saved_meals = UserSavedMeal.objects.filter(user=user, id__in=set(planned_ids))
+    names = dict(saved_meals.values_list('id', 'meal_name'))
+    ingredients = parsed_ingredients_for(saved_meals)
+
+    meal_counts: Dict[str, int] = {}
+    meal_ingredients: Dict[str, List[dict]] = {}
+    for meal_id in planned_ids:
+        name = names.get(meal_id)
+        if name is None:
+            continue
+        meal_counts[name] = meal_counts.get(name, 0) + 1
+        # a name planned from several saved meals keeps the first one's ingredients
+        meal_ingredients.setdefault(name, ingredients[meal_id])
+    return meal_counts, meal_ingredients
@@ -1,6 +1,11 @@
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 
+from . import ai_cache
+
 
 from dotenv import load_dotenv
 
@@ -8,7 +13,27 @@ load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))  # after dotenv load
 
-def classify_input(prompt_template: str, user_input: str) -> str:
+logger = logging.getLogger(__name__)
+
+# the calls are network-bound and the client is thread-safe, so independent prompts share a small pool
+MAX_PARALLEL_CALLS = 4
+_executor = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_CALLS, thread_name_prefix="health-ai")
+    return _executor
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def request_classification(prompt_template: str, user_input: str) -> str:
+    """One uncached classification call to OpenAI"""
     response = client.chat.completions.create(
         model="gpt-3.5-turbo",  # way cheaper than 4.1 or o3
         messages=[
@@ -21,6 +46,47 @@ def classify_input(prompt_template: str, user_input: str) -> str:
 
     return response.choices[0].message.content.strip()
 
+def classify_input(prompt_template: str, user_input: str) -> str:
+    """Label for the input, from the classification cache when the same text was classified before"""
+    return classify_inputs({"label": (prompt_template, user_input)})["label"]
+
+def classify_inputs(prompts: dict) -> dict:
+    """
+    Run several independent classifications at once: {name: (prompt_template, user_input)} -> {name: label}.
+    Cached labels are read in one query; the misses go to OpenAI in parallel, so wall time is
+    roughly the slowest single call. If any call fails the first error is raised once all of
+    them have finished (labels that did come back are still cached).
+    """
+    start = time.perf_counter()
+    keys = {name: ai_cache.cache_key(*prompt) for name, prompt in prompts.items()}
+    cached = ai_cache.lookup(keys.values())
+    labels = {name: cached[key] for name, key in keys.items() if key in cached}
+
+    # the pool threads only talk to OpenAI; cache reads and writes stay on this thread's DB connection
+    futures = {
+        name: _pool().submit(_timed, request_classification, template, user_input)
+        for name, (template, user_input) in prompts.items() if name not in labels
+    }
+    durations, error, fresh = {}, None, []
+    for name, future in futures.items():
+        try:
+            labels[name], durations[name] = future.result()
+            fresh.append((*prompts[name], labels[name]))
+        except Exception as e:
+            error = error or e
+    ai_cache.store(fresh)
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Classified %s in %.2fs: %s cached, %s requested (slowest call %.2fs, %.2fs if run one after another)",
+        ", ".join(prompts), elapsed, len(prompts) - len(futures), len(futures),
+        max(durations.values(), default=0.0), sum(durations.values()),
+    )
+    if error is not None:
+        raise error
+    return labels
+
+
 def generate_insight(profile_json: dict) -> str:
     system_prompt = "You are a personal health assistant. Based on the user's structured health profile, provide 1 personalized recommendation that refers to the user’s goal and condition."
     user_prompt = f"User data:\n{profile_json}\n\nRespond with one paragraph recommendation."
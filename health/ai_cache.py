@@ -0,0 +1,86 @@
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, Tuple
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ClassificationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# classify_input runs at temperature 0, so the label is a function of the prompt and the
+# text: identical (after normalizing) text under the same prompt template is answered
+# from ClassificationCacheEntry instead of another OpenAI round-trip.
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_input(user_input: str) -> str:
+    """Case, surrounding punctuation and runs of whitespace do not change the label"""
+    return ' '.join((user_input or '').casefold().split()).strip(' .!?,;')
+
+
+def template_hash(prompt_template: str) -> str:
+    return _sha256(prompt_template)
+
+
+def cache_key(prompt_template: str, user_input: str) -> str:
+    return _sha256(f'{template_hash(prompt_template)}:{normalize_input(user_input)}')
+
+
+def lookup(keys: Iterable[str]) -> Dict[str, str]:
+    """{key: label} for the unexpired entries among keys, in one query; marks them used"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    now = timezone.now()
+    entries = ClassificationCacheEntry.objects.filter(key__in=keys, expires_at__gt=now).values_list('id', 'key', 'label')
+    found = {key: label for _, key, label in entries}
+    if found:
+        ClassificationCacheEntry.objects.filter(key__in=found).update(last_used_at=now, hits=F('hits') + 1)
+    return found
+
+
+def store(results: Iterable[Tuple[str, str, str]]):
+    """Save (prompt_template, user_input, label) results, then evict"""
+    now = timezone.now()
+    expires_at = now + timedelta(days=getattr(settings, 'HEALTH_AI_CACHE_TTL_DAYS', 30))
+    stored = 0
+    for prompt_template, user_input, label in results:
+        ClassificationCacheEntry.objects.update_or_create(
+            key=cache_key(prompt_template, user_input),
+            defaults={
+                'template_hash': template_hash(prompt_template),
+                'normalized_input': normalize_input(user_input),
+                'label': label,
+                'last_used_at': now,
+                'expires_at': expires_at,
+            },
+        )
+        stored += 1
+    if stored:
+        evict()
+
+
+def evict() -> int:
+    """Drop expired entries, then the least recently used beyond HEALTH_AI_CACHE_MAX_ENTRIES; returns rows deleted"""
+    deleted, _ = ClassificationCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+    max_entries = getattr(settings, 'HEALTH_AI_CACHE_MAX_ENTRIES', 10000)
+    overflow = ClassificationCacheEntry.objects.count() - max_entries
+    if overflow > 0:
+        oldest = ClassificationCacheEntry.objects.order_by('last_used_at', 'id').values_list('id', flat=True)[:overflow]
+        more, _ = ClassificationCacheEntry.objects.filter(id__in=list(oldest)).delete()
+        deleted += more
+    if deleted:
+        logger.info("Evicted %s classification cache entries", deleted)
+    return deleted
+
+
+def assessment_input_hash(prompts: Dict[str, Tuple[str, str]]) -> str:
+    """Fingerprint of the {name: (prompt_template, user_input)} a profile assessment classifies"""
+    return _sha256('|'.join(f'{name}:{cache_key(*prompts[name])}' for name in sorted(prompts)))
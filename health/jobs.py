@@ -0,0 +1,141 @@
+import logging
+import random
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import AIJob
+
+logger = logging.getLogger(__name__)
+
+# DB-backed queue for the OpenAI calls the health signals used to make inside post_save.
+# Signals enqueue() a job in the same transaction as the save (so it rolls back with it);
+# manage.py run_ai_jobs claims due jobs, runs the handler registered for their kind and
+# retries failures with exponential backoff until max_attempts.
+
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 15 * 60
+STALE_LOCK = timedelta(minutes=10)  # a running job older than this lost its worker
+
+_handlers: Dict[str, Callable[[AIJob], None]] = {}
+
+
+class RetryJob(Exception):
+    """Raised by a handler that wants another attempt without logging a traceback"""
+
+
+def handler(kind: str):
+    """Register the function that runs jobs of a kind"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def revision_key(kind: str, instance) -> str:
+    """Idempotency key for one saved revision of a model instance"""
+    return f'{kind}:{instance.pk}:{instance.updated_at.isoformat()}'
+
+
+def enqueue(user_id: int, kind: str, key: str, payload: Optional[dict] = None) -> AIJob:
+    """
+    Queue a job unless one with the same key exists already; returns the job.
+    Older jobs of the same kind for the user that have not started are superseded,
+    so a burst of saves only pays for the latest revision.
+    """
+    job, created = AIJob.objects.get_or_create(
+        idempotency_key=key,
+        defaults={'user_id': user_id, 'kind': kind, 'payload': payload or {}, 'run_after': timezone.now()},
+    )
+    if created:
+        AIJob.objects.filter(user_id=user_id, kind=kind, status=AIJob.PENDING).exclude(pk=job.pk).update(
+            status=AIJob.SUPERSEDED
+        )
+        if getattr(settings, 'HEALTH_AI_JOBS_EAGER', False):
+            transaction.on_commit(lambda: run_job(job))
+    return job
+
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before retry number `attempts`: doubling from RETRY_BASE_SECONDS, capped, with jitter"""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def _claim(job: AIJob) -> bool:
+    """Mark a job running for this worker; False if another worker got there first"""
+    now = timezone.now()
+    claimed = AIJob.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+        status=AIJob.RUNNING, locked_at=now, attempts=F('attempts') + 1
+    )
+    if claimed:
+        job.status, job.locked_at, job.attempts = AIJob.RUNNING, now, job.attempts + 1
+    return bool(claimed)
+
+
+def _finish(job: AIJob, status: str, error: str = '', run_after=None):
+    job.status, job.last_error = status, error
+    fields = {'status': status, 'last_error': error, 'locked_at': None, 'updated_at': timezone.now()}
+    if run_after is not None:
+        job.run_after = fields['run_after'] = run_after
+    AIJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_job(job: AIJob) -> bool:
+    """Claim and run one job; returns False if it was not claimable"""
+    if not _claim(job):
+        return False
+    if job.attempts > job.max_attempts:
+        # reclaimed after its worker died on the last attempt
+        _finish(job, AIJob.FAILED, job.last_error or 'Worker stopped during the last attempt')
+        return True
+    try:
+        _handlers[job.kind](job)
+    except Exception as e:
+        if not isinstance(e, RetryJob):
+            logger.exception("AI job %s (%s) failed on attempt %s", job.pk, job.kind, job.attempts)
+        if job.attempts >= job.max_attempts:
+            _finish(job, AIJob.FAILED, str(e))
+        else:
+            _finish(job, AIJob.PENDING, str(e), run_after=timezone.now() + backoff(job.attempts))
+    else:
+        _finish(job, AIJob.DONE)
+    return True
+
+
+def due_jobs(limit: int = 10):
+    """Jobs ready to run, oldest first: pending ones past their backoff and abandoned running ones"""
+    now = timezone.now()
+    return list(
+        AIJob.objects.filter(
+            Q(status=AIJob.PENDING, run_after__lte=now) | Q(status=AIJob.RUNNING, locked_at__lt=now - STALE_LOCK)
+        ).order_by('run_after')[:limit]
+    )
+
+
+def process_jobs(limit: int = 10) -> int:
+    """Run up to limit due jobs; returns how many this worker ran"""
+    return sum(run_job(job) for job in due_jobs(limit))
+
+
+def job_status(user) -> Dict[str, dict]:
+    """The latest job of each kind for a user, for the profile page to poll"""
+    status = {}
+    jobs = AIJob.objects.filter(user=user).exclude(status=AIJob.SUPERSEDED).order_by('-created_at', '-id')
+    for job in jobs.only('kind', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at')[:10]:
+        status.setdefault(job.kind, {
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': job.max_attempts,
+            'retry_at': job.run_after.isoformat() if job.status == AIJob.PENDING and job.attempts else None,
+            'updated_at': job.updated_at.isoformat(),
+        })
+    return status
+
+
+def has_unfinished(status: Dict[str, dict]) -> bool:
+    return any(job['status'] in (AIJob.PENDING, AIJob.RUNNING) for job in status.values())
@@ -0,0 +1 @@
+# Management commands for health app 
\ No newline at end of file
@@ -0,0 +1 @@
+# Health management commands 
\ No newline at end of file
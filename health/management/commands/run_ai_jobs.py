@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from health.jobs import process_jobs
+from health.models import AIJob
+
+
+class Command(BaseCommand):
+    help = 'Run the queued health AI jobs (profile assessments and goal plans)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Jobs claimed per pass (default: 10)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling for new jobs'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when there is nothing to do (with --loop, default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(f'{AIJob.objects.filter(status=AIJob.PENDING).count()} jobs pending')
+
+        total = 0
+        while True:
+            ran = process_jobs(batch_size)
+            total += ran
+            if ran:
+                self.stdout.write(f'  ...{total} jobs run')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        failed = AIJob.objects.filter(status=AIJob.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f'Done. Ran {total} jobs.'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} jobs have failed permanently.'))
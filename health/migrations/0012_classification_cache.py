@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0011_aijob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthprofile',
+            name='assessment_input_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ClassificationCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('template_hash', models.CharField(max_length=64)),
+                ('normalized_input', models.TextField()),
+                ('label', models.CharField(max_length=100)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='health_clas_expires_53166b_idx'), models.Index(fields=['last_used_at'], name='health_clas_last_us_004007_idx')],
+            },
+        ),
+    ]
@@ -15,6 +15,7 @@ class HealthProfile(models.Model):
     
     # raw JSON blob (for SQLJSON or prompting too I guess)
     assessment_data = models.JSONField(blank=True, null=True)  # later connect with healt signals.py
+    assessment_input_hash = models.CharField(max_length=64, blank=True)  # text + prompts assessment_data was classified from
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -141,3 +142,81 @@ class DailyActivitySnapshot(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - {self.lifestyle_category} ({self.weekly_activity_target}) on {self.date}"
+
+
+class AIJob(models.Model):
+    """
+    Queued OpenAI work from the health signals (see health.jobs), run by manage.py run_ai_jobs
+    One row per idempotency key, so re-sending the same revision never queues it twice
+    """
+    PROFILE_ASSESSMENT = 'profile_assessment'
+    GOAL_PLAN = 'goal_plan'
+    KIND_CHOICES = [
+        (PROFILE_ASSESSMENT, 'Profile assessment'),
+        (GOAL_PLAN, 'Goal plan'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    SUPERSEDED = 'superseded'  # a newer revision was queued before this one ran
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (SUPERSEDED, 'Superseded'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    idempotency_key = models.CharField(max_length=150, unique=True)  # kind:object pk:revision
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()  # not picked up before this (retry backoff)
+    locked_at = models.DateTimeField(blank=True, null=True)  # when a worker claimed it
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['user', 'kind', 'created_at']),
+        ]
+
+    @property
+    def is_last_attempt(self):
+        return self.attempts >= self.max_attempts
+
+    def __str__(self):
+        return f"{self.kind} for {self.user_id} ({self.status}, attempt {self.attempts})"
+
+
+class ClassificationCacheEntry(models.Model):
+    """
+    A classify_input label keyed by (prompt template hash, normalized input), see health.ai_cache
+    Entries expire after HEALTH_AI_CACHE_TTL_DAYS; the least recently used go first past HEALTH_AI_CACHE_MAX_ENTRIES
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of template hash + normalized input
+    template_hash = models.CharField(max_length=64)
+    normalized_input = models.TextField()
+    label = models.CharField(max_length=100)
+    hits = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.normalized_input[:40]} -> {self.label}"
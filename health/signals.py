@@ -1,10 +1,14 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.db import transaction
-from .models import HealthProfile, WellnessScoreHistory, HistoricalMetric, HealthInsight, GoalPlan
-from . import ai
+from .models import AIJob, HealthProfile, WellnessScoreHistory, HistoricalMetric, HealthInsight, GoalPlan
+from . import ai, ai_cache, jobs
 from django.utils import timezone
 from datetime import date
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 LIFESTYLE_PROMPT = """
 You are a health assistant. Based on the user's free-text description, classify their lifestyle into ONE of the following:
@@ -79,59 +83,95 @@ def recalc_wellness_score(sender, instance, **kwargs):
         return
     instance._already_handled = True
 
-    try:
-        parsed = {
-            "lifestyle_category": ai.classify_input(LIFESTYLE_PROMPT, instance.lifestyle or ""),
-            "diet_category": ai.classify_input(DIET_PROMPT, instance.dietary_preferences or ""),
-            "goal_category": ai.classify_input(GOAL_PROMPT, instance.fitness_goals or "")
-        }
+    # the weight point is cheap and needs no AI; classification, insight and score go to the queue
+    HistoricalMetric.objects.create(
+        user_id=instance.user_id,
+        metric_type="weight",
+        value=instance.weight_kg
+    )
+    jobs.enqueue(
+        instance.user_id,
+        AIJob.PROFILE_ASSESSMENT,
+        jobs.revision_key(AIJob.PROFILE_ASSESSMENT, instance),
+        {"profile_id": instance.pk},
+    )
 
-        with transaction.atomic():
-            type(instance).objects.filter(pk=instance.pk).update(assessment_data=parsed)
 
-        instance.assessment_data = parsed
-        print(f"AI assessment saved for {instance.user.email}: {parsed}")
-    except Exception as e:
-        print(f"AI classification failed for {instance.user.email}: {e}")
+@jobs.handler(AIJob.PROFILE_ASSESSMENT)
+def run_profile_assessment(job):
+    instance = HealthProfile.objects.select_related("user").filter(pk=job.payload["profile_id"]).first()
+    if instance is None:
+        return  # profile deleted since it was queued
+
+    started = time.perf_counter()
+    errors = []
+    parsed = None
+    prompts = {
+        "lifestyle_category": (LIFESTYLE_PROMPT, instance.lifestyle or ""),
+        "diet_category": (DIET_PROMPT, instance.dietary_preferences or ""),
+        "goal_category": (GOAL_PROMPT, instance.fitness_goals or "")
+    }
+    input_hash = ai_cache.assessment_input_hash(prompts)
+    if instance.assessment_data and instance.assessment_input_hash == input_hash:
+        print(f"Profile text unchanged for {instance.user.email} - keeping AI assessment")
+    else:
+        try:
+            # the three prompts are independent, so they run in parallel (cached labels skip the call)
+            parsed = ai.classify_inputs(prompts)
+        except Exception as e:
+            errors.append(f"classification: {e}")
 
+    insight_text = None
     try:
         insight_text = ai.generate_insight({
             "height_cm": instance.height_cm,
             "weight_kg": instance.weight_kg,
-            **(instance.assessment_data or {})
+            **(parsed or instance.assessment_data or {})
         })
-        HealthInsight.objects.create(user=instance.user, content=insight_text)
-        print(f"AI insight saved for {instance.user.email}")
     except Exception as e:
-        print(f"AI insight generation failed for {instance.user.email}: {e}")
+        errors.append(f"insight: {e}")
+    logger.info("AI assessment for profile %s took %.2fs", instance.pk, time.perf_counter() - started)
+
+    # retry while attempts remain; the last attempt records what it has, like the inline version did
+    if errors and not job.is_last_attempt:
+        raise jobs.RetryJob("; ".join(errors))
+    for error in errors:
+        print(f"AI {error} failed for {instance.user.email}")
+
+    with transaction.atomic():
+        if parsed is not None:
+            type(instance).objects.filter(pk=instance.pk).update(
+                assessment_data=parsed, assessment_input_hash=input_hash
+            )
+            instance.assessment_data, instance.assessment_input_hash = parsed, input_hash
+            print(f"AI assessment saved for {instance.user.email}: {parsed}")
 
-    score = instance.wellness_score()
-    WellnessScoreHistory.objects.create(user=instance.user, score=score)
-    HistoricalMetric.objects.create(
-        user=instance.user,
-        metric_type="weight",
-        value=instance.weight_kg
-    )
+        if insight_text is not None:
+            HealthInsight.objects.create(user=instance.user, content=insight_text)
+            print(f"AI insight saved for {instance.user.email}")
 
-    try:
-        goal_plan = GoalPlan.objects.get(user=instance.user)
-        goal_plan.last_profile_update = timezone.now()
-        goal_plan.save()
-        print(f"GoalPlan marked stale for {instance.user.email}")
-
-        from .models import DailyActivitySnapshot
-        DailyActivitySnapshot.objects.update_or_create(
-            user=instance.user,
-            date=timezone.now().date(),
-            defaults={
-                "lifestyle_category": parsed.get("lifestyle_category", "unknown"),
-                "weekly_activity_target": goal_plan.weekly_activity_target,
-            }
-        )
-        print(f"Daily activity snapshot recorded for {instance.user.email}")
+        score = instance.wellness_score()
+        WellnessScoreHistory.objects.create(user=instance.user, score=score)
+
+        try:
+            goal_plan = GoalPlan.objects.get(user=instance.user)
+            goal_plan.last_profile_update = timezone.now()
+            goal_plan.save()
+            print(f"GoalPlan marked stale for {instance.user.email}")
+
+            from .models import DailyActivitySnapshot
+            DailyActivitySnapshot.objects.update_or_create(
+                user=instance.user,
+                date=timezone.now().date(),
+                defaults={
+                    "lifestyle_category": (instance.assessment_data or {}).get("lifestyle_category", "unknown"),
+                    "weekly_activity_target": goal_plan.weekly_activity_target,
+                }
+            )
+            print(f"Daily activity snapshot recorded for {instance.user.email}")
 
-    except GoalPlan.DoesNotExist:
-        pass  # no plan, so skip
+        except GoalPlan.DoesNotExist:
+            pass  # no plan, so skip
 
     print(f"Saved score {score} and weight {instance.weight_kg} for {instance.user.email}")
 
@@ -141,47 +181,51 @@ def enrich_goal_plan(sender, instance, created, **kwargs):
         return
     instance._already_handled = True
 
-    try:
+    jobs.enqueue(
+        instance.user_id,
+        AIJob.GOAL_PLAN,
+        jobs.revision_key(AIJob.GOAL_PLAN, instance),
+        {"goal_plan_id": instance.pk},
+    )
 
-        # prev stuff to preserve date
-        try:
-            old_plan = GoalPlan.objects.get(pk=instance.pk)
-        except GoalPlan.DoesNotExist:
-            old_plan = None
 
-        user_prompt = GOAL_PLAN_PROMPT.format(
-            today=date.today().isoformat(),  # for dynamic end date for goals - so progress is healty and retainable
-            goal=instance.goal_description or "unspecified",
-            weight=instance.target_weight or "unspecified",
-            activity=instance.weekly_activity_target or "unspecified"
-        )
+@jobs.handler(AIJob.GOAL_PLAN)
+def run_goal_plan(job):
+    # the stored plan: its ai_* fields are what the new answer is compared against
+    old_plan = GoalPlan.objects.select_related("user").filter(pk=job.payload["goal_plan_id"]).first()
+    if old_plan is None:
+        return
 
-        result = ai.generate_structured_json(user_prompt)
-        new_date = result.get("target_date")
-
-        # if no changes, keep existing date - AI input validation
-        if old_plan and all([
-            result.get("weekly") == old_plan.ai_weekly_plan,
-            result.get("monthly") == old_plan.ai_monthly_plan,
-            result.get("priority") == old_plan.ai_priority,
-            result.get("priority_reason") == old_plan.ai_priority_reason,
-            new_date == old_plan.ai_target_date
-        ]):
-            print("No changes to goal plan — skipping update.")
-            return
-        
-        final_date = old_plan.ai_target_date if (
-            old_plan and new_date == old_plan.ai_target_date
-        ) else new_date
-
-        with transaction.atomic():
-            GoalPlan.objects.filter(pk=instance.pk).update(
-                ai_weekly_plan=result.get("weekly"),
-                ai_monthly_plan=result.get("monthly"),
-                ai_priority=result.get("priority", "medium"),
-                ai_priority_reason=result.get("priority_reason", "No justification provided."),
-                ai_target_date=final_date
-            )
-        print(f"AI goal plan saved for {instance.user.email}")
-    except Exception as e:
-        print(f"AI goal plan generation failed for {instance.user.email}: {e}")
\ No newline at end of file
+    user_prompt = GOAL_PLAN_PROMPT.format(
+        today=date.today().isoformat(),  # for dynamic end date for goals - so progress is healty and retainable
+        goal=old_plan.goal_description or "unspecified",
+        weight=old_plan.target_weight or "unspecified",
+        activity=old_plan.weekly_activity_target or "unspecified"
+    )
+
+    # errors propagate so the queue retries with backoff
+    result = ai.generate_structured_json(user_prompt)
+    new_date = result.get("target_date")
+
+    # if no changes, keep existing date - AI input validation
+    if all([
+        result.get("weekly") == old_plan.ai_weekly_plan,
+        result.get("monthly") == old_plan.ai_monthly_plan,
+        result.get("priority") == old_plan.ai_priority,
+        result.get("priority_reason") == old_plan.ai_priority_reason,
+        new_date == old_plan.ai_target_date
+    ]):
+        print("No changes to goal plan — skipping update.")
+        return
+
+    final_date = old_plan.ai_target_date if new_date == old_plan.ai_target_date else new_date
+
+    with transaction.atomic():
+        GoalPlan.objects.filter(pk=old_plan.pk).update(
+            ai_weekly_plan=result.get("weekly"),
+            ai_monthly_plan=result.get("monthly"),
+            ai_priority=result.get("priority", "medium"),
+            ai_priority_reason=result.get("priority_reason", "No justification provided."),
+            ai_target_date=final_date
+        )
+    print(f"AI goal plan saved for {old_plan.user.email}")
@@ -7,4 +7,5 @@ urlpatterns = [
     path("profile/", views.profile_entry, name="profile_entry"),
     path("goals/", views.goals_tracking, name="goals_tracking"),
     path("export/", views.export_health_data, name="export_health_data"),
+    path("ai-status/", views.ai_job_status, name="ai_job_status"),
 ]
\ No newline at end of file
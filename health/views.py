@@ -8,6 +8,7 @@ from django.http import JsonResponse
 from math import ceil
 import json
 from diet.models import NutritionAdherenceSnapshot
+from .jobs import has_unfinished, job_status
 
 def get_weight_on_or_after(date_lookup, history_by_day):
     for offset in range(7): 
@@ -180,8 +181,15 @@ def profile_entry(request):
         "base_wellness_score": base_score,
         "adjusted_wellness_score": adjusted_score,
         "adherence_ratio": adherence_ratio,
+        "ai_jobs_pending": has_unfinished(job_status(user)),
     })
 
+@login_required
+def ai_job_status(request):
+    # polled by the profile page while the AI assessment / goal plan jobs are queued
+    status = job_status(request.user)
+    return JsonResponse({"jobs": status, "pending": has_unfinished(status)})
+
 @login_required
 def goals_tracking(request):
     try:
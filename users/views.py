@@ -15,7 +15,7 @@ from django.utils.safestring import mark_safe
 from diet.models import UserDietaryPreferences, UserSavedMeal, PlannedMeal, MealPlanVersion, NutritionAdherenceSnapshot
 from health.models import HealthProfile
 from django.utils import timezone
-from datetime import timedelta, date
+from datetime import timedelta
 from collections import defaultdict
 import json
 
@@ -320,89 +320,16 @@ def get_dashboard_health_snapshot(user):
 def get_dashboard_diet_snapshot(user):
     """Collect comprehensive diet data for dashboard charts (isolated from analytics)"""
     try:
-        from diet.models import UserDietaryPreferences, PlannedMeal, UserSavedMeal, NutritionAdherenceSnapshot, MealPlanVersion, ShoppingListVersion
+        from diet.models import UserDietaryPreferences, NutritionAdherenceSnapshot, MealPlanVersion, ShoppingListVersion
+        from diet.weekly_plan import MEAL_SLOTS, load_weekly_plan
         
         prefs = UserDietaryPreferences.objects.get(user=user)
         
         # Get current 7-day meal plan (rolling window)
-        today = date.today()
-        week_dates = [today + timedelta(days=i+1) for i in range(7)]
-        
-        planned_meals_qs = PlannedMeal.objects.filter(
-            user=user,
-            planned_date__in=week_dates
-        ).prefetch_related('foods')
-        
-        # Build comprehensive meal plan structure
-        planned_meals = {}
-        daily_totals = {}
-        meal_slots = ["breakfast", "lunch", "dinner", "snack"]
-        
-        for pm in planned_meals_qs:
-            date_key = pm.planned_date.strftime('%Y-%m-%d')
-            slot_key = pm.meal_type
-            
-            if date_key not in planned_meals:
-                planned_meals[date_key] = {}
-                daily_totals[date_key] = {
-                    'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0,
-                    'meals': [], 'date': pm.planned_date.isoformat()
-                }
-            
-            meal_data = {
-                'meal_name': None,
-                'meal_thumb': None,
-                'id': pm.id,
-                'macros': None,
-                'recommended_servings': None,
-                'portion_multiplier': 1.0,
-                'adjusted_nutrition': None
-            }
-            
-            # Extract meal info from plan_json
-            if pm.plan_json and 'meals' in pm.plan_json and pm.plan_json['meals']:
-                meal = pm.plan_json['meals'][0]
-                meal_data.update({
-                    'meal_name': meal.get('meal_name'),
-                    'meal_thumb': meal.get('meal_thumb'),
-                    'saved_meal_id': meal.get('saved_meal_id'),
-                    'portion_multiplier': meal.get('portion_multiplier', 1.0)
-                })
-                
-                # Get macros and servings from saved meal
-                if 'saved_meal_id' in meal:
-                    try:
-                        saved_meal = UserSavedMeal.objects.get(id=meal['saved_meal_id'])
-                        meal_data['macros'] = saved_meal.macros_json
-                        meal_data['recommended_servings'] = saved_meal.recommended_servings
-                        
-                        # Calculate adjusted nutrition
-                        portion_multiplier = float(meal.get('portion_multiplier', 1.0))
-                        if saved_meal.macros_json and saved_meal.recommended_servings:
-                            servings = float(saved_meal.recommended_servings)
-                            if servings > 0:
-                                adjusted_nutrition = {
-                                    'calories': (saved_meal.macros_json.get('calories', 0) / servings) * portion_multiplier,
-                                    'protein': (saved_meal.macros_json.get('protein', 0) / servings) * portion_multiplier,
-                                    'carbs': (saved_meal.macros_json.get('carbs', 0) / servings) * portion_multiplier,
-                                    'fat': (saved_meal.macros_json.get('fat', 0) / servings) * portion_multiplier
-                                }
-                                meal_data['adjusted_nutrition'] = adjusted_nutrition
-                                
-                                # Add to daily totals
-                                daily_totals[date_key]['calories'] += adjusted_nutrition['calories']
-                                daily_totals[date_key]['protein'] += adjusted_nutrition['protein']
-                                daily_totals[date_key]['carbs'] += adjusted_nutrition['carbs']
-                                daily_totals[date_key]['fat'] += adjusted_nutrition['fat']
-                    except UserSavedMeal.DoesNotExist:
-                        pass
-            
-            planned_meals[date_key][slot_key] = meal_data
-            daily_totals[date_key]['meals'].append({
-                'meal_type': slot_key,
-                'meal_name': meal_data['meal_name'],
-                'calories': meal_data['adjusted_nutrition']['calories'] if meal_data['adjusted_nutrition'] else 0
-            })
+        plan = load_weekly_plan(user)
+        planned_meals = plan.planned_meals()
+        daily_totals = plan.daily_totals()
+        meal_slots = MEAL_SLOTS
         
         # Get nutrition adherence and wellness score adjustments
         try:
@@ -514,8 +441,8 @@ def get_dashboard_diet_snapshot(user):
                 'planned_meals': planned_meals,
                 'daily_totals': daily_totals,
                 'meal_slots': meal_slots,
-                'week_dates': [d.isoformat() for d in week_dates],
-                'planned_meals_count': planned_meals_qs.count(),
+                'week_dates': [day.date.isoformat() for day in plan.days],
+                'planned_meals_count': plan.slot_count,
             },
             'nutrition_adherence': nutrition_adherence,
             'saved_meals': {
@@ -266,4 +266,72 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# RAG recipe search (diet.vector_index) - seconds between freshness checks of the
+# in-process embedding matrix against BulkRecipe, so other workers' writes show up
+RAG_INDEX_REFRESH_SECONDS = config('RAG_INDEX_REFRESH_SECONDS', default=300, cast=int)
+# embedding model used for recipes and queries, and the on-disk precision of
+# BulkRecipe.embedding_vector ('float32', or 'float16' for half the size)
+RAG_EMBEDDING_MODEL = config('RAG_EMBEDDING_MODEL', default='text-embedding-ada-002')
+RAG_EMBEDDING_DTYPE = config('RAG_EMBEDDING_DTYPE', default='float32')
+# 'openai' (RAG_EMBEDDING_MODEL via the API) or 'hashing' (local feature-hashing
+# vectors RAG_HASHING_DIMENSIONS wide; no network, deterministic, for offline use)
+RAG_EMBEDDING_PROVIDER = config('RAG_EMBEDDING_PROVIDER', default='openai')
+RAG_HASHING_DIMENSIONS = config('RAG_HASHING_DIMENSIONS', default=512, cast=int)
+# directory for the memory-mapped embedding snapshot (manage.py export_embedding_snapshot).
+# set to an empty value to always load the vectors from the database.
+RAG_SNAPSHOT_DIR = config('RAG_SNAPSHOT_DIR', default=str(BASE_DIR / 'rag_snapshot'))
+# query embeddings kept per process (LRU) and in the shared Django cache
+RAG_QUERY_CACHE_SIZE = config('RAG_QUERY_CACHE_SIZE', default=1024, cast=int)
+RAG_QUERY_CACHE_TTL = config('RAG_QUERY_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+# 'exact' scans every embedding; 'ivf' searches the approximate index written by
+# manage.py build_ann_index, probing RAG_IVF_NPROBE lists (higher = better recall, slower)
+RAG_SEARCH_BACKEND = config('RAG_SEARCH_BACKEND', default='exact')
+RAG_IVF_NPROBE = config('RAG_IVF_NPROBE', default=8, cast=int)
+RAG_ANN_INDEX_PATH = config('RAG_ANN_INDEX_PATH', default=str(BASE_DIR / 'rag_snapshot' / 'ivf.npz'))
+
+# analytics UserDataSnapshot sync (analytics.sync). model signals only mark a user's
+# health/diet summary dirty; 'commit' rebuilds each dirty summary once when the
+# transaction commits, 'deferred' leaves it to manage.py sync_pending_snapshots
+ANALYTICS_SYNC_MODE = config('ANALYTICS_SYNC_MODE', default='commit')
+
+# health AI job queue (health.jobs). profile and goal plan saves only enqueue their
+# OpenAI work for manage.py run_ai_jobs; eager runs each job in-process right after
+# the save commits instead (no worker needed, but the request waits for OpenAI again)
+HEALTH_AI_JOBS_EAGER = config('HEALTH_AI_JOBS_EAGER', default=False, cast=bool)
+
+# health.ai classification cache (health.ai_cache): days a cached label is trusted, and
+# the most entries kept (least recently used are evicted first)
+HEALTH_AI_CACHE_TTL_DAYS = config('HEALTH_AI_CACHE_TTL_DAYS', default=30, cast=int)
+HEALTH_AI_CACHE_MAX_ENTRIES = config('HEALTH_AI_CACHE_MAX_ENTRIES', default=10000, cast=int)
+
+# USDA FoodData Central token bucket (diet.rate_limit), shared by all processes per API key.
+# api.data.gov allows 1000 requests/hour per key; requests only wait once the burst is spent,
+# and give up (returning no data) if the next token is more than MAX_WAIT seconds away.
+# USDA_RATE_LIMITS overrides the defaults for specific keys: {api_key: {'per_hour': n, 'burst': n}}
+USDA_RATE_LIMIT_PER_HOUR = config('USDA_RATE_LIMIT_PER_HOUR', default=1000, cast=int)
+USDA_RATE_LIMIT_BURST = config('USDA_RATE_LIMIT_BURST', default=20, cast=int)
+USDA_RATE_LIMIT_MAX_WAIT = config('USDA_RATE_LIMIT_MAX_WAIT', default=10.0, cast=float)
+USDA_RATE_LIMITS = {}
+
+# local-first USDA food store (diet.usda_store): full food records younger than FRESH_DAYS
+# are served from StoredUSDAFood as is, older ones are served while a background refresh
+# runs, and past MAX_STALE_DAYS the lookup waits for the API. MEMORY_CACHE_SIZE foods are
+# also kept in each process
+USDA_FOOD_FRESH_DAYS = config('USDA_FOOD_FRESH_DAYS', default=30, cast=int)
+USDA_FOOD_MAX_STALE_DAYS = config('USDA_FOOD_MAX_STALE_DAYS', default=365, cast=int)
+USDA_FOOD_MEMORY_CACHE_SIZE = config('USDA_FOOD_MEMORY_CACHE_SIZE', default=512, cast=int)
+
+# pooled keep-alive HTTP clients for external APIs (diet.http_clients), per upstream:
+# pool_maxsize, connect_timeout, read_timeout, retries, backoff_factor, backoff_jitter
+# (anything left out uses diet.http_clients.CLIENT_DEFAULTS)
+EXTERNAL_HTTP_CLIENTS = {
+    'usda': {'pool_maxsize': config('USDA_HTTP_POOL_SIZE', default=10, cast=int)},
+    'mealdb': {'pool_maxsize': config('MEALDB_HTTP_POOL_SIZE', default=10, cast=int)},
+}
+
+# computed shopping lists (diet.shopping_cache), cached per user and date window. plan
+# and saved meal changes invalidate them in every process through the per-user
+# PlanRevision row; the TTL only clears out windows that have rolled past
+SHOPPING_LIST_CACHE_TTL = config('SHOPPING_LIST_CACHE_TTL', default=24 * 3600, cast=int)
+
 # 'DIRS': [BASE_DIR / "templates"],  # likely will need it later
\ No newline at end of file